@@ -2,14 +2,21 @@ from http.server import BaseHTTPRequestHandler
 import json
 import sys
 import os
+from urllib.parse import parse_qs, urlparse
 
 # 确保项目根目录在Python路径中
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
-from flow import run_tarot_reading
-from utils.reading_storage import get_reading_statistics, load_all_readings
+from flow import run_tarot_reading, stream_tarot_reading
+from utils.reading_storage import SUMMARY_FIELDS, get_read_cache_metrics, get_reading_statistics, get_readings_page
+from utils.interpretation_cache import get_interpretation_cache_metrics
+from utils.llm_cache import BYPASS_HEADER, get_llm_cache_metrics, is_bypass_requested, set_llm_cache_bypass
+from utils.llm_router import get_llm_router_metrics
+from utils.rate_limiter import get_rate_limit_metrics
+from utils.token_budget import get_token_usage_metrics
+from utils.reading_writer import get_write_queue_metrics
 from utils.spread_config import get_all_spreads, get_spread_config
 from utils.tarot_database import get_all_cards, search_cards_by_keyword
 
@@ -18,19 +25,27 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, {BYPASS_HEADER}')
         self.end_headers()
     
     def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+        
+        if path == '/api/history':
+            self.handle_history(query)
+            return
+        
         self.send_cors_headers()
         
-        if self.path == '/api/health':
+        if path == '/api/health':
             self.send_json_response({
                 "status": "healthy",
                 "message": "塔罗牌占卜API服务正常运行"
             })
         
-        elif self.path == '/api/spreads':
+        elif path == '/api/spreads':
             spreads = get_all_spreads()
             spread_details = []
             
@@ -51,7 +66,7 @@ class handler(BaseHTTPRequestHandler):
                 "spreads": spread_details
             })
         
-        elif self.path == '/api/cards':
+        elif path == '/api/cards':
             cards = get_all_cards()
             self.send_json_response({
                 "success": True,
@@ -59,25 +74,66 @@ class handler(BaseHTTPRequestHandler):
                 "total": len(cards)
             })
         
-        elif self.path == '/api/history':
-            all_readings = load_all_readings()
+        elif path == '/api/statistics':
+            stats = get_reading_statistics()
             self.send_json_response({
                 "success": True,
-                "readings": all_readings,
-                "total": len(all_readings)
+                "statistics": stats
             })
         
-        elif self.path == '/api/statistics':
-            stats = get_reading_statistics()
+        elif path == '/api/metrics':
             self.send_json_response({
                 "success": True,
-                "statistics": stats
+                "metrics": {
+                    "write_queue": get_write_queue_metrics(),
+                    "read_cache": get_read_cache_metrics(),
+                    "interpretation_cache": get_interpretation_cache_metrics(),
+                    "llm_cache": get_llm_cache_metrics(),
+                    "llm_router": get_llm_router_metrics(),
+                    "llm_rate_limit": get_rate_limit_metrics(),
+                    "token_usage": get_token_usage_metrics()
+                }
             })
         
         else:
             self.send_error_response(404, "API endpoint not found")
     
+    def handle_history(self, query):
+        """分页获取占卜历史（支持 cursor 游标分页和 fields 字段投影）"""
+        try:
+            limit = int(query.get('limit', ['10'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            cursor = query.get('cursor', [None])[0]
+            fields_param = query.get('fields', [None])[0]
+            if fields_param == 'summary':
+                fields = list(SUMMARY_FIELDS)
+            elif fields_param:
+                fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+            else:
+                fields = None
+            
+            page = get_readings_page(limit, offset, cursor=cursor, fields=fields)
+        except ValueError as e:
+            self.send_error_response(400, str(e))
+            return
+        
+        self.send_cors_headers()
+        self.send_json_response({
+            "success": True,
+            "readings": page["readings"],
+            "total": page["total"],
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": page["next_cursor"]
+        })
+    
     def do_POST(self):
+        set_llm_cache_bypass(is_bypass_requested(self.headers.get(BYPASS_HEADER)))
+        
+        if self.path == '/api/reading/stream':
+            self.handle_reading_stream()
+            return
+        
         self.send_cors_headers()
         
         if self.path == '/api/reading':
@@ -104,11 +160,44 @@ class handler(BaseHTTPRequestHandler):
         else:
             self.send_error_response(404, "API endpoint not found")
     
+    def handle_reading_stream(self):
+        """流式占卜：以Server-Sent Events逐段返回综合解读，最后发送完整结果"""
+        try:
+            content_length = int(self.headers['Content-Length'])
+            body = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            question = body['question']
+        except Exception as e:
+            self.send_error_response(400, f"Invalid request: {str(e)}")
+            return
+        
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        
+        events = stream_tarot_reading(
+            user_question=question,
+            spread_type=body.get('spread_type'),
+            save_result=body.get('save_result', True)
+        )
+        try:
+            for event, payload in events:
+                data = {"text": payload} if event == "delta" else payload
+                self.send_sse(event, data)
+        except Exception as e:
+            self.send_sse("error", {"success": False, "error": f"Server error: {str(e)}"})
+    
+    def send_sse(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        self.wfile.write(message.encode('utf-8'))
+        self.wfile.flush()
+    
     def send_cors_headers(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', f'Content-Type, {BYPASS_HEADER}')
         self.send_header('Content-Type', 'application/json')
         self.end_headers()
     
@@ -4,18 +4,41 @@
 为前端提供RESTful API接口
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 from datetime import datetime
-from flow import run_tarot_reading
-from utils.reading_storage import get_reading_statistics, load_all_readings
+from flow import run_tarot_reading, stream_tarot_reading
+from utils.reading_storage import SUMMARY_FIELDS, get_read_cache_metrics, get_reading_statistics, get_readings_page
+from utils.interpretation_cache import get_interpretation_cache_metrics
+from utils.llm_cache import BYPASS_HEADER, get_llm_cache_metrics, is_bypass_requested, set_llm_cache_bypass
+from utils.llm_router import get_llm_router_metrics
+from utils.rate_limiter import get_rate_limit_metrics
+from utils.token_budget import get_token_usage_metrics
+from utils.reading_writer import get_write_queue_metrics
 from utils.spread_config import get_all_spreads, get_spread_config
 from utils.tarot_database import get_all_cards, search_cards_by_keyword
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+def parse_fields_param(fields_param):
+    """解析 fields 查询参数：逗号分隔的字段名，summary 表示历史列表摘要字段"""
+    if not fields_param:
+        return None
+    if fields_param == 'summary':
+        return list(SUMMARY_FIELDS)
+    return [field.strip() for field in fields_param.split(',') if field.strip()]
+
+def format_sse(event, data):
+    """编码一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.before_request
+def apply_llm_cache_header():
+    """请求头 X-LLM-Cache: bypass 时本次请求的LLM调用不使用缓存"""
+    set_llm_cache_bypass(is_bypass_requested(request.headers.get(BYPASS_HEADER)))
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -89,6 +112,43 @@ def create_reading():
             "error": f"占卜过程中发生错误: {str(e)}"
         }), 500
 
+@app.route('/api/reading/stream', methods=['POST'])
+def create_reading_stream():
+    """
+    创建新的塔罗牌占卜（流式）
+    
+    以Server-Sent Events返回：综合解读生成过程中持续发送 delta 事件（{"text": 片段}），
+    完成后发送一个 result 事件，内容与 /api/reading 的返回相同。
+    """
+    data = request.get_json(silent=True)
+    if not data or 'question' not in data:
+        return jsonify({
+            "success": False,
+            "error": "缺少必需的参数：question"
+        }), 400
+    
+    events = stream_tarot_reading(
+        user_question=data['question'],
+        spread_type=data.get('spread_type'),
+        save_result=data.get('save_result', True)
+    )
+    
+    def generate():
+        try:
+            for event, payload in events:
+                if event == "delta":
+                    yield format_sse("delta", {"text": payload})
+                else:
+                    yield format_sse("result", payload)
+        except Exception as e:
+            yield format_sse("error", {"success": False, "error": f"占卜过程中发生错误: {str(e)}"})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/spreads', methods=['GET'])
 def get_spreads():
     """获取所有可用的牌阵"""
@@ -167,23 +227,29 @@ def get_cards():
 
 @app.route('/api/history', methods=['GET'])
 def get_reading_history():
-    """获取占卜历史记录"""
+    """获取占卜历史记录（支持 cursor 游标分页和 fields 字段投影）"""
     try:
         limit = request.args.get('limit', 10, type=int)
         offset = request.args.get('offset', 0, type=int)
-        
-        all_readings = load_all_readings()
+        cursor = request.args.get('cursor')
+        fields = parse_fields_param(request.args.get('fields'))
         
         # 分页处理
-        total = len(all_readings)
-        readings = all_readings[offset:offset + limit]
+        try:
+            page = get_readings_page(limit, offset, cursor=cursor, fields=fields)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
         return jsonify({
             "success": True,
-            "readings": readings,
-            "total": total,
+            "readings": page["readings"],
+            "total": page["total"],
             "limit": limit,
-            "offset": offset
+            "offset": offset,
+            "next_cursor": page["next_cursor"]
         })
         
     except Exception as e:
@@ -209,6 +275,29 @@ def get_statistics():
             "error": f"获取统计信息失败: {str(e)}"
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """获取运行指标（写入队列深度、写入延迟、读取缓存命中率等）"""
+    try:
+        return jsonify({
+            "success": True,
+            "metrics": {
+                "write_queue": get_write_queue_metrics(),
+                "read_cache": get_read_cache_metrics(),
+                "interpretation_cache": get_interpretation_cache_metrics(),
+                "llm_cache": get_llm_cache_metrics(),
+                "llm_router": get_llm_router_metrics(),
+                "llm_rate_limit": get_rate_limit_metrics(),
+                "token_usage": get_token_usage_metrics()
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"获取运行指标失败: {str(e)}"
+        }), 500
+
 @app.route('/api/recommend-spread', methods=['POST'])
 def recommend_spread():
     """根据问题推荐合适的牌阵"""
@@ -262,10 +351,12 @@ if __name__ == '__main__':
     print("🌐 支持的接口:")
     print("   GET  /api/health - 健康检查")
     print("   POST /api/reading - 创建占卜")
+    print("   POST /api/reading/stream - 创建占卜（SSE流式返回）")
     print("   GET  /api/spreads - 获取牌阵列表")
     print("   GET  /api/cards - 获取塔罗牌信息")
     print("   GET  /api/history - 获取占卜历史")
     print("   GET  /api/statistics - 获取统计信息")
+    print("   GET  /api/metrics - 获取运行指标")
     print("   POST /api/recommend-spread - 推荐牌阵")
     
     app.run(
@@ -4,12 +4,29 @@
 定义和创建完整的占卜流程
 """
 
-from macore import Flow
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from macore import AsyncDagFlow, AsyncFlow, DeadlineExceeded, Flow, deadline
 from nodes import (
     QuestionInputNode, SpreadSetupNode, CardDrawingNode,
     CardMeaningNode, IndividualReadingNode, CombinedReadingNode,
-    SaveReadingNode
+    SaveReadingNode, AsyncIndividualReadingNode, AsyncCombinedReadingNode,
+    AsyncSaveReadingNode, ParallelIndividualReadingNode, PipelinedReadingNode,
+    DraftCombinedReadingNode, RefineCombinedReadingNode, get_reading_node_timeout,
+    get_combined_reading_mode, get_individual_reading_mode, is_combined_refine_enabled,
+    successful_card_readings
 )
+from utils.tracing import TRACE_KEY, export_reading_trace, setup_tracing
+
+# READING_TRACE_ENABLED=true 时记录每个节点的耗时追踪
+setup_tracing()
 
 def create_tarot_reading_flow():
     """
@@ -18,13 +35,14 @@ def create_tarot_reading_flow():
     Returns:
         配置好的Flow对象
     """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
     # 创建所有节点实例
     question_input = QuestionInputNode()
     spread_setup = SpreadSetupNode()
     card_drawing = CardDrawingNode()
     card_meaning = CardMeaningNode()
-    individual_reading = IndividualReadingNode()
-    combined_reading = CombinedReadingNode()
+    individual_reading = IndividualReadingNode(timeout=node_timeout)
+    combined_reading = CombinedReadingNode(timeout=node_timeout)
     save_reading = SaveReadingNode()
     
     # 连接节点形成流程
@@ -40,6 +58,104 @@ def create_tarot_reading_flow():
     flow = Flow(start=question_input)
     return flow
 
+def create_async_tarot_reading_flow(individual_mode: str = None, combined_mode: str = None):
+    """
+    创建完整塔罗牌占卜流程的异步版本
+    
+    LLM调用和保存都以协程执行，同一个事件循环可以同时处理多个占卜；
+    问题分析、抽牌等纯计算节点仍是同步节点，由AsyncFlow直接调用。
+    
+    Args:
+        individual_mode: 单牌解读模式，batch（一个批量prompt）或 parallel（每张牌并发调用），
+                         默认取 INDIVIDUAL_READING_MODE
+        combined_mode: 综合解读模式，sequential（等单牌解读完成）或 pipeline（与单牌解读同时生成），
+                       默认取 COMBINED_READING_MODE
+    
+    Returns:
+        配置好的AsyncFlow对象
+    """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
+    question_input = QuestionInputNode()
+    spread_setup = SpreadSetupNode()
+    card_drawing = CardDrawingNode()
+    card_meaning = CardMeaningNode()
+    if (individual_mode or get_individual_reading_mode()) == "parallel":
+        individual_reading = ParallelIndividualReadingNode(timeout=node_timeout)
+    else:
+        individual_reading = AsyncIndividualReadingNode(timeout=node_timeout)
+    save_reading = AsyncSaveReadingNode()
+    
+    question_input >> spread_setup
+    spread_setup >> card_drawing
+    card_drawing >> card_meaning
+    if (combined_mode or get_combined_reading_mode()) == "pipeline":
+        # 流水线：单牌解读和综合解读在同一个节点中同时进行
+        readings = PipelinedReadingNode(individual_reading, timeout=node_timeout)
+        card_meaning >> readings
+        readings >> save_reading
+    else:
+        combined_reading = AsyncCombinedReadingNode(timeout=node_timeout)
+        card_meaning >> individual_reading
+        individual_reading >> combined_reading
+        combined_reading >> save_reading
+    
+    return AsyncFlow(start=question_input)
+
+def create_dag_tarot_reading_flow(individual_mode: str = None, combined_mode: str = None, refine: bool = None):
+    """
+    按节点之间真实的数据依赖创建完整占卜流程（AsyncDagFlow）
+    
+    节点不再串成一条链，先后顺序由各节点声明读写的shared store键决定。问题分析到牌意准备
+    仍是前后依赖的；流水线模式下单牌解读和综合解读初稿都只依赖牌意，会同时运行，
+    修订和保存节点等它们都完成后再运行。
+    
+    Args:
+        individual_mode: 单牌解读模式，默认取 INDIVIDUAL_READING_MODE
+        combined_mode: 综合解读模式，默认取 COMBINED_READING_MODE
+        refine: 流水线模式下是否修订初稿，默认取 COMBINED_READING_REFINE
+    
+    Returns:
+        配置好的AsyncDagFlow对象
+    """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
+    if (individual_mode or get_individual_reading_mode()) == "parallel":
+        individual_reading = ParallelIndividualReadingNode(timeout=node_timeout)
+    else:
+        individual_reading = AsyncIndividualReadingNode(timeout=node_timeout)
+    nodes = [QuestionInputNode(), SpreadSetupNode(), CardDrawingNode(), CardMeaningNode(), individual_reading]
+    
+    if (combined_mode or get_combined_reading_mode()) == "pipeline":
+        refine = is_combined_refine_enabled() if refine is None else refine
+        nodes.append(DraftCombinedReadingNode(stream=not refine, timeout=node_timeout))
+        if refine:
+            nodes.append(RefineCombinedReadingNode(timeout=node_timeout))
+    else:
+        nodes.append(AsyncCombinedReadingNode(timeout=node_timeout))
+    nodes.append(AsyncSaveReadingNode())
+    
+    return AsyncDagFlow(nodes)
+
+def create_async_quick_reading_flow():
+    """
+    创建快速占卜流程的异步版本（跳过保存步骤和单牌解读）
+    
+    Returns:
+        配置好的AsyncFlow对象
+    """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
+    question_input = QuestionInputNode()
+    spread_setup = SpreadSetupNode()
+    card_drawing = CardDrawingNode()
+    card_meaning = CardMeaningNode()
+    combined_reading = AsyncCombinedReadingNode(timeout=node_timeout)
+    
+    question_input >> spread_setup
+    spread_setup >> card_drawing
+    card_drawing >> card_meaning
+    card_meaning >> combined_reading
+    
+    return AsyncFlow(start=question_input)
+
 def create_quick_reading_flow():
     """
     创建快速占卜流程（跳过保存步骤和部分LLM调用）
@@ -48,13 +164,14 @@ def create_quick_reading_flow():
     Returns:
         配置好的Flow对象
     """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
     # 创建节点实例（使用简化版本）
     question_input = QuestionInputNode()
     spread_setup = SpreadSetupNode()
     card_drawing = CardDrawingNode()
     card_meaning = CardMeaningNode()
     # 跳过individual_reading以减少LLM调用
-    combined_reading = CombinedReadingNode()
+    combined_reading = CombinedReadingNode(timeout=node_timeout)
     
     # 连接节点形成简化流程
     question_input >> spread_setup
@@ -73,12 +190,13 @@ def create_simple_reading_flow():
     Returns:
         配置好的Flow对象
     """
+    node_timeout = get_reading_node_timeout()  # LLM节点每次执行的超时
     # 创建必要的节点
     question_input = QuestionInputNode()
     spread_setup = SpreadSetupNode()
     card_drawing = CardDrawingNode()
     card_meaning = CardMeaningNode()
-    combined_reading = CombinedReadingNode()
+    combined_reading = CombinedReadingNode(timeout=node_timeout)
     
     # 连接节点（跳过个体解读，直接进行综合解读）
     question_input >> spread_setup
@@ -89,54 +207,308 @@ def create_simple_reading_flow():
     flow = Flow(start=question_input)
     return flow
 
-def run_tarot_reading(user_question: str, spread_type: str = None, save_result: bool = True):
+def create_degraded_reading_flow(save_result: bool = True, use_async: bool = False, timeout: float = None,
+                                 regenerate: bool = True):
     """
-    运行完整的塔罗牌占卜流程
+    创建超时降级流程：完整流程超出时间预算后，沿用已抽的牌和牌意，
+    像快速流程一样直接生成综合解读（超过 timeout 秒则使用备用解读），需要时再保存
     
     Args:
-        user_question: 用户的问题
-        spread_type: 指定的牌阵类型（可选，如果不指定会自动推荐）
         save_result: 是否保存结果
-        
+        use_async: 是否创建异步版本
+        timeout: 综合解读的超时（秒）
+        regenerate: 是否重新生成综合解读（已有综合解读时为False，只保存）
+    
     Returns:
-        包含占卜结果的字典
+        配置好的Flow/AsyncFlow对象
+    """
+    save_reading = None
+    if save_result:
+        save_reading = AsyncSaveReadingNode() if use_async else SaveReadingNode()
+    if not regenerate:
+        return (AsyncFlow if use_async else Flow)(start=save_reading)
+    
+    if use_async:
+        combined_reading = AsyncCombinedReadingNode(timeout=timeout)
+    else:
+        combined_reading = CombinedReadingNode(timeout=timeout)
+    if save_reading:
+        combined_reading >> save_reading
+    return (AsyncFlow if use_async else Flow)(start=combined_reading)
+
+# 编译后的流程模板：按流程结构和节点读取的配置（例如 READING_NODE_TIMEOUT）分别编译一次并缓存，
+# 所有请求共用，每次运行的状态放在独立的运行上下文中；配置变化后的请求使用新编译的模板
+_compiled_flows = {}
+
+def _get_compiled_flow(key: tuple, build):
+    """按键获取编译好的流程模板，没有时调用 build() 编译"""
+    flow = _compiled_flows.get(key)
+    if flow is None:
+        flow = _compiled_flows.setdefault(key, build())
+    return flow
+
+def get_tarot_reading_flow():
+    """获取编译好的同步完整占卜流程"""
+    return _get_compiled_flow(
+        ("full", get_reading_node_timeout()),
+        lambda: create_tarot_reading_flow().compile()
+    )
+
+def get_quick_reading_flow(use_async: bool = False):
+    """获取编译好的快速占卜流程（同步或异步版本）"""
+    create = create_async_quick_reading_flow if use_async else create_quick_reading_flow
+    return _get_compiled_flow(
+        ("quick", use_async, get_reading_node_timeout()),
+        lambda: create().compile()
+    )
+
+def get_reading_deadline():
+    """
+    整个占卜的时间预算（秒，环境变量 READING_DEADLINE_SECONDS，0表示不限制）
+    
+    其中最后 READING_FALLBACK_RESERVE_SECONDS 秒留给超时降级，完整流程只能用剩下的部分。
+    返回 (完整流程的时间预算, 降级预留时间)，不限制时为 (None, None)。
     """
-    # 准备shared store
-    shared = {
+    budget = float(os.getenv("READING_DEADLINE_SECONDS", "0"))
+    if budget <= 0:
+        return None, None
+    reserve = min(float(os.getenv("READING_FALLBACK_RESERVE_SECONDS", "5")), budget / 2)
+    return budget - reserve, reserve
+
+def _prepare_degraded_reading(shared: dict, save_result: bool, use_async: bool, reserve: float):
+    """
+    完整流程超时后准备降级：只保留LLM生成成功的单牌解读（去掉备用解读），关闭流式输出（已输出的片段不再重复）
+    
+    Returns:
+        (要运行的流程, 流程的时间预算)：已有LLM生成的综合解读时不再重新生成，只在需要时保存；
+        已有牌意时只在预留时间内生成综合解读（没有或只是备用解读时），保存不受限制；
+        还没有牌意时在预留时间内从头运行快速流程
+    """
+    shared["stream_callback"] = None
+    shared["degraded"] = True
+    if not shared.get("card_meanings"):
+        shared["individual_readings"] = []
+        return get_quick_reading_flow(use_async), reserve
+    
+    shared["individual_readings"] = successful_card_readings(
+        shared.get("individual_readings") or [], shared["card_meanings"], shared.get("question_category", "general")
+    )
+    regenerate = not shared.get("combined_reading") or shared.get("combined_reading_is_fallback", False)
+    flow = _get_compiled_flow(
+        ("degraded", save_result, use_async, reserve, regenerate),
+        lambda: create_degraded_reading_flow(save_result, use_async, reserve, regenerate).compile()
+    )
+    return flow, None
+
+def get_reading_flow_executor():
+    """完整占卜流程的执行方式：chain（节点串成一条链，默认）或 dag（按数据依赖并行调度），环境变量 READING_FLOW_EXECUTOR"""
+    executor = os.getenv("READING_FLOW_EXECUTOR", "chain").lower()
+    return executor if executor in ("chain", "dag") else "chain"
+
+def get_async_tarot_reading_flow(individual_mode: str = None, combined_mode: str = None):
+    """
+    获取编译好的异步完整占卜流程（参数同 create_async_tarot_reading_flow）
+    
+    流程结构取决于执行方式、运行模式和节点读取的环境变量，按这些配置分别编译一次并缓存。
+    """
+    key = (
+        individual_mode or get_individual_reading_mode(),
+        combined_mode or get_combined_reading_mode(),
+        is_combined_refine_enabled(),
+        os.getenv("INDIVIDUAL_READING_CONCURRENCY", "4"),
+        get_reading_flow_executor(),
+        get_reading_node_timeout()
+    )
+    if key[4] == "dag":
+        return _get_compiled_flow(("dag",) + key, lambda: create_dag_tarot_reading_flow(*key[:3]))
+    return _get_compiled_flow(("async",) + key, lambda: create_async_tarot_reading_flow(*key[:2]).compile())
+
+def _create_shared(user_question: str, spread_type: str = None, stream_callback=None) -> dict:
+    """准备shared store"""
+    return {
         "user_question": user_question,
         "spread_type": spread_type,
+        "stream_callback": stream_callback,  # 综合解读的增量文本回调（可选）
         "ui_spec": {},  # 前端UI规范（预留）
         "style_spec": {}  # 样式规范（预留）
     }
+
+def _build_result(shared: dict, save_result: bool) -> dict:
+    """从shared store整理返回结果"""
+    return {
+        "success": True,
+        "question": shared.get("user_question", ""),
+        "question_category": shared.get("question_category", ""),
+        "spread_type": shared.get("spread_type", ""),
+        "spread_name": shared.get("spread_config", {}).get("name", ""),
+        "drawn_cards": shared.get("drawn_cards", []),
+        "individual_readings": shared.get("individual_readings", []),
+        "combined_reading": shared.get("combined_reading", ""),
+        "reading_summary": shared.get("reading_summary", ""),
+        "save_success": shared.get("save_success", False) if save_result else None,
+        "token_usage": shared.get("token_usage", {}),
+        "trace": shared.get(TRACE_KEY, []),
+        "degraded": shared.get("degraded", False),  # 超出时间预算，退回了快速占卜的结果
+        "timestamp": shared.get("timestamp", "")
+    }
+
+# 同步入口运行异步流程时共用的常驻事件循环。异步LLM客户端按事件循环复用，
+# 每个请求都 asyncio.run 会为每个请求新建一套客户端和连接池，且不会被关闭
+_background_loop = None
+_background_loop_pid = None
+_background_loop_lock = threading.Lock()
+
+def _get_background_loop():
+    """获取常驻事件循环（首次调用时在后台线程中启动，fork后的子进程会重新创建）"""
+    global _background_loop, _background_loop_pid
+    with _background_loop_lock:
+        if _background_loop is None or _background_loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="reading-flow-loop", daemon=True).start()
+            _background_loop, _background_loop_pid = loop, os.getpid()
+        return _background_loop
+
+def run_in_background_loop(coro):
+    """
+    在常驻事件循环中运行协程，阻塞等待并返回结果
+    
+    协程在调用方contextvars的副本中运行（保留时间预算、是否跳过LLM缓存等请求级设置）。
+    不能在常驻事件循环自己的线程中调用。
+    """
+    loop = _get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_in_background_loop() cannot be called from the background loop itself")
+    
+    result = concurrent.futures.Future()
+    
+    def copy_result(task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+    
+    def start():
+        # 任务创建时复制当前（即调用方的）上下文
+        asyncio.ensure_future(coro).add_done_callback(copy_result)
+    
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return result.result()
+
+def run_tarot_reading(user_question: str, spread_type: str = None, save_result: bool = True,
+                      stream_callback=None):
+    """
+    运行完整的塔罗牌占卜流程
+    
+    Args:
+        user_question: 用户的问题
+        spread_type: 指定的牌阵类型（可选，如果不指定会自动推荐）
+        save_result: 是否保存结果
+        stream_callback: 综合解读生成时接收增量文本的回调（可选）
+        
+    Returns:
+        包含占卜结果的字典
+    """
+    # 并发单牌解读、流水线模式和DAG调度需要事件循环，交给常驻事件循环上的异步流程执行
+    if save_result and (get_individual_reading_mode() == "parallel" or get_combined_reading_mode() == "pipeline"
+                        or get_reading_flow_executor() == "dag"):
+        return run_in_background_loop(
+            run_tarot_reading_async(user_question, spread_type, save_result, stream_callback)
+        )
+    
+    shared = _create_shared(user_question, spread_type, stream_callback)
     
     # 选择合适的流程 - 使用优化后的完整流程
     if save_result:
         # 使用完整流程（已优化批量LLM调用）
-        flow = create_tarot_reading_flow()
+        flow = get_tarot_reading_flow()
     else:
         # 演示模式使用快速流程
-        flow = create_quick_reading_flow()
+        flow = get_quick_reading_flow()
     
-    # 运行流程
+    # 运行流程（设置了时间预算时，超时退回快速占卜的结果）
+    flow_budget, reserve = get_reading_deadline()
     try:
-        flow.run(shared)
+        try:
+            with deadline(flow_budget):
+                flow.run(shared)
+        except DeadlineExceeded as e:
+            print(f"占卜超出时间预算，退回快速占卜: {str(e)}")
+            degraded_flow, degraded_budget = _prepare_degraded_reading(shared, save_result, False, reserve)
+            with deadline(degraded_budget):
+                degraded_flow.run(shared)
+        return _build_result(shared, save_result)
         
-        # 整理返回结果
-        result = {
-            "success": True,
-            "question": shared.get("user_question", ""),
-            "question_category": shared.get("question_category", ""),
-            "spread_type": shared.get("spread_type", ""),
-            "spread_name": shared.get("spread_config", {}).get("name", ""),
-            "drawn_cards": shared.get("drawn_cards", []),
-            "individual_readings": shared.get("individual_readings", []),
-            "combined_reading": shared.get("combined_reading", ""),
-            "reading_summary": shared.get("reading_summary", ""),
-            "save_success": shared.get("save_success", False) if save_result else None,
-            "timestamp": shared.get("timestamp", "")
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "question": user_question
         }
+    finally:
+        export_reading_trace(shared)
+
+def stream_tarot_reading(user_question: str, spread_type: str = None, save_result: bool = True):
+    """
+    以事件流的形式运行占卜：综合解读的文本边生成边返回
+    
+    流程在后台线程中运行，生成器逐个产出事件：
+    ("delta", 文本片段) 若干个，最后是 ("result", 完整结果字典)。
+    
+    Args:
+        user_question: 用户的问题
+        spread_type: 指定的牌阵类型（可选）
+        save_result: 是否保存结果
         
-        return result
+    Yields:
+        (事件类型, 数据) 元组
+    """
+    events = queue.Queue()
+    
+    def worker():
+        result = run_tarot_reading(
+            user_question, spread_type, save_result,
+            stream_callback=lambda delta: events.put(("delta", delta))
+        )
+        events.put(("result", result))
+    
+    # 在当前上下文中运行流程（保留请求级设置，例如是否跳过LLM缓存）
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(worker,), daemon=True).start()
+    
+    while True:
+        event = events.get()
+        yield event
+        if event[0] == "result":
+            return
+
+async def run_tarot_reading_async(user_question: str, spread_type: str = None, save_result: bool = True,
+                                  stream_callback=None):
+    """
+    运行塔罗牌占卜流程（异步版本，参数和返回值与 run_tarot_reading 相同）
+    
+    在同一个事件循环中并发调用多次即可同时处理多个占卜。
+    """
+    shared = _create_shared(user_question, spread_type, stream_callback)
+    flow = get_async_tarot_reading_flow() if save_result else get_quick_reading_flow(use_async=True)
+    
+    flow_budget, reserve = get_reading_deadline()
+    try:
+        try:
+            with deadline(flow_budget):
+                await flow.run_async(shared)
+        except DeadlineExceeded as e:
+            print(f"占卜超出时间预算，退回快速占卜: {str(e)}")
+            degraded_flow, degraded_budget = _prepare_degraded_reading(shared, save_result, True, reserve)
+            with deadline(degraded_budget):
+                await degraded_flow.run_async(shared)
+        return _build_result(shared, save_result)
         
     except Exception as e:
         return {
@@ -144,6 +516,24 @@ def run_tarot_reading(user_question: str, spread_type: str = None, save_result:
             "error": str(e),
             "question": user_question
         }
+    finally:
+        export_reading_trace(shared)
+
+async def run_batch_readings_async(questions_list: list, spread_type: str = "single"):
+    """
+    并发运行多个占卜问题（所有问题的LLM请求同时进行）
+    
+    Args:
+        questions_list: 问题列表
+        spread_type: 统一使用的牌阵类型
+        
+    Returns:
+        与问题顺序一致的占卜结果列表
+    """
+    return await asyncio.gather(*(
+        run_tarot_reading_async(question, spread_type, save_result=False)
+        for question in questions_list
+    ))
 
 def run_batch_readings(questions_list: list, spread_type: str = "single"):
     """
@@ -164,6 +554,162 @@ def run_batch_readings(questions_list: list, spread_type: str = "single"):
     
     return results
 
+def _start_benchmark_stub(base_latency: float, per_card_latency: float):
+    """
+    启动基准测试用的本地OpenAI兼容桩服务，并让LLM调用指向它
+    
+    模拟的响应耗时与输出长度成正比：base_latency + per_card_latency × 输出相当的牌数
+    （批量prompt按其中的牌数计，单张牌计1，综合解读按3张牌的篇幅计）。
+    """
+    from utils.call_llm import close_llm_clients, start_stub_llm_server
+    
+    def reply(prompt):
+        if "---" in prompt:
+            card_count = len(re.findall(r"\n牌\d+: ", prompt))
+            text = "\n\n---\n\n".join(f"牌{i}解读:\n这张牌提示你保持耐心，稳步前进。" for i in range(1, card_count + 1))
+            return text, base_latency + per_card_latency * card_count
+        if "综合" in prompt:
+            return "塔罗牌提示你保持耐心，稳步前进。\n各张牌共同指向一段积累期。", base_latency + per_card_latency * 3
+        return "这张牌提示你保持耐心，稳步前进。", base_latency + per_card_latency
+    
+    server = start_stub_llm_server(reply)
+    os.environ.update({
+        "LLM_PROVIDER": "openai",
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+        "INTERPRETATION_CACHE_ENABLED": "false",
+        "LLM_CACHE_ENABLED": "false"
+    })
+    close_llm_clients()
+    return server
+
+def _best_of(rounds: int, run_once) -> float:
+    """运行 rounds 次，返回最短耗时（秒）"""
+    elapsed = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run_once()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+def benchmark_individual_reading(spread_type: str = "celtic_cross", rounds: int = 3,
+                                 base_latency: float = 0.1, per_card_latency: float = 0.15):
+    """
+    对比单牌解读的两种执行方式：一个批量prompt vs 每张牌一个prompt并发调用
+    
+    使用本地桩服务模拟LLM延迟。运行：python flow.py bench [牌阵] [轮数]
+    """
+    from utils.call_llm import close_llm_clients
+    
+    server = _start_benchmark_stub(base_latency, per_card_latency)
+    
+    # 问题分析到牌意准备都是本地计算，两种方式共用同样的抽牌结果
+    shared = _create_shared("我接下来半年的事业发展会怎样？", spread_type)
+    prepare = QuestionInputNode()
+    prepare >> SpreadSetupNode() >> CardDrawingNode() >> CardMeaningNode()
+    Flow(start=prepare).run(shared)
+    card_count = len(shared["card_meanings"])
+    
+    try:
+        batch = _best_of(rounds, lambda: IndividualReadingNode().run(dict(shared)))
+        parallel_node = ParallelIndividualReadingNode()
+        parallel = _best_of(rounds, lambda: asyncio.run(parallel_node.run_async(dict(shared))))
+    finally:
+        server.shutdown()
+        close_llm_clients()
+    
+    print(f"牌阵: {spread_type}（{card_count}张牌），并发上限: {parallel_node.max_concurrency}")
+    print(f"批量prompt:     {batch * 1000:.0f} ms")
+    print(f"每张牌并发调用: {parallel * 1000:.0f} ms")
+    print(f"加速比:         {batch / parallel:.2f}x")
+    return {"batch": batch, "parallel": parallel}
+
+def benchmark_reading_pipeline(spread_type: str = "three_card", rounds: int = 3,
+                               base_latency: float = 0.1, per_card_latency: float = 0.15):
+    """
+    对比完整占卜流程中综合解读的执行方式：顺序执行 vs 流水线（以及流水线 + 修订、DAG调度的流水线 + 修订）
+    
+    使用本地桩服务模拟LLM延迟，占卜记录写入临时目录。运行：python flow.py bench [牌阵] [轮数]
+    """
+    import tempfile
+    from utils.call_llm import close_llm_clients
+    from utils import reading_storage
+    
+    server = _start_benchmark_stub(base_latency, per_card_latency)
+    storage_dir = reading_storage.STORAGE_DIR
+    reading_storage.set_storage_dir(tempfile.mkdtemp())
+    
+    def run(combined_mode, refine=None, executor="chain"):
+        async def run_once():
+            if refine is not None:
+                os.environ["COMBINED_READING_REFINE"] = "true" if refine else "false"
+            os.environ["READING_FLOW_EXECUTOR"] = executor
+            flow = get_async_tarot_reading_flow(combined_mode=combined_mode)
+            await flow.run_async(_create_shared("我接下来半年的事业发展会怎样？", spread_type))
+        return _best_of(rounds, lambda: asyncio.run(run_once()))
+    
+    try:
+        sequential = run("sequential")
+        pipeline = run("pipeline", refine=False)
+        refined = run("pipeline", refine=True)
+        dag_refined = run("pipeline", refine=True, executor="dag")
+    finally:
+        os.environ.pop("COMBINED_READING_REFINE", None)
+        os.environ.pop("READING_FLOW_EXECUTOR", None)
+        reading_storage.set_storage_dir(storage_dir)
+        server.shutdown()
+        close_llm_clients()
+    
+    print(f"牌阵: {spread_type}，单牌解读模式: {get_individual_reading_mode()}")
+    print(f"顺序执行:        {sequential * 1000:.0f} ms")
+    print(f"流水线:          {pipeline * 1000:.0f} ms")
+    print(f"流水线 + 修订:   {refined * 1000:.0f} ms")
+    print(f"DAG调度（同上）: {dag_refined * 1000:.0f} ms")
+    return {"sequential": sequential, "pipeline": pipeline, "refined": refined, "dag_refined": dag_refined}
+
+def benchmark_flow_dispatch(runs: int = 20000):
+    """
+    测量流程调度本身的开销（不含LLM调用）：每次请求新建流程 vs 复用流程 vs 编译好的流程模板
+    
+    使用7个空节点组成与完整占卜相同长度的链，另外单独测量创建完整占卜流程的耗时。
+    运行：python flow.py bench-dispatch [次数]
+    """
+    import tracemalloc
+    from macore import Node
+    
+    def build_chain():
+        nodes = [Node() for _ in range(7)]
+        for current, following in zip(nodes, nodes[1:]):
+            current >> following
+        return Flow(start=nodes[0])
+    
+    prebuilt = build_chain()
+    compiled = build_chain().compile()
+    cases = {
+        "每次新建流程": lambda: build_chain().run({}),
+        "复用流程（逐节点复制）": lambda: prebuilt.run({}),
+        "编译好的流程模板": lambda: compiled.run({}),
+    }
+    
+    results = {}
+    for name, run_once in cases.items():
+        elapsed = _best_of(3, lambda: [run_once() for _ in range(runs)]) / runs
+        # 单次运行期间的峰值内存增量
+        tracemalloc.start()
+        run_once()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run_once()
+        allocated = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        results[name] = elapsed
+        print(f"{name}: {elapsed * 1e6:.2f} µs/次，峰值内存增量 {allocated} B")
+    
+    build_tarot = _best_of(3, lambda: [create_tarot_reading_flow() for _ in range(runs // 10)]) / (runs // 10)
+    print(f"创建完整占卜流程: {build_tarot * 1e6:.2f} µs/次（使用编译好的模板后每个请求省去）")
+    results["build_tarot_flow"] = build_tarot
+    return results
+
 def demo_reading():
     """
     演示占卜功能
@@ -205,6 +751,18 @@ def demo_reading():
     return "演示完成"
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        bench_spread = sys.argv[2] if len(sys.argv) > 2 else "celtic_cross"
+        bench_rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+        print("单牌解读：批量 vs 并发")
+        benchmark_individual_reading(bench_spread, bench_rounds)
+        print("\n综合解读：顺序 vs 流水线")
+        benchmark_reading_pipeline(bench_spread, bench_rounds)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "bench-dispatch":
+        benchmark_flow_dispatch(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+        sys.exit(0)
+    
     # 测试流程功能
     print("测试塔罗牌占卜流程:")
     
@@ -235,4 +793,10 @@ if __name__ == "__main__":
     successful = sum(1 for r in batch_results if r["success"])
     print(f"成功率: {successful}/{len(batch_results)}")
     
+    # 测试异步并发占卜
+    print("\n3. 测试异步并发占卜:")
+    async_results = asyncio.run(run_batch_readings_async(test_questions))
+    successful = sum(1 for r in async_results if r["success"])
+    print(f"✓ 并发处理 {len(async_results)} 个问题，成功率: {successful}/{len(async_results)}")
+    
     print("\n流程测试完成！")
\ No newline at end of file
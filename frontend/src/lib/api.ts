@@ -110,6 +110,68 @@ class TarotAPI {
     });
   }
 
+  // 流式创建占卜：综合解读生成过程中每收到一段文本调用一次 onDelta，结束后返回完整结果
+  async createReadingStream(
+    params: {
+      question: string;
+      spread_type?: string;
+      save_result?: boolean;
+    },
+    onDelta: (text: string) => void,
+    signal?: AbortSignal
+  ): Promise<ReadingResult> {
+    const response = await fetch(`${API_BASE_URL}/reading/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+      },
+      body: JSON.stringify(params),
+      signal,
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE 消息之间以空行分隔
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of message.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'delta') {
+          onDelta(payload.text);
+        } else if (event === 'result') {
+          return payload as ReadingResult;
+        } else if (event === 'error') {
+          throw new Error(payload.error || '占卜过程中发生错误');
+        }
+      }
+    }
+
+    throw new Error('占卜结果流意外结束');
+  }
+
   // 获取牌阵列表
   async getSpreads(): Promise<ApiResponse<SpreadInfo[]>> {
     const response = await this.request<{ success: boolean; spreads: SpreadInfo[] }>('/spreads');
@@ -134,19 +196,24 @@ class TarotAPI {
     };
   }
 
-  // 获取占卜历史
+  // 获取占卜历史（cursor 为上一页返回的 next_cursor；fields='summary' 只返回摘要字段）
   async getReadingHistory(params: {
     limit?: number;
     offset?: number;
+    cursor?: string;
+    fields?: string;
   } = {}): Promise<ApiResponse<{
     readings: ReadingHistory[];
     total: number;
     limit: number;
     offset: number;
+    next_cursor: string | null;
   }>> {
     const query = new URLSearchParams();
     if (params.limit) query.append('limit', params.limit.toString());
     if (params.offset) query.append('offset', params.offset.toString());
+    if (params.cursor) query.append('cursor', params.cursor);
+    if (params.fields) query.append('fields', params.fields);
     
     const queryString = query.toString();
     const endpoint = `/history${queryString ? `?${queryString}` : ''}`;
@@ -157,6 +224,7 @@ class TarotAPI {
       total: number;
       limit: number;
       offset: number;
+      next_cursor?: string | null;
     }>(endpoint);
     
     return {
@@ -166,10 +234,25 @@ class TarotAPI {
         total: response.total,
         limit: response.limit,
         offset: response.offset,
+        next_cursor: response.next_cursor ?? null,
       },
     };
   }
 
+  // 获取一页历史摘要（cursor 为上一页返回的 next_cursor，为 null 表示没有更多记录）
+  async getReadingSummaryPage(cursor?: string, pageSize: number = 50): Promise<{
+    readings: ReadingHistory[];
+    total: number;
+    next_cursor: string | null;
+  }> {
+    const response = await this.getReadingHistory({ limit: pageSize, cursor, fields: 'summary' });
+    return {
+      readings: response.data?.readings || [],
+      total: response.data?.total || 0,
+      next_cursor: response.data?.next_cursor ?? null,
+    };
+  }
+
   // 获取统计信息
   async getStatistics(): Promise<ApiResponse<Statistics>> {
     const response = await this.request<{ success: boolean; statistics: Statistics }>('/statistics');
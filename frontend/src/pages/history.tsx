@@ -3,7 +3,7 @@ import Head from 'next/head';
 import Link from 'next/link';
 import { motion } from 'framer-motion';
 import { ArrowLeft, Calendar, Filter, Eye, Trash2, Search, Clock, Star, TrendingUp } from 'lucide-react';
-import { tarotAPI } from '../lib/api';
+import { tarotAPI, ReadingHistory } from '../lib/api';
 
 interface ReadingRecord {
   id: string;
@@ -35,6 +35,17 @@ const getCardCount = (spreadType: string): number => {
   return counts[spreadType] || 1;
 };
 
+const toReadingRecord = (item: ReadingHistory): ReadingRecord => ({
+  id: item.id,
+  question: item.user_question,
+  question_category: item.question_category,
+  spread_type: item.spread_type,
+  spread_name: getSpreadName(item.spread_type),
+  reading_summary: item.reading_summary,
+  timestamp: item.timestamp,
+  cards_count: getCardCount(item.spread_type)
+});
+
 const HistoryPage: React.FC = () => {
   const [readings, setReadings] = useState<ReadingRecord[]>([]);
   const [filteredReadings, setFilteredReadings] = useState<ReadingRecord[]>([]);
@@ -42,6 +53,9 @@ const HistoryPage: React.FC = () => {
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedReading, setSelectedReading] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalCount, setTotalCount] = useState(0);
   const [currentPage, setCurrentPage] = useState(1);
   const itemsPerPage = 6;
 
@@ -50,23 +64,12 @@ const HistoryPage: React.FC = () => {
     const loadReadings = async () => {
       setIsLoading(true);
       try {
-        // 尝试从API加载数据
-        const response = await tarotAPI.getReadingHistory();
-        const historyData = response.data?.readings || [];
-        
-        // 转换数据格式
-        const data: ReadingRecord[] = historyData.map(item => ({
-          id: item.id,
-          question: item.user_question,
-          question_category: item.question_category,
-          spread_type: item.spread_type,
-          spread_name: getSpreadName(item.spread_type),
-          reading_summary: item.reading_summary,
-          timestamp: item.timestamp,
-          cards_count: getCardCount(item.spread_type)
-        }));
+        // 尝试从API加载第一页（游标分页，只取摘要字段），后续页点击“加载更多”时再取
+        const page = await tarotAPI.getReadingSummaryPage();
         
-        setReadings(data);
+        setReadings(page.readings.map(toReadingRecord));
+        setNextCursor(page.next_cursor);
+        setTotalCount(page.total);
       } catch (error) {
         // 使用模拟数据
         const mockReadings: ReadingRecord[] = [
@@ -129,6 +132,21 @@ const HistoryPage: React.FC = () => {
     loadReadings();
   }, []);
 
+  // 加载下一页
+  const loadMoreReadings = async () => {
+    if (!nextCursor || isLoadingMore) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await tarotAPI.getReadingSummaryPage(nextCursor);
+      setReadings(prev => [...prev, ...page.readings.map(toReadingRecord)]);
+      setNextCursor(page.next_cursor);
+      setTotalCount(page.total);
+    } catch (error) {
+      console.error('加载更多历史记录失败:', error);
+    }
+    setIsLoadingMore(false);
+  };
+
   // 过滤和搜索
   useEffect(() => {
     let filtered = readings;
@@ -156,9 +174,13 @@ const HistoryPage: React.FC = () => {
     filtered.sort((a, b) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime());
 
     setFilteredReadings(filtered);
-    setCurrentPage(1);
   }, [readings, currentFilter, searchTerm]);
 
+  // 切换筛选条件时回到第一页（加载更多时保持当前页）
+  useEffect(() => {
+    setCurrentPage(1);
+  }, [currentFilter, searchTerm]);
+
   const formatDate = (timestamp: string) => {
     const date = new Date(timestamp);
     return date.toLocaleDateString('zh-CN', {
@@ -197,7 +219,7 @@ const HistoryPage: React.FC = () => {
 
   // 统计数据
   const stats = {
-    total: readings.length,
+    total: Math.max(totalCount, readings.length),
     thisWeek: readings.filter(r => {
       const oneWeekAgo = new Date();
       oneWeekAgo.setDate(oneWeekAgo.getDate() - 7);
@@ -472,6 +494,19 @@ const HistoryPage: React.FC = () => {
             </motion.div>
           )}
 
+          {/* Load More */}
+          {!isLoading && nextCursor && (
+            <div className="flex justify-center mt-8">
+              <button
+                onClick={loadMoreReadings}
+                disabled={isLoadingMore}
+                className="btn-secondary disabled:opacity-50 disabled:cursor-not-allowed"
+              >
+                {isLoadingMore ? '加载中...' : `加载更多（已加载 ${readings.length} / ${totalCount}）`}
+              </button>
+            </div>
+          )}
+
           {/* Bottom CTA */}
           <motion.div
             initial={{ opacity: 0, y: 50 }}
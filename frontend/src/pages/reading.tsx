@@ -80,6 +80,7 @@ const ReadingPage: React.FC = () => {
   const [isDrawing, setIsDrawing] = useState(false);
   const [currentMysticalText, setCurrentMysticalText] = useState<string>('');
   const [textIndex, setTextIndex] = useState<number>(0);
+  const [streamingText, setStreamingText] = useState<string>('');
 
   // 加载牌阵信息
   useEffect(() => {
@@ -124,6 +125,7 @@ const ReadingPage: React.FC = () => {
     setIsLoading(true);
     setIsDrawing(true);
     setApiError(null);
+    setStreamingText('');
     
     try {
       const selectedSpreadInfo = spreads.find(s => s.id === selectedSpread);
@@ -151,11 +153,15 @@ const ReadingPage: React.FC = () => {
       const timeoutId = setTimeout(() => controller.abort(), 30000); // 30秒超时
       
       try {
-        const result = await tarotAPI.createReading({
-          question,
-          spread_type: selectedSpread,
-          save_result: true
-        });
+        // 流式接收综合解读，生成过程中即时显示
+        const result = await tarotAPI.createReadingStream(
+          {
+            question,
+            spread_type: selectedSpread,
+            save_result: true
+          },
+          (text) => setStreamingText(prev => prev + text)
+        );
         
         clearTimeout(timeoutId);
         console.log('API响应:', result);
@@ -295,6 +301,7 @@ const ReadingPage: React.FC = () => {
                 isDrawing={isDrawing}
                 drawnCards={drawnCards}
                 currentMysticalText={currentMysticalText}
+                streamingText={streamingText}
                 onStartReading={handleStartReading}
               />
             )}
@@ -471,8 +478,9 @@ const CardsStep: React.FC<{
   isDrawing: boolean;
   drawnCards: Card[];
   currentMysticalText: string;
+  streamingText: string;
   onStartReading: () => void;
-}> = ({ selectedSpread, selectedSpreadId, isLoading, isDrawing, drawnCards, currentMysticalText, onStartReading }) => (
+}> = ({ selectedSpread, selectedSpreadId, isLoading, isDrawing, drawnCards, currentMysticalText, streamingText, onStartReading }) => (
   <motion.div
     initial={{ opacity: 0, y: 50 }}
     animate={{ opacity: 1, y: 0 }}
@@ -547,17 +555,23 @@ const CardsStep: React.FC<{
             </div>
           </div>
           
-          {/* 循环神秘文案 */}
-          <motion.div
-            key={currentMysticalText}
-            initial={{ opacity: 0, y: 20 }}
-            animate={{ opacity: 1, y: 0 }}
-            exit={{ opacity: 0, y: -20 }}
-            transition={{ duration: 0.8 }}
-            className="text-gray-300 leading-relaxed font-mystical text-lg"
-          >
-            {currentMysticalText}
-          </motion.div>
+          {/* 综合解读开始生成后实时显示，之前显示循环神秘文案 */}
+          {streamingText ? (
+            <div className="text-left text-gray-200 leading-relaxed whitespace-pre-wrap p-4 bg-purple-900/30 rounded-xl border border-purple-500/30">
+              {streamingText}
+            </div>
+          ) : (
+            <motion.div
+              key={currentMysticalText}
+              initial={{ opacity: 0, y: 20 }}
+              animate={{ opacity: 1, y: 0 }}
+              exit={{ opacity: 0, y: -20 }}
+              transition={{ duration: 0.8 }}
+              className="text-gray-300 leading-relaxed font-mystical text-lg"
+            >
+              {currentMysticalText}
+            </motion.div>
+          )}
           
           {/* 呼吸动画的点点 */}
           <div className="flex justify-center gap-2 mt-6">
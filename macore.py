@@ -3,21 +3,120 @@
 MACore Framework - MACore Application Framework
 A lightweight framework for building LLM applications with nodes and flows.
 """
-import asyncio, warnings, copy, time
+import asyncio, warnings, copy, time, contextvars, heapq
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from types import MappingProxyType
+
+class FlowContext:
+    """Mutable state of one compiled-flow run: params and per-node retry attempts"""
+    __slots__=("params","retries")
+    def __init__(self,params=None): self.params=params or {}; self.retries={}
+
+_flow_context=contextvars.ContextVar("macore_flow_context",default=None)
+
+def current_flow_context(): return _flow_context.get()
+
+class DeadlineExceeded(TimeoutError): pass
+
+_deadline=contextvars.ContextVar("macore_deadline",default=None)  # time.monotonic() value
+
+@contextmanager
+def deadline(seconds):
+    """Run the block (flows, nodes, LLM calls reading remaining_time()) with a deadline; never extends an enclosing one"""
+    current=_deadline.get(); new=None if seconds is None else time.monotonic()+seconds
+    token=_deadline.set(current if new is None or (current is not None and current<=new) else new)
+    try: yield
+    finally: _deadline.reset(token)
+
+def remaining_time():
+    """Seconds left before the current deadline (0 when passed), None without one"""
+    d=_deadline.get()
+    return None if d is None else max(0.0,d-time.monotonic())
+
+def _check_deadline(node):
+    if remaining_time()==0: raise DeadlineExceeded(f"Deadline exceeded before {type(node).__name__}")
+
+_hooks=[]
+_current_run=contextvars.ContextVar("macore_node_run",default=None)
+
+def add_hook(hook):
+    """Register an instrumentation hook: any object with on_node_start(run) and/or on_node_finish(run)"""
+    _hooks.append(hook); return hook
+def remove_hook(hook): _hooks.remove(hook)
+
+def _emit(event,run):
+    for hook in list(_hooks):
+        callback=getattr(hook,event,None)
+        if callback is None: continue
+        try: callback(run)
+        except Exception as e: warnings.warn(f"Hook {event} failed: {e!r}")
+
+def _note_exception(exc,retrying):
+    run=_current_run.get()
+    if run is not None: run.exceptions.append(exc); run.retries+=retrying
+
+class NodeRun:
+    """One node execution as seen by hooks: monotonic phase timings, retries, caught and raised exceptions"""
+    __slots__=("node","shared","wall_ns","start_ns","end_ns","phases","retries","exceptions","error","action","_token")
+    def __init__(self,node,shared):
+        self.node,self.shared,self.wall_ns,self.start_ns,self.end_ns=node,shared,time.time_ns(),time.perf_counter_ns(),None
+        self.phases,self.retries,self.exceptions,self.error,self.action={},0,[],None,None
+    @property
+    def name(self): return getattr(self.node,"name",None) or type(self.node).__name__
+    @property
+    def duration_ms(self): return ((self.end_ns or time.perf_counter_ns())-self.start_ns)/1e6
+    def _phase(self,phase,since): now=time.perf_counter_ns(); self.phases[phase]=(now-since)/1e6; return now
+    def _begin(self): self._token=_current_run.set(self); _emit("on_node_start",self)
+    def _end(self,error):
+        self.end_ns,self.error=time.perf_counter_ns(),error; _current_run.reset(self._token); _emit("on_node_finish",self)
+    def to_dict(self):
+        return {"node":self.name,"start_unix_ns":self.wall_ns,"duration_ms":round(self.duration_ms,3),
+                "phases":{k:round(v,3) for k,v in self.phases.items()},"retries":self.retries,
+                "exceptions":[repr(e) for e in self.exceptions],"error":repr(self.error) if self.error is not None else None,
+                "action":self.action if isinstance(self.action,str) else None}
+
+class TraceCollector:
+    """Hook that appends one NodeRun.to_dict() record per node run to shared[key]"""
+    def __init__(self,key="trace"): self.key=key
+    def on_node_finish(self,run):
+        if isinstance(run.shared,dict): run.shared.setdefault(self.key,[]).append(run.to_dict())
 
 class BaseNode:
+    _frozen=False
+    reads=(); writes=()  # shared-store keys used by prep/post, for DagFlow scheduling
+    merges=()  # written keys updated merge-safely (e.g. under a lock): writers that all list a key may overlap
     def __init__(self): 
         self.params = {}
         self.successors = {}
+    @property
+    def params(self):
+        ctx=_flow_context.get() if self._frozen else None
+        return self._params if ctx is None else ctx.params
+    @params.setter
+    def params(self,params):
+        if self._frozen: raise RuntimeError("Node belongs to a compiled flow; params come from the run context")
+        self._params=params
     def set_params(self,params): self.params=params
     def next(self,node,action="default"):
+        if self._frozen: raise RuntimeError("Node belongs to a compiled flow and can't be rewired")
         if action in self.successors: warnings.warn(f"Overwriting successor for action '{action}'")
         self.successors[action]=node; return node
     def prep(self,shared): pass
     def exec(self,prep_res): pass
     def post(self,shared,prep_res,exec_res): pass
     def _exec(self,prep_res): return self.exec(prep_res)
-    def _run(self,shared): p=self.prep(shared); e=self._exec(p); return self.post(shared,p,e)
+    def _run(self,shared):
+        if _deadline.get() is not None: _check_deadline(self)
+        if _hooks: return self._run_traced(shared)
+        p=self.prep(shared); e=self._exec(p); return self.post(shared,p,e)
+    def _run_traced(self,shared):
+        run,error=NodeRun(self,shared),None; run._begin()
+        try:
+            t=run.start_ns; p=self.prep(shared); t=run._phase("prep",t); e=self._exec(p); t=run._phase("exec",t)
+            run.action=self.post(shared,p,e); run._phase("post",t); return run.action
+        except BaseException as ex: error=ex; raise
+        finally: run._end(error)
     def run(self,shared): 
         if self.successors: warnings.warn("Node won't run successors. Use Flow.")  
         return self._run(shared)
@@ -31,14 +130,32 @@ class _ConditionalTransition:
     def __rshift__(self,tgt): return self.src.next(tgt,self.action)
 
 class Node(BaseNode):
-    def __init__(self,max_retries=1,wait=0): super().__init__(); self.max_retries,self.wait=max_retries,wait
+    """
+    timeout: seconds per exec attempt. It becomes the deadline seen by remaining_time() during exec;
+    async nodes are cancelled when it (or an enclosing deadline) passes, sync exec can't be
+    interrupted and must honour remaining_time() itself. No retries once the deadline has passed.
+    """
+    def __init__(self,max_retries=1,wait=0,timeout=None): super().__init__(); self.max_retries,self.wait,self.timeout=max_retries,wait,timeout
+    @property
+    def retry_attempt(self):
+        ctx=_flow_context.get()
+        return self.__dict__.get("_retry_attempt",0) if ctx is None else ctx.retries.get(id(self),0)
+    @retry_attempt.setter
+    def retry_attempt(self,attempt):
+        ctx=_flow_context.get()
+        if ctx is None: self._retry_attempt=attempt
+        elif attempt or id(self) in ctx.retries: ctx.retries[id(self)]=attempt
     def exec_fallback(self,prep_res,exc): raise exc
     def _exec(self,prep_res):
         for self.retry_attempt in range(self.max_retries):
-            try: return self.exec(prep_res)
+            try:
+                if self.timeout is None: return self.exec(prep_res)
+                with deadline(self.timeout): return self.exec(prep_res)
             except Exception as e:
-                if self.retry_attempt==self.max_retries-1: return self.exec_fallback(prep_res,e)
-                if self.wait>0: time.sleep(self.wait)
+                last=self.retry_attempt==self.max_retries-1 or remaining_time()==0
+                if _hooks: _note_exception(e,not last)
+                if last: return self.exec_fallback(prep_res,e)
+                if self.wait>0: time.sleep(min(self.wait,remaining_time() or self.wait))
 
 class BatchNode(Node):
     def _exec(self,items): return [super(BatchNode,self)._exec(i) for i in (items or [])]
@@ -56,6 +173,111 @@ class Flow(BaseNode):
         return last_action
     def _run(self,shared): p=self.prep(shared); o=self._orch(shared); return self.post(shared,p,o)
     def post(self,shared,prep_res,exec_res): return exec_res
+    def compile(self): return (AsyncCompiledFlow if isinstance(self,AsyncFlow) else CompiledFlow)(self.start_node,self.params)
+
+class CompiledFlow(Flow):
+    """
+    Immutable flow template: the graph is copied and frozen once, the copies are shared by all runs
+    (no per-run copies) and per-run state lives in a FlowContext. The original nodes stay editable.
+    Nodes must keep per-run data in prep_res/shared rather than on self.
+    """
+    def __init__(self,start=None,params=None):
+        super().__init__(start); self.params=dict(params or {}); self.transitions={}; self._copies={}
+        self.start_node=self._freeze(start)
+    def _freeze(self,start):
+        """Copy the nodes reachable from start (once per node) and freeze the copies; returns start's copy"""
+        pending,new=[start] if start else [],[]
+        while pending:
+            node=pending.pop()
+            if node in self._copies: continue
+            self._copies[node]=copy.copy(node); new.append(node); pending.extend(node.successors.values())
+        for node in new:
+            c=self._copies[node]; c._frozen=True
+            c.successors=self.transitions[c]=MappingProxyType({a:self._copies[m] for a,m in node.successors.items()})
+        return self._copies.get(start)
+    def start(self,start): raise RuntimeError("Compiled flow can't be rewired")
+    def compile(self): return self
+    def get_next_node(self,curr,action):
+        nxt=self.transitions[curr].get(action or "default")
+        if not nxt and curr.successors: warnings.warn(f"Flow ends: '{action}' not found in {list(curr.successors)}")
+        return nxt
+    def _orch(self,shared,params=None):
+        token=_flow_context.set(FlowContext(params or self.params))
+        try:
+            curr,last_action=self.start_node,None
+            while curr: last_action=curr._run(shared); curr=self.get_next_node(curr,last_action)
+            return last_action
+        finally: _flow_context.reset(token)
+
+class DagFlow(CompiledFlow):
+    """
+    Compiled flow over a dependency graph. Each node waits for its explicit predecessors
+    (>> / - "action" >>) and for earlier nodes it has a data hazard with: it reads a key they
+    write, writes a key they read, or writes a key they write (keys from the node's reads/writes;
+    keys both writers list in merges don't order them). Ready nodes run concurrently on a thread pool.
+    A node with explicit predecessors runs only if one of those transitions fired.
+    """
+    def __init__(self,nodes,params=None,max_workers=8):
+        nodes=list(nodes); super().__init__(nodes[0] if nodes else None,params)
+        nodes=[self._freeze(node) for node in nodes]
+        self.max_workers,self._executor=max_workers,None
+        rank={n:i for i,n in enumerate(nodes+[n for n in self.transitions if n not in nodes])}
+        self.guards={n:[] for n in self.transitions}
+        for n,succ in self.transitions.items():
+            for action,m in succ.items(): self.guards[m].append((n,action))
+        indegree={n:len({p for p,_ in g}) for n,g in self.guards.items()}
+        heap=[(rank[n],n) for n,d in indegree.items() if not d]; heapq.heapify(heap); self.order=[]
+        while heap:
+            _,n=heapq.heappop(heap); self.order.append(n)
+            for m in set(self.transitions[n].values()):
+                indegree[m]-=1
+                if not indegree[m]: heapq.heappush(heap,(rank[m],m))
+        if len(self.order)<len(self.transitions): raise ValueError("DagFlow transitions must not form a cycle")
+        self.rank={n:i for i,n in enumerate(self.order)}
+        self.deps={n:{p for p,_ in g} for n,g in self.guards.items()}
+        for i,b in enumerate(self.order):
+            for a in self.order[:i]:
+                waw=(set(a.writes)&set(b.writes))-(set(a.merges)&set(b.merges))
+                if set(a.writes)&set(b.reads) or set(a.reads)&set(b.writes) or waw: self.deps[b].add(a)
+        self.dependents={n:[] for n in self.order}
+        for b in self.order:
+            for a in self.deps[b]: self.dependents[a].append(b)
+    def _should_run(self,node,actions):
+        guards=self.guards[node]
+        return not guards or any(p in actions and (actions[p] or "default")==a for p,a in guards)
+    def _finish(self,node,waiting,actions=None):
+        if actions is not None and node.successors and (actions[node] or "default") not in node.successors:
+            warnings.warn(f"DagFlow: '{actions[node]}' not found in {list(node.successors)}")
+        released=[]
+        for m in self.dependents[node]:
+            waiting[m]-=1
+            if not waiting[m]: released.append(m)
+        return sorted(released,key=self.rank.get)
+    def _last_action(self,actions): return next((actions[n] for n in reversed(self.order) if n in actions),None)
+    def _get_executor(self):
+        if self._executor is None: self._executor=ThreadPoolExecutor(self.max_workers,thread_name_prefix="macore-dag")
+        return self._executor
+    def _orch(self,shared,params=None):
+        token=_flow_context.set(FlowContext(params or self.params))
+        try:
+            waiting,actions,running,error={n:len(d) for n,d in self.deps.items()},{},{},None
+            ready=[n for n in self.order if not waiting[n]]
+            while ready or running:
+                while ready and error is None:
+                    node=ready.pop(0)
+                    if self._should_run(node,actions): running[self._get_executor().submit(contextvars.copy_context().run,node._run,shared)]=node
+                    else: ready.extend(self._finish(node,waiting))
+                if not running: break
+                done,_=wait(running,timeout=remaining_time(),return_when=FIRST_COMPLETED)
+                if not done: error=DeadlineExceeded("DagFlow deadline exceeded"); break  # running threads are abandoned
+                for future in sorted(done,key=lambda f: self.rank[running[f]]):
+                    node=running.pop(future)
+                    try: actions[node]=future.result()
+                    except Exception as e: error=error or e; continue
+                    ready.extend(self._finish(node,waiting,actions))
+            if error is not None: raise error
+            return self._last_action(actions)
+        finally: _flow_context.reset(token)
 
 class BatchFlow(Flow):
     def _run(self,shared):
@@ -70,14 +292,33 @@ class AsyncNode(Node):
     async def post_async(self,shared,prep_res,exec_res): pass
     async def _exec(self,prep_res): 
         for self.retry_attempt in range(self.max_retries):
-            try: return await self.exec_async(prep_res)
+            try:
+                if self.timeout is None and _deadline.get() is None: return await self.exec_async(prep_res)
+                with deadline(self.timeout): return await self._exec_until_deadline(prep_res)
             except Exception as e:
-                if self.retry_attempt==self.max_retries-1: return await self.exec_fallback_async(prep_res,e)
-                if self.wait>0: await asyncio.sleep(self.wait)
+                last=self.retry_attempt==self.max_retries-1 or remaining_time()==0
+                if _hooks: _note_exception(e,not last)
+                if last: return await self.exec_fallback_async(prep_res,e)
+                if self.wait>0: await asyncio.sleep(min(self.wait,remaining_time() or self.wait))
+    async def _exec_until_deadline(self,prep_res):
+        try: return await asyncio.wait_for(self.exec_async(prep_res),remaining_time())
+        except (asyncio.TimeoutError,TimeoutError):
+            if remaining_time()==0: raise DeadlineExceeded(f"{type(self).__name__} exceeded its deadline") from None
+            raise
     async def run_async(self,shared): 
         if self.successors: warnings.warn("Node won't run successors. Use AsyncFlow.")  
         return await self._run_async(shared)
-    async def _run_async(self,shared): p=await self.prep_async(shared); e=await self._exec(p); return await self.post_async(shared,p,e)
+    async def _run_async(self,shared):
+        if _deadline.get() is not None: _check_deadline(self)
+        if _hooks: return await self._run_traced_async(shared)
+        p=await self.prep_async(shared); e=await self._exec(p); return await self.post_async(shared,p,e)
+    async def _run_traced_async(self,shared):
+        run,error=NodeRun(self,shared),None; run._begin()
+        try:
+            t=run.start_ns; p=await self.prep_async(shared); t=run._phase("prep",t); e=await self._exec(p); t=run._phase("exec",t)
+            run.action=await self.post_async(shared,p,e); run._phase("post",t); return run.action
+        except BaseException as ex: error=ex; raise
+        finally: run._end(error)
     def _run(self,shared): raise RuntimeError("Use run_async.")
 
 class AsyncBatchNode(AsyncNode,BatchNode):
@@ -102,6 +343,40 @@ class AsyncFlow(Flow,AsyncNode):
     async def _run_async(self,shared): p=await self.prep_async(shared); o=await self._orch_async(shared); return await self.post_async(shared,p,o)
     async def post_async(self,shared,prep_res,exec_res): return exec_res
 
+class AsyncCompiledFlow(CompiledFlow,AsyncFlow):
+    async def _orch_async(self,shared,params=None):
+        token=_flow_context.set(FlowContext(params or self.params))
+        try:
+            curr,last_action=self.start_node,None
+            while curr: last_action=await curr._run_async(shared) if isinstance(curr,AsyncNode) else curr._run(shared); curr=self.get_next_node(curr,last_action)
+            return last_action
+        finally: _flow_context.reset(token)
+
+class AsyncDagFlow(DagFlow,AsyncFlow):
+    """DagFlow on the event loop: async nodes run as tasks, sync nodes in threads; a failure cancels the rest"""
+    async def _orch_async(self,shared,params=None):
+        token=_flow_context.set(FlowContext(params or self.params))
+        waiting,actions,running,error={n:len(d) for n,d in self.deps.items()},{},{},None
+        try:
+            ready=[n for n in self.order if not waiting[n]]
+            while (ready or running) and error is None:
+                while ready:
+                    node=ready.pop(0)
+                    if self._should_run(node,actions): running[asyncio.ensure_future(node._run_async(shared) if isinstance(node,AsyncNode) else asyncio.to_thread(node._run,shared))]=node
+                    else: ready.extend(self._finish(node,waiting))
+                if not running: break
+                done,_=await asyncio.wait(running,timeout=remaining_time(),return_when=asyncio.FIRST_COMPLETED)
+                if not done: error=DeadlineExceeded("DagFlow deadline exceeded"); break
+                for task in sorted(done,key=lambda t: self.rank[running[t]]):
+                    node=running.pop(task)
+                    if task.exception() is not None: error=error or task.exception(); continue
+                    actions[node]=task.result(); ready.extend(self._finish(node,waiting,actions))
+            if error is not None: raise error
+            return self._last_action(actions)
+        finally:
+            for task in running: task.cancel()
+            _flow_context.reset(token)
+
 class AsyncBatchFlow(AsyncFlow,BatchFlow):
     async def _run_async(self,shared):
         pr=await self.prep_async(shared) or []
@@ -118,5 +393,8 @@ __version__ = "0.2.1"
 __all__ = [
     'BaseNode', 'Node', 'BatchNode', 'Flow', 'BatchFlow',
     'AsyncNode', 'AsyncBatchNode', 'AsyncParallelBatchNode', 
-    'AsyncFlow', 'AsyncBatchFlow', 'AsyncParallelBatchFlow'
+    'AsyncFlow', 'AsyncBatchFlow', 'AsyncParallelBatchFlow',
+    'CompiledFlow', 'AsyncCompiledFlow', 'DagFlow', 'AsyncDagFlow', 'FlowContext', 'current_flow_context',
+    'NodeRun', 'TraceCollector', 'add_hook', 'remove_hook',
+    'DeadlineExceeded', 'deadline', 'remaining_time'
 ]
\ No newline at end of file
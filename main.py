@@ -8,7 +8,8 @@ import argparse
 import json
 from datetime import datetime
 from flow import run_tarot_reading, demo_reading, run_batch_readings
-from utils.reading_storage import get_reading_statistics, load_all_readings, get_readings_by_question_type
+from utils.reading_storage import apply_retention_policy, get_archive_summary, get_reading_statistics, load_all_readings, get_readings_by_question_type
+from utils.reading_export import EXPORT_FORMATS, stream_export_readings
 from utils.spread_config import get_all_spreads, get_spread_config
 from utils.tarot_database import get_all_cards, get_cards_by_suit, search_cards_by_keyword
 
@@ -109,6 +110,27 @@ def display_reading_result(result):
     
     print("\n" + "="*60)
 
+def export_history(args):
+    """导出占卜历史"""
+    output_file, count = stream_export_readings(
+        output_file=args.output,
+        fmt=args.format,
+        compress=True if args.gzip else None,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        question_category=args.category,
+        spread_type=args.spread_type,
+        include_archived=not args.hot_only
+    )
+    print(f"✅ 已导出 {count} 条占卜记录到 {output_file}")
+
+def archive_history(args):
+    """按保留策略归档旧的占卜记录"""
+    archived = apply_retention_policy(max_age_days=args.days, max_count=args.max_count)
+    summary = get_archive_summary()
+    print(f"✅ 已归档 {archived} 条占卜记录，"
+          f"归档分区 {summary['partitions']} 个，共 {summary['total_bytes']} 字节")
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="神秘塔罗牌占卜师")
@@ -116,9 +138,28 @@ def main():
     parser.add_argument("--question", "-q", type=str, help="直接进行占卜")
     parser.add_argument("--spread", "-s", type=str, help="指定牌阵类型")
     
+    subparsers = parser.add_subparsers(dest="command")
+    export_parser = subparsers.add_parser("export", help="流式导出占卜历史")
+    export_parser.add_argument("--format", "-f", choices=EXPORT_FORMATS, default="json", help="导出格式")
+    export_parser.add_argument("--output", "-o", type=str, help="输出文件路径（以 .gz 结尾时自动压缩）")
+    export_parser.add_argument("--gzip", action="store_true", help="使用gzip压缩")
+    export_parser.add_argument("--start-date", type=str, help="开始日期 YYYY-MM-DD")
+    export_parser.add_argument("--end-date", type=str, help="结束日期 YYYY-MM-DD")
+    export_parser.add_argument("--category", type=str, help="只导出该问题类型")
+    export_parser.add_argument("--spread-type", type=str, help="只导出该牌阵类型")
+    export_parser.add_argument("--hot-only", action="store_true", help="不导出已归档的记录")
+    
+    archive_parser = subparsers.add_parser("archive", help="按保留策略归档旧的占卜历史")
+    archive_parser.add_argument("--days", type=int, help="只保留最近多少天（默认 READING_RETENTION_DAYS）")
+    archive_parser.add_argument("--max-count", type=int, help="最多保留多少条（默认 READING_RETENTION_MAX_COUNT）")
+    
     args = parser.parse_args()
     
-    if args.demo:
+    if args.command == "export":
+        export_history(args)
+    elif args.command == "archive":
+        archive_history(args)
+    elif args.demo:
         demo_reading()
     elif args.question:
         result = run_tarot_reading(args.question, args.spread)
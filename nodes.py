@@ -4,18 +4,31 @@
 包含处理占卜流程的所有节点类
 """
 
-from macore import Node
-from utils.call_llm import call_llm
-from utils.tarot_database import get_card_info
+import asyncio
+import os
+import threading
+from macore import AsyncNode, AsyncParallelBatchNode, Node
+from utils.call_llm import call_llm, call_llm_async
+from utils.tarot_database import build_card_meanings
 from utils.card_drawer import draw_cards
+from utils.interpretation_cache import (
+    get_interpretation, interpretation_key, is_interpretation_cache_enabled, store_interpretation
+)
+from utils.llm_cache import bypass_llm_cache
+from utils.token_budget import TokenUsage, add_node_usage, fit_to_budget, get_prompt_budget, recording_usage
 from utils.spread_config import get_spread_config, recommend_spread_for_question
 from utils.reading_storage import save_reading
+from utils.reading_writer import enqueue_reading, is_async_save_enabled
 import json
 from datetime import datetime
 
 class QuestionInputNode(Node):
     """问题接收节点 - 接收并分析用户问题，确定问题类型和推荐牌阵"""
     
+    # DagFlow按读写的shared store键确定依赖
+    reads = ("user_question", "spread_type")
+    writes = ("question_category", "recommended_spread", "question_analysis", "spread_type")
+    
     def prep(self, shared):
         """从shared store读取用户输入的问题"""
         return {
@@ -84,6 +97,9 @@ class QuestionInputNode(Node):
 class SpreadSetupNode(Node):
     """牌阵初始化节点 - 根据选择的牌阵类型设置配置信息"""
     
+    reads = ("spread_type",)
+    writes = ("spread_type", "spread_config")
+    
     def prep(self, shared):
         """读取选择的牌阵类型"""
         return shared.get("spread_type", "single")
@@ -111,6 +127,9 @@ class SpreadSetupNode(Node):
 class CardDrawingNode(Node):
     """随机抽牌节点 - 根据牌阵要求随机抽取塔罗牌"""
     
+    reads = ("spread_config", "exclude_cards")
+    writes = ("drawn_cards",)
+    
     def prep(self, shared):
         """读取牌阵配置中的牌数要求"""
         spread_config = shared.get("spread_config", {})
@@ -138,6 +157,9 @@ class CardDrawingNode(Node):
 class CardMeaningNode(Node):
     """牌意检索节点 - 检索每张牌的详细含义信息"""
     
+    reads = ("drawn_cards", "spread_config")
+    writes = ("card_meanings",)
+    
     def prep(self, shared):
         """读取抽取的牌列表和牌阵配置"""
         drawn_cards = shared.get("drawn_cards", [])
@@ -151,88 +173,92 @@ class CardMeaningNode(Node):
     
     def exec(self, prep_res):
         """批量获取每张牌的含义信息"""
-        card_meanings = []
-        
-        for card in prep_res["drawn_cards"]:
-            card_name = card["name"]
-            position = card["position"]
-            
-            # 获取牌的基本信息
-            card_info = get_card_info(card_name)
-            
-            # 添加位置含义
-            position_info = prep_res["positions"].get(position, {})
-            card_info["position_info"] = position_info
-            card_info["card_state"] = card
-            
-            card_meanings.append(card_info)
-        
-        return card_meanings
+        return build_card_meanings(prep_res["drawn_cards"], prep_res["positions"])
     
     def post(self, shared, prep_res, exec_res):
         """将牌意信息写入shared store"""
         shared["card_meanings"] = exec_res
         return "default"
 
-class IndividualReadingNode(Node):
-    """个体解读节点 - 为每张牌在其位置上生成个性化解读"""
-    
-    def prep(self, shared):
-        """读取牌信息、位置含义和用户问题"""
-        return {
-            "card_meanings": shared.get("card_meanings", []),
-            "user_question": shared.get("user_question", ""),
-            "question_category": shared.get("question_category", "general"),
-            "spread_type": shared.get("spread_type", "single")
-        }
-    
-    def exec(self, prep_res):
-        """使用批量LLM调用为所有牌生成个性化解读（性能优化）"""
-        if not prep_res["card_meanings"]:
-            return []
+def _fallback_card_reading(card_info):
+    """LLM不可用时用牌意拼出的备用单牌解读"""
+    return {
+        "card_name": card_info["card_name"],
+        "position": card_info["position"],
+        "position_name": card_info["position_name"],
+        "reversed": card_info["is_reversed"],
+        "reading": f"{card_info['card_name']}{'逆位' if card_info['is_reversed'] else '正位'}在{card_info['position_name']}位置出现，{card_info['meaning_text']}"
+    }
+
+def successful_card_readings(individual_readings, card_meanings, question_category):
+    """去掉单牌解读中的备用解读（LLM失败或超时时用牌意拼出的），只保留LLM生成的"""
+    cards_info = build_cards_info(card_meanings, question_category)
+    return [
+        reading for reading, card_info in zip(individual_readings, cards_info)
+        if reading != _fallback_card_reading(card_info)
+    ]
+
+def build_cards_info(card_meanings, question_category):
+    """整理每张牌的名称、位置和与问题类型相关的牌意"""
+    cards_info = []
+    for card_meaning in card_meanings:
+        card_state = card_meaning["card_state"]
+        card_name = card_state["name"]
+        is_reversed = card_state["reversed"]
+        position = card_state["position"]
         
-        # 准备所有牌的信息
-        cards_info = []
-        for card_meaning in prep_res["card_meanings"]:
-            card_state = card_meaning["card_state"]
-            card_name = card_state["name"]
-            is_reversed = card_state["reversed"]
-            position = card_state["position"]
-            
-            # 获取牌意
-            if is_reversed:
-                meaning_text = card_meaning.get("reversed", {}).get("meaning", "")
-                specific_meaning = card_meaning.get("reversed", {}).get(prep_res["question_category"], "")
-            else:
-                meaning_text = card_meaning.get("upright", {}).get("meaning", "")
-                specific_meaning = card_meaning.get("upright", {}).get(prep_res["question_category"], "")
-            
-            # 位置含义
-            position_info = card_meaning.get("position_info", {})
-            position_name = position_info.get("name", f"位置{position}")
-            position_description = position_info.get("description", "")
-            
-            cards_info.append({
-                "card_name": card_name,
-                "position": position,
-                "position_name": position_name,
-                "position_description": position_description,
-                "is_reversed": is_reversed,
-                "meaning_text": meaning_text,
-                "specific_meaning": specific_meaning
-            })
+        # 获取牌意
+        if is_reversed:
+            meaning_text = card_meaning.get("reversed", {}).get("meaning", "")
+            specific_meaning = card_meaning.get("reversed", {}).get(question_category, "")
+        else:
+            meaning_text = card_meaning.get("upright", {}).get("meaning", "")
+            specific_meaning = card_meaning.get("upright", {}).get(question_category, "")
         
-        # 构建批量解读的prompt
-        cards_details = []
-        for i, card_info in enumerate(cards_info, 1):
-            card_detail = f"""
-牌{i}: {card_info['card_name']} ({'逆位' if card_info['is_reversed'] else '正位'})
+        # 位置含义
+        position_info = card_meaning.get("position_info", {})
+        position_name = position_info.get("name", f"位置{position}")
+        position_description = position_info.get("description", "")
+        
+        cards_info.append({
+            "card_name": card_name,
+            "position": position,
+            "position_name": position_name,
+            "position_description": position_description,
+            "is_reversed": is_reversed,
+            "meaning_text": meaning_text,
+            "specific_meaning": specific_meaning
+        })
+    return cards_info
+
+def _card_detail(number, card_info):
+    """批量prompt中一张牌的描述"""
+    return f"""
+牌{number}: {card_info['card_name']} ({'逆位' if card_info['is_reversed'] else '正位'})
 位置: {card_info['position_name']} - {card_info['position_description']}
 基础含义: {card_info['meaning_text']}
 特定含义: {card_info['specific_meaning']}"""
-            cards_details.append(card_detail)
-        
-        batch_prompt = f"""
+
+def budget_cards_info(cards_info):
+    """
+    把各张牌的基础含义和特定含义裁剪到单牌解读的prompt预算内（PROMPT_BUDGET_INDIVIDUAL_TOKENS）
+    
+    只用于构建prompt，解读缓存和备用解读仍使用完整牌意。
+    """
+    texts = [card_info["meaning_text"] for card_info in cards_info] + \
+            [card_info["specific_meaning"] for card_info in cards_info]
+    fitted = fit_to_budget(texts, get_prompt_budget("individual"))
+    count = len(cards_info)
+    return [
+        {**card_info, "meaning_text": fitted[i], "specific_meaning": fitted[count + i]}
+        for i, card_info in enumerate(cards_info)
+    ]
+
+def build_individual_reading_prompt(prep_res, cards_info):
+    """构建一次生成所有单牌解读的批量prompt"""
+    cards_details = [_card_detail(i, card_info) for i, card_info in enumerate(budget_cards_info(cards_info), 1)]
+    
+    return f"""
 作为专业的塔罗牌占卜师，请为以下占卜提供每张牌的详细解读：
 
 用户问题: "{prep_res['user_question']}"
@@ -262,119 +288,341 @@ class IndividualReadingNode(Node):
 
 [依此类推...]
 """
+
+def _split_batch_reading(batch_reading):
+    """把批量解读按"---"拆成每段的解读文本"""
+    segments = []
+    for part in batch_reading.split("---"):
+        reading_text = part.strip()
+        # 移除"牌X解读:"前缀
+        if "解读:" in reading_text:
+            reading_text = reading_text.split("解读:", 1)[1].strip()
+        segments.append(reading_text)
+    return segments
+
+def is_batch_reading_aligned(batch_reading, cards_info):
+    """
+    批量解读拆出的段数与牌数一致且没有空段时，才认为每段都对应到了正确的牌
+    
+    "---"拆分依赖模型遵守格式，段数不一致时无法判断哪一段错位了，这样的结果不写入解读缓存。
+    """
+    segments = _split_batch_reading(batch_reading)
+    return len(segments) == len(cards_info) and all(segments)
+
+def parse_individual_readings(batch_reading, cards_info):
+    """把批量解读按"---"拆分到每张牌，缺少的部分使用备用解读"""
+    individual_readings = []
+    readings_parts = _split_batch_reading(batch_reading)
+    
+    for i, card_info in enumerate(cards_info):
+        if i < len(readings_parts):
+            reading_text = readings_parts[i]
+            
+            individual_readings.append({
+                "card_name": card_info["card_name"],
+                "position": card_info["position"],
+                "position_name": card_info["position_name"],
+                "reversed": card_info["is_reversed"],
+                "reading": reading_text
+            })
+        else:
+            individual_readings.append(_fallback_card_reading(card_info))
+    
+    return individual_readings
+
+# 单牌解读的输出格式：text 按"---"分隔的文本；json 结构化输出并逐条校验
+INDIVIDUAL_READING_FORMATS = ("text", "json")
+
+# 结构化输出的JSON schema：每张牌一条，用序号和牌名双重核对，避免解读错位到别的牌
+INDIVIDUAL_READINGS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "readings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "card_index": {"type": "integer"},
+                    "card_name": {"type": "string"},
+                    "reading": {"type": "string"}
+                },
+                "required": ["card_index", "card_name", "reading"]
+            }
+        }
+    },
+    "required": ["readings"]
+}
+
+def get_individual_reading_format():
+    """单牌解读输出格式（环境变量 INDIVIDUAL_READING_FORMAT，默认text）"""
+    reading_format = os.getenv("INDIVIDUAL_READING_FORMAT", "text").lower()
+    return reading_format if reading_format in INDIVIDUAL_READING_FORMATS else "text"
+
+def build_structured_reading_prompt(prep_res, cards_info, indices):
+    """构建要求JSON输出的批量prompt，只包含 indices 指定的牌（序号沿用在 cards_info 中的顺序）"""
+    budgeted = budget_cards_info([cards_info[i] for i in indices])
+    cards_details = [_card_detail(i + 1, card_info) for i, card_info in zip(indices, budgeted)]
+    
+    return f"""
+作为专业的塔罗牌占卜师，请为以下占卜提供每张牌的详细解读：
+
+用户问题: "{prep_res['user_question']}"
+问题类型: {prep_res['question_category']}
+牌阵类型: {prep_res['spread_type']}
+
+抽到的牌:
+{chr(10).join(cards_details)}
+
+请为每张牌提供个性化解读，每个解读应该：
+1. 直接回应用户的问题
+2. 考虑牌在当前位置的特殊含义
+3. 提供实用的建议和指导
+4. 语言温暖而专业，150-200字
+
+请只输出一个JSON对象，不要输出其他内容。每张牌一条，card_index 和 card_name 必须与上面的牌一致：
+{{"readings": [{{"card_index": 牌的序号, "card_name": "牌名", "reading": "解读内容"}}]}}
+"""
+
+def validate_structured_readings(response_text, cards_info, indices):
+    """
+    严格校验JSON格式的批量解读
+    
+    每条解读的序号必须是本次请求的牌之一，牌名必须与该序号的牌一致，解读不能为空；
+    不合格或重复的条目直接丢弃，不会按位置顺延到别的牌上。
+    
+    Returns:
+        (通过校验的解读 {下标: 解读字典}, 问题描述列表)
+    """
+    text = (response_text or "").strip()
+    if text.startswith("```"):
+        # 部分模型即使在JSON模式下也会包一层代码块
+        text = text.strip("`").strip()
+        if text.lower().startswith("json"):
+            text = text[4:]
+    
+    try:
+        payload = json.loads(text)
+    except ValueError as e:
+        return {}, [f"JSON解析失败: {e}"]
+    if not isinstance(payload, dict) or not isinstance(payload.get("readings"), list):
+        return {}, ["缺少readings数组"]
+    
+    expected = set(indices)
+    valid, errors = {}, []
+    for item in payload["readings"]:
+        card_index = item.get("card_index") if isinstance(item, dict) else None
+        if isinstance(card_index, bool) or not isinstance(card_index, int) or card_index - 1 not in expected:
+            errors.append(f"无效的序号: {card_index!r}")
+            continue
         
+        index = card_index - 1
+        card_info = cards_info[index]
+        reading_text = item.get("reading")
+        if card_info["card_name"] not in str(item.get("card_name", "")):
+            errors.append(f"牌{card_index}的牌名不一致: {item.get('card_name')!r}")
+        elif not isinstance(reading_text, str) or not reading_text.strip():
+            errors.append(f"牌{card_index}的解读为空")
+        elif index in valid:
+            errors.append(f"牌{card_index}重复出现")
+        else:
+            valid[index] = {
+                "card_name": card_info["card_name"],
+                "position": card_info["position"],
+                "position_name": card_info["position_name"],
+                "reversed": card_info["is_reversed"],
+                "reading": reading_text.strip()
+            }
+    
+    missing = [i + 1 for i in indices if i not in valid]
+    if missing:
+        errors.append(f"缺少牌{missing}的解读")
+    return valid, errors
+
+def _structured_repair_attempts():
+    """结构化输出校验不通过时补请求的最多轮数（环境变量 INDIVIDUAL_READING_REPAIR_ATTEMPTS，默认1）"""
+    return int(os.getenv("INDIVIDUAL_READING_REPAIR_ATTEMPTS", "1"))
+
+def _collect_structured_readings(response_text, cards_info, pending, readings):
+    """把通过校验的解读收入 readings，返回仍然缺少的牌的下标"""
+    valid, errors = validate_structured_readings(response_text, cards_info, pending)
+    if errors:
+        print(f"结构化解读校验未通过: {'；'.join(errors)}")
+    readings.update(valid)
+    return [i for i in pending if i not in valid]
+
+def request_structured_readings(prep_res, cards_info):
+    """
+    以JSON格式批量生成单牌解读，校验不通过的牌单独补请求
+    
+    第一次请求所有牌，之后每轮只请求仍然缺少的牌（最多 INDIVIDUAL_READING_REPAIR_ATTEMPTS 轮），
+    最后仍然缺少的牌使用备用解读。
+    """
+    readings, pending = {}, list(range(len(cards_info)))
+    for attempt in range(1 + _structured_repair_attempts()):
+        prompt = build_structured_reading_prompt(prep_res, cards_info, pending)
         try:
-            # 一次性获取所有牌的解读
-            batch_reading = call_llm(batch_prompt)
-            
-            # 解析批量解读结果
-            individual_readings = []
-            
-            # 按"---"分割解读
-            readings_parts = batch_reading.split("---")
-            
-            for i, card_info in enumerate(cards_info):
-                if i < len(readings_parts):
-                    # 提取对应的解读文本
-                    reading_text = readings_parts[i].strip()
-                    # 移除"牌X解读:"前缀
-                    if "解读:" in reading_text:
-                        reading_text = reading_text.split("解读:", 1)[1].strip()
-                    
-                    individual_readings.append({
-                        "card_name": card_info["card_name"],
-                        "position": card_info["position"],
-                        "position_name": card_info["position_name"],
-                        "reversed": card_info["is_reversed"],
-                        "reading": reading_text
-                    })
-                else:
-                    # 备用解读
-                    fallback_reading = f"{card_info['card_name']}{'逆位' if card_info['is_reversed'] else '正位'}在{card_info['position_name']}位置出现，{card_info['meaning_text']}"
-                    individual_readings.append({
-                        "card_name": card_info["card_name"],
-                        "position": card_info["position"],
-                        "position_name": card_info["position_name"],
-                        "reversed": card_info["is_reversed"],
-                        "reading": fallback_reading
-                    })
-            
-            return individual_readings
-            
+            if attempt:
+                # 补请求的prompt可能与上一次相同，跳过LLM缓存，避免拿回同一个不合格的回复
+                with bypass_llm_cache():
+                    response_text = call_llm(prompt, response_schema=INDIVIDUAL_READINGS_SCHEMA)
+            else:
+                response_text = call_llm(prompt, response_schema=INDIVIDUAL_READINGS_SCHEMA)
         except Exception as e:
             print(f"批量生成解读失败: {e}")
-            # 提供所有牌的备用解读
-            individual_readings = []
-            for card_info in cards_info:
-                fallback_reading = f"{card_info['card_name']}{'逆位' if card_info['is_reversed'] else '正位'}在{card_info['position_name']}位置出现，{card_info['meaning_text']}"
-                individual_readings.append({
-                    "card_name": card_info["card_name"],
-                    "position": card_info["position"],
-                    "position_name": card_info["position_name"],
-                    "reversed": card_info["is_reversed"],
-                    "reading": fallback_reading
-                })
-            return individual_readings
+            break
+        
+        pending = _collect_structured_readings(response_text, cards_info, pending, readings)
+        if not pending:
+            break
     
-    def post(self, shared, prep_res, exec_res):
-        """将单张牌解读写入shared store"""
-        shared["individual_readings"] = exec_res
-        return "default"
+    return [readings.get(i) or _fallback_card_reading(card_info) for i, card_info in enumerate(cards_info)]
 
-class CombinedReadingNode(Node):
-    """综合解读节点 - 整合所有牌的含义生成完整的占卜解读"""
+async def request_structured_readings_async(prep_res, cards_info):
+    """request_structured_readings 的异步版本"""
+    readings, pending = {}, list(range(len(cards_info)))
+    for attempt in range(1 + _structured_repair_attempts()):
+        prompt = build_structured_reading_prompt(prep_res, cards_info, pending)
+        try:
+            if attempt:
+                with bypass_llm_cache():
+                    response_text = await call_llm_async(prompt, response_schema=INDIVIDUAL_READINGS_SCHEMA)
+            else:
+                response_text = await call_llm_async(prompt, response_schema=INDIVIDUAL_READINGS_SCHEMA)
+        except Exception as e:
+            print(f"批量生成解读失败: {e}")
+            break
+        
+        pending = _collect_structured_readings(response_text, cards_info, pending, readings)
+        if not pending:
+            break
     
-    def prep(self, shared):
-        """读取所有单张牌解读和相关信息"""
-        return {
-            "individual_readings": shared.get("individual_readings", []),
-            "card_meanings": shared.get("card_meanings", []),  # 备用数据
-            "drawn_cards": shared.get("drawn_cards", []),      # 备用数据
-            "user_question": shared.get("user_question", ""),
-            "question_category": shared.get("question_category", "general"),
-            "spread_type": shared.get("spread_type", "single"),
-            "spread_config": shared.get("spread_config", {})
-        }
+    return [readings.get(i) or _fallback_card_reading(card_info) for i, card_info in enumerate(cards_info)]
+
+def build_single_card_prompt(prep_res, card_info):
+    """构建单张牌解读的prompt（并发模式下每张牌单独调用LLM）"""
+    return f"""
+作为专业的塔罗牌占卜师，请为以下占卜中的这张牌提供详细解读：
+
+用户问题: "{prep_res['user_question']}"
+问题类型: {prep_res['question_category']}
+牌阵类型: {prep_res['spread_type']}
+
+牌: {card_info['card_name']} ({'逆位' if card_info['is_reversed'] else '正位'})
+位置: {card_info['position_name']} - {card_info['position_description']}
+基础含义: {card_info['meaning_text']}
+特定含义: {card_info['specific_meaning']}
+
+解读应该：
+1. 直接回应用户的问题
+2. 考虑牌在当前位置的特殊含义
+3. 提供实用的建议和指导
+4. 语言温暖而专业，150-200字
+
+请直接给出解读内容，不需要标题或前缀。
+"""
+
+def parse_single_card_reading(reading_text, card_info):
+    """整理单张牌的解读（去掉可能带上的"解读:"前缀），内容为空时抛出异常"""
+    reading_text = (reading_text or "").strip()
+    if "解读:" in reading_text[:20]:
+        reading_text = reading_text.split("解读:", 1)[1].strip()
+    if not reading_text:
+        raise ValueError(f"{card_info['card_name']}的解读为空")
     
-    def exec(self, prep_res):
-        """使用LLM生成综合性的占卜解读和建议"""
-        # 检查是否有个体解读结果
-        if prep_res["individual_readings"]:
-            # 完整模式：整理所有单张牌的解读
-            cards_summary = []
-            for reading in prep_res["individual_readings"]:
-                card_info = f"{reading['position_name']}: {reading['card_name']}{'(逆位)' if reading['reversed'] else ''} - {reading['reading']}"
-                cards_summary.append(card_info)
-            cards_text = "\n\n".join(cards_summary)
+    return {
+        "card_name": card_info["card_name"],
+        "position": card_info["position"],
+        "position_name": card_info["position_name"],
+        "reversed": card_info["is_reversed"],
+        "reading": reading_text
+    }
+
+def _cache_key(prep_res, card_info):
+    return interpretation_key(
+        card_info["card_name"], card_info["is_reversed"], prep_res["spread_type"],
+        card_info["position"], prep_res["question_category"], prep_res["user_question"]
+    )
+
+def split_cached_readings(prep_res, cards_info):
+    """
+    查询单牌解读缓存
+    
+    Returns:
+        (命中的解读 {下标: 解读}, 需要调用LLM生成的牌的下标列表)
+    """
+    if not is_interpretation_cache_enabled():
+        return {}, list(range(len(cards_info)))
+    
+    cached, missing = {}, []
+    for i, card_info in enumerate(cards_info):
+        reading_text = get_interpretation(_cache_key(prep_res, card_info))
+        if reading_text is None:
+            missing.append(i)
         else:
-            # 快速模式：使用基本牌信息
-            cards_summary = []
-            for card in prep_res["drawn_cards"]:
-                card_name = card["name"]
-                is_reversed = card.get("reversed", False)
-                position = card.get("position", 1)
-                
-                # 获取基本牌意
-                card_meaning = None
-                for meaning in prep_res["card_meanings"]:
-                    if meaning.get("card_state", {}).get("name") == card_name:
-                        card_meaning = meaning
-                        break
-                
-                if card_meaning:
-                    if is_reversed:
-                        basic_meaning = card_meaning.get("reversed", {}).get("meaning", "")
-                    else:
-                        basic_meaning = card_meaning.get("upright", {}).get("meaning", "")
-                    
-                    card_info = f"位置{position}: {card_name}{'(逆位)' if is_reversed else ''} - {basic_meaning}"
+            cached[i] = {
+                "card_name": card_info["card_name"],
+                "position": card_info["position"],
+                "position_name": card_info["position_name"],
+                "reversed": card_info["is_reversed"],
+                "reading": reading_text
+            }
+    return cached, missing
+
+def merge_and_store_readings(prep_res, cards_info, cached, missing, generated, cacheable=True):
+    """
+    按原顺序合并缓存命中和新生成的解读，并把新生成的（非备用）解读写入缓存
+    
+    cacheable 为False（例如文本模式的段数与牌数对不上）时只合并，不写入缓存。
+    """
+    readings = dict(cached)
+    store = cacheable and is_interpretation_cache_enabled()
+    for index, reading in zip(missing, generated):
+        readings[index] = reading
+        if store and reading != _fallback_card_reading(cards_info[index]):
+            store_interpretation(_cache_key(prep_res, cards_info[index]), reading["reading"])
+    return [readings[i] for i in range(len(cards_info))]
+
+def build_combined_reading_prompt(prep_res):
+    """构建综合解读的prompt（每张牌都有单牌解读时使用完整模式，否则使用基本牌意）"""
+    # 检查是否有个体解读结果（超时降级后可能只剩部分牌的解读）
+    if prep_res["individual_readings"] and len(prep_res["individual_readings"]) == len(prep_res["drawn_cards"]):
+        # 完整模式：整理所有单张牌的解读（裁剪到综合解读的prompt预算内）
+        cards_summary = []
+        readings = fit_to_budget([reading["reading"] for reading in prep_res["individual_readings"]],
+                                 get_prompt_budget("combined"))
+        for reading, reading_text in zip(prep_res["individual_readings"], readings):
+            card_info = f"{reading['position_name']}: {reading['card_name']}{'(逆位)' if reading['reversed'] else ''} - {reading_text}"
+            cards_summary.append(card_info)
+        cards_text = "\n\n".join(cards_summary)
+    else:
+        # 快速模式：使用基本牌信息
+        cards_summary = []
+        for card in prep_res["drawn_cards"]:
+            card_name = card["name"]
+            is_reversed = card.get("reversed", False)
+            position = card.get("position", 1)
+            
+            # 获取基本牌意
+            card_meaning = None
+            for meaning in prep_res["card_meanings"]:
+                if meaning.get("card_state", {}).get("name") == card_name:
+                    card_meaning = meaning
+                    break
+            
+            if card_meaning:
+                if is_reversed:
+                    basic_meaning = card_meaning.get("reversed", {}).get("meaning", "")
                 else:
-                    card_info = f"位置{position}: {card_name}{'(逆位)' if is_reversed else ''}"
+                    basic_meaning = card_meaning.get("upright", {}).get("meaning", "")
                 
-                cards_summary.append(card_info)
-            cards_text = "\n\n".join(cards_summary)
-        
-        prompt = f"""
+                card_info = f"位置{position}: {card_name}{'(逆位)' if is_reversed else ''} - {basic_meaning}"
+            else:
+                card_info = f"位置{position}: {card_name}{'(逆位)' if is_reversed else ''}"
+            
+            cards_summary.append(card_info)
+        cards_text = "\n\n".join(fit_to_budget(cards_summary, get_prompt_budget("combined")))
+    
+    return f"""
 作为资深塔罗牌占卜师，请基于以下信息提供一个综合性的占卜解读：
 
 用户问题: "{prep_res['user_question']}"
@@ -393,56 +641,193 @@ class CombinedReadingNode(Node):
 
 请用温暖、专业且富有洞察力的语言，提供一个完整而深入的解读。字数控制在300-400字。
 """
+
+def build_refine_reading_prompt(prep_res, draft_reading, individual_readings):
+    """构建修订综合解读的prompt：用单牌解读修订基于基本牌意写成的初稿"""
+    readings = fit_to_budget([reading["reading"] for reading in individual_readings], get_prompt_budget("combined"))
+    cards_text = "\n\n".join(
+        f"{reading['position_name']}: {reading['card_name']}{'(逆位)' if reading['reversed'] else ''} - {reading_text}"
+        for reading, reading_text in zip(individual_readings, readings)
+    )
+    return f"""
+作为资深塔罗牌占卜师，下面是一份根据基本牌意写成的综合解读初稿，以及每张牌的详细解读。
+
+用户问题: "{prep_res['user_question']}"
+问题类型: {prep_res['question_category']}
+使用牌阵: {prep_res['spread_config'].get('name', '未知牌阵')}
+
+综合解读初稿:
+{draft_reading}
+
+各张牌的解读:
+{cards_text}
+
+请在保留初稿结构和语气的基础上修订这份综合解读，使它与各张牌的解读保持一致，
+补充初稿遗漏的重要信息。直接输出修订后的完整解读，字数控制在300-400字。
+"""
+
+def parse_combined_reading(combined_reading):
+    """从综合解读中提取简短总结，而不是再次调用LLM"""
+    lines = combined_reading.strip().split('\n')
+    summary = "塔罗牌为你的问题提供了重要的指导和洞察。"
+    
+    # 尝试提取第一段作为总结
+    if lines:
+        first_line = lines[0].strip()
+        if len(first_line) > 10 and len(first_line) < 50:
+            summary = first_line
+        elif len(combined_reading) > 0:
+            # 取前30个字符作为简要总结
+            summary = combined_reading[:30].strip() + "..."
+    
+    return {
+        "combined_reading": combined_reading.strip(),
+        "reading_summary": summary
+    }
+
+def stream_llm_text(prompt, on_delta, cancelled=None):
+    """流式调用LLM，把每个增量文本交给 on_delta，返回完整文本；cancelled（threading.Event）被设置后停止转发并结束流"""
+    chunks = []
+    for delta in call_llm(prompt, stream=True):
+        if cancelled is not None and cancelled.is_set():
+            break
+        chunks.append(delta)
+        on_delta(delta)
+    return "".join(chunks)
+
+async def stream_llm_text_async(prompt, on_delta):
+    """在线程中运行 stream_llm_text；等待的协程被取消（例如超时）后线程不再转发增量文本"""
+    cancelled = threading.Event()
+    try:
+        return await asyncio.to_thread(stream_llm_text, prompt, on_delta, cancelled)
+    finally:
+        cancelled.set()
+
+def fallback_combined_reading(prep_res):
+    """LLM不可用时的备用综合解读"""
+    fallback_reading = f"根据抽取的{len(prep_res['individual_readings'] or prep_res['drawn_cards'])}张牌，塔罗牌为你的问题提供了多层面的指导。每张牌都代表着不同的能量和信息，建议你仔细思考每张牌的含义，并将它们作为你决策的参考。"
+    return {
+        "combined_reading": fallback_reading,
+        "reading_summary": "塔罗牌为你提供了重要的指导。",
+        "is_fallback": True  # 超时降级时据此重新生成综合解读
+    }
+
+class IndividualReadingNode(Node):
+    """个体解读节点 - 为每张牌在其位置上生成个性化解读"""
+    
+    reads = ("card_meanings", "user_question", "question_category", "spread_type")
+    writes = ("individual_readings", "token_usage")
+    merges = ("token_usage",)  # 用量由 add_node_usage 加锁合并
+    
+    def prep(self, shared):
+        """读取牌信息、位置含义和用户问题"""
+        return {
+            "card_meanings": shared.get("card_meanings", []),
+            "user_question": shared.get("user_question", ""),
+            "question_category": shared.get("question_category", "general"),
+            "spread_type": shared.get("spread_type", "single"),
+            "token_usage": TokenUsage()  # 本节点LLM调用的token用量
+        }
+    
+    def exec(self, prep_res):
+        """使用批量LLM调用为所有牌生成个性化解读（性能优化，命中解读缓存的牌不再调用LLM）"""
+        if not prep_res["card_meanings"]:
+            return []
+        
+        cards_info = build_cards_info(prep_res["card_meanings"], prep_res["question_category"])
+        cached, missing = split_cached_readings(prep_res, cards_info)
+        if not missing:
+            return merge_and_store_readings(prep_res, cards_info, cached, [], [])
+        
+        missing_info = [cards_info[i] for i in missing]
+        if get_individual_reading_format() == "json":
+            with recording_usage(prep_res["token_usage"]):
+                generated = request_structured_readings(prep_res, missing_info)
+            return merge_and_store_readings(prep_res, cards_info, cached, missing, generated)
+        
+        batch_prompt = build_individual_reading_prompt(prep_res, missing_info)
         
         try:
-            combined_reading = call_llm(prompt)
+            # 一次性获取所有未缓存牌的解读
+            with recording_usage(prep_res["token_usage"]):
+                batch_reading = call_llm(batch_prompt)
+            generated = parse_individual_readings(batch_reading, missing_info)
             
-            # 从解读中提取简短总结，而不是再次调用LLM
-            lines = combined_reading.strip().split('\n')
-            summary = "塔罗牌为你的问题提供了重要的指导和洞察。"
-            
-            # 尝试提取第一段作为总结
-            if lines:
-                first_line = lines[0].strip()
-                if len(first_line) > 10 and len(first_line) < 50:
-                    summary = first_line
-                elif len(combined_reading) > 0:
-                    # 取前30个字符作为简要总结
-                    summary = combined_reading[:30].strip() + "..."
-            
-            return {
-                "combined_reading": combined_reading.strip(),
-                "reading_summary": summary
-            }
+        except Exception as e:
+            print(f"批量生成解读失败: {e}")
+            # 提供备用解读
+            generated = [_fallback_card_reading(card_info) for card_info in missing_info]
+            return merge_and_store_readings(prep_res, cards_info, cached, missing, generated)
+        
+        aligned = is_batch_reading_aligned(batch_reading, missing_info)
+        return merge_and_store_readings(prep_res, cards_info, cached, missing, generated, cacheable=aligned)
+    
+    def post(self, shared, prep_res, exec_res):
+        """将单张牌解读和本节点的token用量写入shared store"""
+        shared["individual_readings"] = exec_res
+        add_node_usage(shared, "individual_reading", prep_res["token_usage"])
+        return "default"
+
+class CombinedReadingNode(Node):
+    """综合解读节点 - 整合所有牌的含义生成完整的占卜解读"""
+    
+    reads = ("individual_readings", "card_meanings", "drawn_cards", "user_question",
+             "question_category", "spread_type", "spread_config", "stream_callback")
+    writes = ("combined_reading", "reading_summary", "combined_reading_is_fallback", "token_usage")
+    merges = ("token_usage",)
+    
+    def prep(self, shared):
+        """读取所有单张牌解读和相关信息"""
+        return {
+            "individual_readings": shared.get("individual_readings", []),
+            "card_meanings": shared.get("card_meanings", []),  # 备用数据
+            "drawn_cards": shared.get("drawn_cards", []),      # 备用数据
+            "user_question": shared.get("user_question", ""),
+            "question_category": shared.get("question_category", "general"),
+            "spread_type": shared.get("spread_type", "single"),
+            "spread_config": shared.get("spread_config", {}),
+            "stream_callback": shared.get("stream_callback"),  # 流式模式下接收增量文本的回调
+            "token_usage": TokenUsage()  # 本节点LLM调用的token用量
+        }
+    
+    def exec(self, prep_res):
+        """使用LLM生成综合性的占卜解读和建议（提供了stream_callback时边生成边转发）"""
+        prompt = build_combined_reading_prompt(prep_res)
+        
+        try:
+            with recording_usage(prep_res["token_usage"]):
+                if prep_res.get("stream_callback"):
+                    return parse_combined_reading(stream_llm_text(prompt, prep_res["stream_callback"]))
+                return parse_combined_reading(call_llm(prompt))
             
         except Exception as e:
             print(f"生成综合解读失败: {e}")
             # 提供备用解读
-            fallback_reading = f"根据抽取的{len(prep_res['individual_readings'])}张牌，塔罗牌为你的问题提供了多层面的指导。每张牌都代表着不同的能量和信息，建议你仔细思考每张牌的含义，并将它们作为你决策的参考。"
-            return {
-                "combined_reading": fallback_reading,
-                "reading_summary": "塔罗牌为你提供了重要的指导。"
-            }
+            return fallback_combined_reading(prep_res)
     
     def post(self, shared, prep_res, exec_res):
-        """将最终解读写入shared store"""
+        """将最终解读和本节点的token用量写入shared store"""
         shared["combined_reading"] = exec_res["combined_reading"]
         shared["reading_summary"] = exec_res["reading_summary"]
+        shared["combined_reading_is_fallback"] = exec_res.get("is_fallback", False)
+        add_node_usage(shared, "combined_reading", prep_res["token_usage"])
         return "default"
 
 class SaveReadingNode(Node):
     """结果保存节点 - 保存完整的占卜记录"""
     
+    reads = ("user_question", "question_category", "spread_type", "drawn_cards",
+             "individual_readings", "combined_reading", "reading_summary")
+    writes = ("save_success", "save_message")
+    
     def prep(self, shared):
-        """读取完整的占卜数据"""
+        """读取完整的占卜数据（牌意和牌阵配置是静态数据，读取时再按牌名和牌阵恢复，不重复保存）"""
         return {
             "reading_data": {
                 "user_question": shared.get("user_question", ""),
                 "question_category": shared.get("question_category", ""),
                 "spread_type": shared.get("spread_type", ""),
-                "spread_config": shared.get("spread_config", {}),
                 "drawn_cards": shared.get("drawn_cards", []),
-                "card_meanings": shared.get("card_meanings", []),
                 "individual_readings": shared.get("individual_readings", []),
                 "combined_reading": shared.get("combined_reading", ""),
                 "reading_summary": shared.get("reading_summary", ""),
@@ -451,8 +836,11 @@ class SaveReadingNode(Node):
         }
     
     def exec(self, prep_res):
-        """调用存储工具函数保存数据"""
-        success = save_reading(prep_res["reading_data"])
+        """调用存储工具函数保存数据（异步模式下只入队，由后台线程写入）"""
+        if is_async_save_enabled():
+            success = enqueue_reading(prep_res["reading_data"])
+        else:
+            success = save_reading(prep_res["reading_data"])
         return {"success": success}
     
     def post(self, shared, prep_res, exec_res):
@@ -465,6 +853,297 @@ class SaveReadingNode(Node):
         
         return "default"
 
+class AsyncIndividualReadingNode(AsyncNode, IndividualReadingNode):
+    """个体解读节点（异步版）- 等待LLM期间不阻塞事件循环"""
+    
+    async def prep_async(self, shared):
+        return self.prep(shared)
+    
+    async def exec_async(self, prep_res):
+        """使用异步LLM调用批量生成所有牌的解读"""
+        if not prep_res["card_meanings"]:
+            return []
+        
+        cards_info = build_cards_info(prep_res["card_meanings"], prep_res["question_category"])
+        cached, missing = split_cached_readings(prep_res, cards_info)
+        if not missing:
+            return merge_and_store_readings(prep_res, cards_info, cached, [], [])
+        
+        missing_info = [cards_info[i] for i in missing]
+        if get_individual_reading_format() == "json":
+            with recording_usage(prep_res["token_usage"]):
+                generated = await request_structured_readings_async(prep_res, missing_info)
+            return merge_and_store_readings(prep_res, cards_info, cached, missing, generated)
+        
+        batch_prompt = build_individual_reading_prompt(prep_res, missing_info)
+        
+        try:
+            with recording_usage(prep_res["token_usage"]):
+                batch_reading = await call_llm_async(batch_prompt)
+            generated = parse_individual_readings(batch_reading, missing_info)
+            
+        except Exception as e:
+            print(f"批量生成解读失败: {e}")
+            generated = [_fallback_card_reading(card_info) for card_info in missing_info]
+            return merge_and_store_readings(prep_res, cards_info, cached, missing, generated)
+        
+        aligned = is_batch_reading_aligned(batch_reading, missing_info)
+        return merge_and_store_readings(prep_res, cards_info, cached, missing, generated, cacheable=aligned)
+    
+    async def exec_fallback_async(self, prep_res, exc):
+        """超时被取消等情况下，未命中缓存的牌使用备用解读"""
+        print(f"批量生成解读失败: {exc}")
+        cards_info = build_cards_info(prep_res["card_meanings"], prep_res["question_category"])
+        cached, missing = split_cached_readings(prep_res, cards_info)
+        generated = [_fallback_card_reading(cards_info[i]) for i in missing]
+        return merge_and_store_readings(prep_res, cards_info, cached, missing, generated)
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
+def get_reading_node_timeout():
+    """单牌解读和综合解读节点每次执行的超时（秒，环境变量 READING_NODE_TIMEOUT，0表示不限制）"""
+    timeout = float(os.getenv("READING_NODE_TIMEOUT", "0"))
+    return timeout if timeout > 0 else None
+
+# 单牌解读的执行方式：batch 所有牌一个批量prompt；parallel 每张牌一个prompt并发调用
+INDIVIDUAL_READING_MODES = ("batch", "parallel")
+
+def get_individual_reading_mode():
+    """单牌解读模式（环境变量 INDIVIDUAL_READING_MODE，默认batch）"""
+    mode = os.getenv("INDIVIDUAL_READING_MODE", "batch").lower()
+    return mode if mode in INDIVIDUAL_READING_MODES else "batch"
+
+class ParallelIndividualReadingNode(AsyncParallelBatchNode, IndividualReadingNode):
+    """
+    个体解读节点（并发版）- 每张牌一个短prompt，并发调用LLM
+    
+    总耗时取决于最慢的一张牌而不是所有牌之和；某张牌失败只影响这张牌，
+    不会因为批量回复的格式偏差让所有牌都退回备用解读。
+    同时进行的LLM请求数不超过 max_concurrency（默认取 INDIVIDUAL_READING_CONCURRENCY）。
+    """
+    
+    def __init__(self, max_concurrency=None, max_retries=1, wait=0, timeout=None):
+        super().__init__(max_retries=max_retries, wait=wait, timeout=timeout)
+        self.max_concurrency = max_concurrency or int(os.getenv("INDIVIDUAL_READING_CONCURRENCY", "4"))
+    
+    async def prep_async(self, shared):
+        """把每张牌拆成一个任务，命中解读缓存的牌直接带上缓存结果"""
+        prep_res = self.prep(shared)
+        if not prep_res["card_meanings"]:
+            return []
+        
+        cards_info = build_cards_info(prep_res["card_meanings"], prep_res["question_category"])
+        cached, _ = split_cached_readings(prep_res, cards_info)
+        # 信号量需要在运行中的事件循环里创建，同一次占卜的所有牌共用
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return [
+            {"prep_res": prep_res, "card_info": card_info, "cached": cached.get(i), "semaphore": semaphore}
+            for i, card_info in enumerate(cards_info)
+        ]
+    
+    async def exec_async(self, item):
+        """为一张牌生成解读"""
+        if item["cached"] is not None:
+            return item["cached"]
+        
+        prompt = build_single_card_prompt(item["prep_res"], item["card_info"])
+        async with item["semaphore"]:
+            with recording_usage(item["prep_res"]["token_usage"]):
+                reading_text = await call_llm_async(prompt)
+        return parse_single_card_reading(reading_text, item["card_info"])
+    
+    async def exec_fallback_async(self, item, exc):
+        print(f"生成单牌解读失败: {exc}")
+        return _fallback_card_reading(item["card_info"])
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        """把新生成的（非备用）解读写入缓存，并按原顺序把解读和token用量写入shared store"""
+        if is_interpretation_cache_enabled():
+            for item, reading in zip(prep_res, exec_res):
+                if item["cached"] is None and reading != _fallback_card_reading(item["card_info"]):
+                    store_interpretation(_cache_key(item["prep_res"], item["card_info"]), reading["reading"])
+        
+        shared["individual_readings"] = exec_res
+        # 所有牌共用同一个prep结果，也就共用同一个用量累计
+        add_node_usage(shared, "individual_reading", prep_res[0]["prep_res"]["token_usage"] if prep_res else TokenUsage())
+        return "default"
+
+# 综合解读的执行方式：sequential 等单牌解读完成后再生成；pipeline 与单牌解读同时生成
+COMBINED_READING_MODES = ("sequential", "pipeline")
+
+def get_combined_reading_mode():
+    """综合解读模式（环境变量 COMBINED_READING_MODE，默认sequential）"""
+    mode = os.getenv("COMBINED_READING_MODE", "sequential").lower()
+    return mode if mode in COMBINED_READING_MODES else "sequential"
+
+def is_combined_refine_enabled():
+    """流水线模式下是否在单牌解读完成后修订综合解读（环境变量 COMBINED_READING_REFINE，默认关闭）"""
+    return os.getenv("COMBINED_READING_REFINE", "false").lower() in ("true", "1", "yes")
+
+class AsyncCombinedReadingNode(AsyncNode, CombinedReadingNode):
+    """综合解读节点（异步版）- 等待LLM期间不阻塞事件循环"""
+    
+    async def prep_async(self, shared):
+        return self.prep(shared)
+    
+    async def exec_async(self, prep_res):
+        """使用异步LLM调用生成综合解读（提供了stream_callback时在线程中流式生成）"""
+        prompt = build_combined_reading_prompt(prep_res)
+        
+        try:
+            with recording_usage(prep_res["token_usage"]):
+                if prep_res.get("stream_callback"):
+                    return parse_combined_reading(
+                        await stream_llm_text_async(prompt, prep_res["stream_callback"])
+                    )
+                return parse_combined_reading(await call_llm_async(prompt))
+            
+        except Exception as e:
+            print(f"生成综合解读失败: {e}")
+            return fallback_combined_reading(prep_res)
+    
+    async def exec_fallback_async(self, prep_res, exc):
+        """超时被取消时使用备用综合解读"""
+        print(f"生成综合解读失败: {exc}")
+        return fallback_combined_reading(prep_res)
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
+async def refine_combined_reading_async(prep_res, draft_res, individual_readings, stream_callback=None):
+    """用单牌解读修订综合解读初稿，失败时保留初稿"""
+    prompt = build_refine_reading_prompt(prep_res, draft_res["combined_reading"], individual_readings)
+    
+    try:
+        if stream_callback:
+            return parse_combined_reading(await stream_llm_text_async(prompt, stream_callback))
+        return parse_combined_reading(await call_llm_async(prompt))
+        
+    except Exception as e:
+        print(f"修订综合解读失败: {e}")
+        return draft_res
+
+class DraftCombinedReadingNode(AsyncCombinedReadingNode):
+    """
+    综合解读初稿节点（DagFlow流水线用）- 不读取单牌解读，直接根据基本牌意生成
+    
+    因为不依赖单牌解读，DagFlow会让它与单牌解读节点同时运行。
+    stream=False 时不流式输出（初稿之后还会被修订）。
+    """
+    
+    reads = tuple(key for key in CombinedReadingNode.reads if key != "individual_readings")
+    
+    def __init__(self, stream=True, max_retries=1, wait=0, timeout=None):
+        super().__init__(max_retries=max_retries, wait=wait, timeout=timeout)
+        self.stream = stream
+    
+    async def prep_async(self, shared):
+        prep_res = {**self.prep(shared), "individual_readings": []}
+        if not self.stream:
+            prep_res["stream_callback"] = None
+        return prep_res
+
+class RefineCombinedReadingNode(AsyncNode):
+    """综合解读修订节点（DagFlow流水线用）- 单牌解读和初稿都完成后，用单牌解读修订初稿"""
+    
+    reads = CombinedReadingNode.reads + ("combined_reading", "reading_summary", "combined_reading_is_fallback")
+    writes = CombinedReadingNode.writes
+    merges = ("token_usage",)
+    
+    async def prep_async(self, shared):
+        return {
+            **CombinedReadingNode.prep(self, shared),
+            "draft": {
+                "combined_reading": shared.get("combined_reading", ""),
+                "reading_summary": shared.get("reading_summary", ""),
+                "is_fallback": shared.get("combined_reading_is_fallback", False)
+            }
+        }
+    
+    async def exec_async(self, prep_res):
+        if not prep_res["individual_readings"]:
+            return prep_res["draft"]
+        with recording_usage(prep_res["token_usage"]):
+            return await refine_combined_reading_async(
+                prep_res, prep_res["draft"], prep_res["individual_readings"], prep_res["stream_callback"]
+            )
+    
+    async def exec_fallback_async(self, prep_res, exc):
+        """超时被取消时保留初稿"""
+        print(f"修订综合解读失败: {exc}")
+        return prep_res["draft"]
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        shared["combined_reading"] = exec_res["combined_reading"]
+        shared["reading_summary"] = exec_res["reading_summary"]
+        shared["combined_reading_is_fallback"] = exec_res.get("is_fallback", False)
+        add_node_usage(shared, "combined_refine", prep_res["token_usage"])
+        return "default"
+
+class PipelinedReadingNode(AsyncNode):
+    """
+    单牌解读与综合解读同时生成（流水线模式）
+    
+    综合解读不等单牌解读，像快速流程一样直接根据基本牌意生成，两次LLM调用同时进行，
+    耗时接近两者中较慢的一个而不是两者之和。开启 refine 时，单牌解读完成后再用它们
+    修订综合解读初稿（多一次LLM调用，换取与单牌解读一致的综合解读）。
+    """
+    
+    reads = tuple(dict.fromkeys(IndividualReadingNode.reads + CombinedReadingNode.reads))
+    writes = tuple(dict.fromkeys(IndividualReadingNode.writes + CombinedReadingNode.writes))
+    merges = ("token_usage",)
+    
+    def __init__(self, individual_node=None, refine=None, max_retries=1, wait=0, timeout=None):
+        """timeout 是子节点（综合解读、默认的单牌解读）每次执行的超时，本节点本身不设超时"""
+        super().__init__(max_retries=max_retries, wait=wait)
+        self.individual_node = individual_node or AsyncIndividualReadingNode(timeout=timeout)
+        self.combined_node = AsyncCombinedReadingNode(timeout=timeout)
+        self.refine = is_combined_refine_enabled() if refine is None else refine
+    
+    async def prep_async(self, shared):
+        """分别准备两个子节点的输入，综合解读不使用单牌解读"""
+        combined_prep = {**self.combined_node.prep(shared), "individual_readings": []}
+        if self.refine:
+            # 初稿会被修订，只流式输出修订后的解读
+            combined_prep["stream_callback"] = None
+        return {
+            "individual": await self.individual_node.prep_async(shared),
+            "combined": combined_prep,
+            "stream_callback": shared.get("stream_callback")
+        }
+    
+    async def exec_async(self, prep_res):
+        """同时生成单牌解读和综合解读（初稿），需要时再修订综合解读"""
+        individual_res, combined_res = await asyncio.gather(
+            self.individual_node._exec(prep_res["individual"]),
+            self.combined_node._exec(prep_res["combined"])
+        )
+        if self.refine and individual_res:
+            # 修订也计入综合解读的用量
+            with recording_usage(prep_res["combined"]["token_usage"]):
+                combined_res = await refine_combined_reading_async(
+                    prep_res["combined"], combined_res, individual_res, prep_res["stream_callback"]
+                )
+        return {"individual": individual_res, "combined": combined_res}
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        """依次执行两个子节点的post，写入单牌解读和综合解读"""
+        await self.individual_node.post_async(shared, prep_res["individual"], exec_res["individual"])
+        return await self.combined_node.post_async(shared, prep_res["combined"], exec_res["combined"])
+
+class AsyncSaveReadingNode(AsyncNode, SaveReadingNode):
+    """结果保存节点（异步版）- 在线程池中执行加锁的文件写入，不阻塞事件循环"""
+    
+    async def prep_async(self, shared):
+        return self.prep(shared)
+    
+    async def exec_async(self, prep_res):
+        return await asyncio.to_thread(self.exec, prep_res)
+    
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
 if __name__ == "__main__":
     # 测试节点功能
     print("测试塔罗牌占卜节点:")
@@ -0,0 +1,24 @@
+# tests/conftest.py
+"""
+测试公共夹具：把仓库根目录加入导入路径，并让每个用例使用独立的临时存储目录
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils import reading_storage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """使用临时目录作为存储目录的 reading_storage 模块（默认jsonl引擎）"""
+    monkeypatch.setenv("READING_STORAGE_BACKEND", "jsonl")
+    reading_storage.set_storage_dir(str(tmp_path / "data"))
+    yield reading_storage
+    reading_storage.set_storage_dir(os.path.join("data"))
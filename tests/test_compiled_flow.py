@@ -0,0 +1,106 @@
+# tests/test_compiled_flow.py
+"""
+编译后的流程模板：节点副本被冻结、原节点不受影响，并发运行之间的参数和重试状态互相隔离，
+模板按节点超时配置分别缓存
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+import flow
+from macore import AsyncFlow, AsyncNode, AsyncParallelBatchFlow, Flow, Node
+from nodes import CombinedReadingNode
+
+
+class Step(Node):
+    def post(self, shared, prep_res, exec_res):
+        shared.setdefault("steps", []).append(type(self).__name__)
+
+
+class Other(Step):
+    pass
+
+
+def test_compiled_copies_are_frozen_and_originals_stay_editable():
+    first, second = Step(), Other()
+    first >> second
+    compiled = Flow(start=first).compile()
+    frozen = compiled.start_node
+
+    assert frozen is not first and not first._frozen
+    with pytest.raises(RuntimeError):
+        frozen >> Step()
+    with pytest.raises(RuntimeError):
+        frozen.set_params({"x": 1})
+    with pytest.raises(RuntimeError):
+        compiled.start(Step())
+
+    first.successors.clear()  # 修改原节点不影响已编译的模板
+    shared = {}
+    compiled.run(shared)
+    assert shared["steps"] == ["Step", "Other"]
+
+
+def test_concurrent_runs_keep_their_own_retry_state():
+    barrier = threading.Barrier(4)
+
+    class FlakyOnce(Node):
+        def prep(self, shared):
+            return shared
+
+        def exec(self, shared):
+            shared.setdefault("attempts", []).append(self.retry_attempt)
+            if self.retry_attempt == 0:
+                barrier.wait(timeout=5)  # 所有运行都在第一次尝试中时才继续
+                raise ValueError("first attempt fails")
+            return "ok"
+
+    compiled = Flow(start=FlakyOnce(max_retries=2)).compile()
+    results = [{} for _ in range(4)]
+    threads = [threading.Thread(target=compiled.run, args=(shared,)) for shared in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [shared["attempts"] for shared in results] == [[0, 1]] * 4
+
+
+def test_concurrent_runs_see_their_own_params():
+    class Echo(AsyncNode):
+        async def exec_async(self, prep_res):
+            index = self.params["index"]
+            await asyncio.sleep(0.01 * (5 - index))
+            return index, self.params["index"]
+
+        async def post_async(self, shared, prep_res, exec_res):
+            shared.setdefault("seen", []).append(exec_res)
+
+    class EachIndex(AsyncParallelBatchFlow):
+        async def prep_async(self, shared):
+            return [{"index": i} for i in range(5)]
+
+    shared = {}
+    asyncio.run(EachIndex(start=AsyncFlow(start=Echo()).compile()).run_async(shared))
+
+    assert sorted(shared["seen"]) == [(i, i) for i in range(5)]
+
+
+def _combined_timeout(compiled):
+    return next(node.timeout for node in compiled.transitions if isinstance(node, CombinedReadingNode))
+
+
+def test_templates_follow_the_node_timeout_setting(monkeypatch):
+    monkeypatch.setenv("READING_NODE_TIMEOUT", "0")
+    default_flow = flow.get_tarot_reading_flow()
+    assert flow.get_tarot_reading_flow() is default_flow
+
+    monkeypatch.setenv("READING_NODE_TIMEOUT", "7")
+    timed_flow = flow.get_tarot_reading_flow()
+    assert timed_flow is not default_flow
+    assert _combined_timeout(timed_flow) == 7
+    assert _combined_timeout(flow.get_quick_reading_flow()) == 7
+    assert _combined_timeout(flow.get_quick_reading_flow(use_async=True)) == 7
+    assert _combined_timeout(default_flow) is None
@@ -0,0 +1,165 @@
+# tests/test_dag_flow.py
+"""
+DagFlow / AsyncDagFlow：无依赖的节点并行运行，读写冲突的节点按顺序运行，
+一个节点失败后其余节点不再运行（异步版本取消正在运行的节点），同步和异步版本结果一致
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from macore import AsyncDagFlow, AsyncNode, DagFlow, Node
+
+
+def _record(shared, name, event):
+    shared.setdefault("_events", []).append((name, event, time.monotonic()))
+
+
+def _span(shared, name):
+    times = {event: t for n, event, t in shared["_events"] if n == name}
+    return times["start"], times["end"]
+
+
+class Step(Node):
+    """测试节点：读取 reads 中的键，等待 delay 秒，把 compute(输入) 的结果写入 writes 中的键"""
+
+    def __init__(self, name, reads=(), writes=(), delay=0.0, compute=None, error=None):
+        super().__init__()
+        self.name, self.reads, self.writes = name, tuple(reads), tuple(writes)
+        self.delay, self.compute, self.error = delay, compute, error
+
+    def prep(self, shared):
+        _record(shared, self.name, "start")
+        return {key: shared.get(key) for key in self.reads}
+
+    def exec(self, inputs):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.compute(inputs) if self.compute else {key: self.name for key in self.writes}
+
+    def post(self, shared, inputs, outputs):
+        shared.update(outputs)
+        _record(shared, self.name, "end")
+        return "default"
+
+
+class AsyncStep(AsyncNode, Step):
+    """Step 的异步版本，被取消时记录 cancelled"""
+
+    async def prep_async(self, shared):
+        return self.prep(shared)
+
+    async def exec_async(self, inputs):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.compute(inputs) if self.compute else {key: self.name for key in self.writes}
+
+    async def post_async(self, shared, inputs, outputs):
+        return self.post(shared, inputs, outputs)
+
+
+def _run(use_async, nodes):
+    shared = {}
+    if use_async:
+        asyncio.run(AsyncDagFlow(nodes).run_async(shared))
+    else:
+        DagFlow(nodes).run(shared)
+    return shared
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_independent_nodes_overlap(use_async):
+    step = AsyncStep if use_async else Step
+    started = time.monotonic()
+    shared = _run(use_async, [step("a", writes=["a"], delay=0.2), step("b", writes=["b"], delay=0.2)])
+
+    assert time.monotonic() - started < 0.35
+    a_start, a_end = _span(shared, "a")
+    b_start, b_end = _span(shared, "b")
+    assert a_start < b_end and b_start < a_end
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_hazards_are_ordered(use_async):
+    step = AsyncStep if use_async else Step
+    nodes = [
+        step("read_x", reads=["x"], writes=["seen"], delay=0.1, compute=lambda i: {"seen": i["x"]}),
+        step("write_x", writes=["x"]),              # 写后读：必须等 read_x 读完
+        step("first_y", writes=["y"], delay=0.1),
+        step("second_y", writes=["y"]),             # 写后写：必须在 first_y 之后
+    ]
+    shared = _run(use_async, nodes)
+
+    assert shared["seen"] is None
+    assert _span(shared, "write_x")[0] >= _span(shared, "read_x")[1]
+    assert _span(shared, "second_y")[0] >= _span(shared, "first_y")[1]
+    assert shared["y"] == "second_y"
+
+
+def test_merged_writes_may_overlap():
+    class Merging(Step):
+        merges = ("usage",)
+
+    shared = _run(False, [Merging("a", writes=["usage"], delay=0.2), Merging("b", writes=["usage"], delay=0.2)])
+
+    a_start, a_end = _span(shared, "a")
+    b_start, b_end = _span(shared, "b")
+    assert a_start < b_end and b_start < a_end
+
+
+def test_sync_failure_propagates_and_stops_scheduling():
+    nodes = [
+        Step("boom", writes=["a"], error=ValueError("boom")),
+        Step("after", reads=["a"], writes=["b"]),
+    ]
+    shared = {}
+    with pytest.raises(ValueError, match="boom"):
+        DagFlow(nodes).run(shared)
+
+    assert not any(name == "after" for name, _, _ in shared["_events"])
+
+
+def test_async_failure_propagates_and_cancels_running_nodes():
+    flow = AsyncDagFlow([
+        AsyncStep("boom", writes=["a"], delay=0.05, error=ValueError("boom")),
+        AsyncStep("slow", writes=["s"], delay=5),
+        AsyncStep("after", reads=["a"], writes=["b"]),
+    ])
+    slow = next(node for node in flow.order if node.name == "slow")
+    shared = {}
+
+    async def run():
+        await flow.run_async(shared)
+
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(run())
+
+    assert time.monotonic() - started < 1
+    assert getattr(slow, "cancelled", False)
+    assert "s" not in shared
+    assert not any(name == "after" for name, _, _ in shared["_events"])
+
+
+def test_sync_and_async_give_same_result():
+    def build(step):
+        return [
+            step("source", writes=["n"], compute=lambda i: {"n": 3}),
+            step("double", reads=["n"], writes=["d"], delay=0.02, compute=lambda i: {"d": i["n"] * 2}),
+            step("square", reads=["n"], writes=["s"], delay=0.01, compute=lambda i: {"s": i["n"] ** 2}),
+            step("total", reads=["d", "s"], writes=["t"], compute=lambda i: {"t": i["d"] + i["s"]}),
+        ]
+
+    sync_shared = _run(False, build(Step))
+    async_shared = _run(True, build(AsyncStep))
+    for shared in (sync_shared, async_shared):
+        shared.pop("_events")
+
+    assert sync_shared == async_shared == {"n": 3, "d": 6, "s": 9, "t": 15}
@@ -0,0 +1,141 @@
+# tests/test_deadline.py
+"""
+时间预算与超时降级：节点超时使用备用结果，整个占卜超时退回快速占卜
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import flow
+import nodes
+from macore import AsyncFlow, AsyncNode, DeadlineExceeded, deadline
+from utils.card_drawer import draw_cards
+from utils.spread_config import get_spread_config
+from utils.tarot_database import build_card_meanings
+
+
+class SlowNode(AsyncNode):
+    async def exec_async(self, prep_res):
+        await asyncio.sleep(1)
+        return "slow"
+
+    async def exec_fallback_async(self, prep_res, exc):
+        return type(exc).__name__
+
+    async def post_async(self, shared, prep_res, exec_res):
+        shared["result"] = exec_res
+
+
+def test_node_timeout_uses_fallback():
+    shared = {}
+    started = time.monotonic()
+    asyncio.run(AsyncFlow(start=SlowNode(timeout=0.05)).compile().run_async(shared))
+
+    assert time.monotonic() - started < 0.5
+    assert shared["result"] == "DeadlineExceeded"
+
+
+def test_flow_deadline_raises_before_next_node():
+    first, second = SlowNode(), SlowNode()
+    first >> second
+    compiled = AsyncFlow(start=first).compile()
+
+    async def run():
+        with deadline(0.05):
+            await compiled.run_async({})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+
+
+@pytest.fixture
+def slow_individual_readings(monkeypatch):
+    """单牌解读的LLM调用一直卡住，综合解读立即返回"""
+    async def fake_call_llm_async(prompt, **kwargs):
+        if "整体" not in prompt:
+            await asyncio.sleep(5)
+        return "降级后的综合解读\n建议保持耐心"
+    monkeypatch.setattr(nodes, "call_llm_async", fake_call_llm_async)
+    monkeypatch.setenv("READING_DEADLINE_SECONDS", "1")
+    monkeypatch.setenv("READING_FALLBACK_RESERVE_SECONDS", "0.5")
+    monkeypatch.setenv("READING_FLOW_EXECUTOR", "chain")
+    monkeypatch.setenv("INDIVIDUAL_READING_MODE", "batch")
+    monkeypatch.setenv("COMBINED_READING_MODE", "sequential")
+
+
+def test_reading_over_deadline_falls_back_to_quick_reading(storage, slow_individual_readings):
+    started = time.monotonic()
+    result = asyncio.run(flow.run_tarot_reading_async("我的事业如何", "three_card"))
+
+    assert time.monotonic() - started < 3
+    assert result["success"] and result["degraded"]
+    assert result["individual_readings"] == []
+    assert result["combined_reading"].startswith("降级后的综合解读")
+    assert result["save_success"]
+    assert len(storage.load_all_readings()) == 1
+
+
+def _three_card_meanings():
+    return build_card_meanings(draw_cards(3), get_spread_config("three_card")["positions"])
+
+
+def test_degraded_reading_keeps_existing_combined_reading(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("combined reading must not be regenerated")
+    monkeypatch.setattr(nodes, "call_llm", fail)
+    shared = {"card_meanings": _three_card_meanings(), "combined_reading": "已有的综合解读", "user_question": "问题"}
+
+    degraded_flow, budget = flow._prepare_degraded_reading(shared, False, False, 1.0)
+    degraded_flow.run(shared)
+
+    assert budget is None
+    assert shared["combined_reading"] == "已有的综合解读"
+    assert shared["degraded"]
+
+
+def test_slow_combined_reading_is_regenerated_within_reserve(storage, monkeypatch):
+    """综合解读的LLM调用耗尽时间预算后，备用解读不算数：在预留时间内重新生成，保留已成功的单牌解读"""
+    calls = []
+    async def fake_call_llm_async(prompt, **kwargs):
+        calls.append(prompt)
+        if "整体" not in prompt:
+            return "\n---\n".join(f"牌{i}解读:\n单牌解读{i}" for i in range(1, 4))
+        if len([c for c in calls if "整体" in c]) == 1:
+            await asyncio.sleep(5)
+        return "重新生成的综合解读\n建议保持耐心"
+    monkeypatch.setattr(nodes, "call_llm_async", fake_call_llm_async)
+    monkeypatch.setenv("READING_DEADLINE_SECONDS", "1")
+    monkeypatch.setenv("READING_FALLBACK_RESERVE_SECONDS", "0.5")
+    monkeypatch.setenv("READING_FLOW_EXECUTOR", "chain")
+    monkeypatch.setenv("INDIVIDUAL_READING_MODE", "batch")
+    monkeypatch.setenv("COMBINED_READING_MODE", "sequential")
+
+    result = asyncio.run(flow.run_tarot_reading_async("我的事业如何", "three_card"))
+
+    assert result["success"] and result["degraded"]
+    assert len(calls) == 3
+    assert result["combined_reading"].startswith("重新生成的综合解读")
+    assert [r["reading"] for r in result["individual_readings"]] == [f"单牌解读{i}" for i in range(1, 4)]
+    assert result["save_success"]
+
+
+def test_timed_out_stream_stops_forwarding_deltas(monkeypatch):
+    def fake_stream(prompt, stream=False):
+        for i in range(20):
+            time.sleep(0.02)
+            yield f"片段{i}"
+    monkeypatch.setattr(nodes, "call_llm", fake_stream)
+    deltas = []
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(nodes.stream_llm_text_async("prompt", deltas.append), 0.1)
+        forwarded = len(deltas)
+        await asyncio.sleep(0.3)
+        return forwarded
+
+    forwarded = asyncio.run(run())
+    assert forwarded < 20
+    assert len(deltas) == forwarded
@@ -0,0 +1,122 @@
+# tests/test_interpretation_cache.py
+"""
+单牌解读缓存：默认同类问题共享解读，exact 模式按问题隔离，格式错位的批量解读不写入缓存
+"""
+
+import pytest
+
+import nodes
+from utils import interpretation_cache
+from utils.card_drawer import draw_cards
+from utils.spread_config import get_spread_config
+from utils.tarot_database import build_card_meanings
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """启用只在内存中的解读缓存，用例结束后丢弃"""
+    monkeypatch.setenv("INTERPRETATION_CACHE_ENABLED", "true")
+    monkeypatch.setenv("INTERPRETATION_CACHE_BACKEND", "memory")
+    monkeypatch.delenv("INTERPRETATION_CACHE_QUESTION_KEY", raising=False)
+    monkeypatch.delenv("INTERPRETATION_CACHE_QUESTION_BITS", raising=False)
+    monkeypatch.setattr(interpretation_cache, "_cache", None)
+    monkeypatch.setattr(interpretation_cache, "_metrics", {"hits": 0, "misses": 0, "stores": 0})
+
+
+def _run_individual_reading(question, card_meanings, category="career"):
+    shared = {
+        "card_meanings": card_meanings,
+        "user_question": question,
+        "question_category": category,
+        "spread_type": "three_card"
+    }
+    nodes.IndividualReadingNode().run(shared)
+    return shared["individual_readings"]
+
+
+def test_cache_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("INTERPRETATION_CACHE_ENABLED", raising=False)
+    assert not interpretation_cache.is_interpretation_cache_enabled()
+
+
+def _key(question, category="career"):
+    return interpretation_cache.interpretation_key("愚者", False, "single", 1, category, question)
+
+
+def test_default_key_is_shared_within_category(monkeypatch):
+    monkeypatch.delenv("INTERPRETATION_CACHE_QUESTION_KEY", raising=False)
+
+    assert _key("我该换工作吗") == _key("我的事业何时起步")
+    assert _key("我该换工作吗") != _key("我该换工作吗", category="love")
+
+
+def test_exact_key_depends_on_question(monkeypatch):
+    monkeypatch.setenv("INTERPRETATION_CACHE_QUESTION_KEY", "exact")
+
+    assert _key("我该换工作吗") != _key("我的事业何时起步")
+    assert _key("Should I move?") == _key("  should i  MOVE?")
+
+
+def test_simhash_key_buckets_by_leading_bits(monkeypatch):
+    monkeypatch.setenv("INTERPRETATION_CACHE_QUESTION_KEY", "simhash")
+    monkeypatch.setenv("INTERPRETATION_CACHE_QUESTION_BITS", "8")
+    questions = ["我该换工作吗", "我的事业何时起步", "Should I move?"]
+
+    for question in questions:
+        assert _key(question) == _key("  " + question + " ")
+    assert len({_key(question) for question in questions}) > 1
+    monkeypatch.setenv("INTERPRETATION_CACHE_QUESTION_BITS", "0")
+    assert len({_key(question) for question in questions}) == 1
+
+
+def _fake_batch_llm(prompts):
+    def fake_call_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return "\n---\n".join(f"牌{i}解读:\n回答{len(prompts)}-{i}" for i in range(1, 4))
+    return fake_call_llm
+
+
+def test_readings_are_shared_within_category_by_default(memory_cache, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(nodes, "call_llm", _fake_batch_llm(prompts))
+    card_meanings = build_card_meanings(draw_cards(3), get_spread_config("three_card")["positions"])
+
+    first = _run_individual_reading("我该换工作吗", card_meanings)
+    other = _run_individual_reading("我的事业何时起步", card_meanings)
+    love = _run_individual_reading("我的事业何时起步", card_meanings, category="love")
+
+    assert len(prompts) == 2
+    assert interpretation_cache.get_interpretation_cache_metrics()["hits"] == 3
+    assert [r["reading"] for r in other] == [r["reading"] for r in first]
+    assert all(r["reading"].startswith("回答2-") for r in love)
+
+
+def test_exact_readings_are_not_shared_between_questions(memory_cache, monkeypatch):
+    monkeypatch.setenv("INTERPRETATION_CACHE_QUESTION_KEY", "exact")
+    prompts = []
+    monkeypatch.setattr(nodes, "call_llm", _fake_batch_llm(prompts))
+    card_meanings = build_card_meanings(draw_cards(3), get_spread_config("three_card")["positions"])
+
+    first = _run_individual_reading("我该换工作吗", card_meanings)
+    again = _run_individual_reading("我该换工作吗", card_meanings)
+    other = _run_individual_reading("我的事业何时起步", card_meanings)
+
+    assert len(prompts) == 2
+    assert interpretation_cache.get_interpretation_cache_metrics()["stores"] == 6
+    assert [r["reading"] for r in again] == [r["reading"] for r in first]
+    assert all(r["reading"].startswith("回答2-") for r in other)
+
+
+def test_misaligned_batch_reading_is_not_cached(memory_cache, monkeypatch):
+    prompts = []
+    def fake_call_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return "牌1解读:\n只有一段"
+    monkeypatch.setattr(nodes, "call_llm", fake_call_llm)
+    card_meanings = build_card_meanings(draw_cards(3), get_spread_config("three_card")["positions"])
+
+    _run_individual_reading("我该换工作吗", card_meanings)
+    _run_individual_reading("我该换工作吗", card_meanings)
+
+    assert len(prompts) == 2
+    assert interpretation_cache.get_interpretation_cache_metrics()["stores"] == 0
@@ -0,0 +1,63 @@
+# tests/test_llm_cache.py
+"""
+LLM调用缓存：包装函数与 call_llm 的签名一致，stream/response_schema 只能按关键字传入
+"""
+
+import inspect
+
+import pytest
+
+from utils import call_llm as call_llm_module
+from utils import llm_cache
+
+
+@pytest.fixture
+def memory_llm_cache(monkeypatch):
+    """启用只在内存中的LLM缓存，用例结束后丢弃"""
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setenv("LLM_CACHE_BACKEND", "memory")
+    monkeypatch.setenv("LLM_ROUTER_ENABLED", "false")
+    monkeypatch.setattr(llm_cache, "_cache", None)
+    monkeypatch.setattr(llm_cache, "_metrics", {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "bytes_saved": 0})
+
+
+def _memoized_fake():
+    calls = []
+    @llm_cache.memoize_llm(lambda provider: "fake-model")
+    def fake_llm(prompt, provider=None, *, stream=False, response_schema=None):
+        calls.append((prompt, provider, stream, response_schema))
+        return f"reply {len(calls)}"
+    return fake_llm, calls
+
+
+def test_call_llm_options_are_keyword_only():
+    for func in (call_llm_module.call_llm, call_llm_module.call_llm_async):
+        parameters = inspect.signature(inspect.unwrap(func)).parameters
+        assert [name for name, p in parameters.items() if p.kind is p.POSITIONAL_OR_KEYWORD] == ["prompt", "provider"]
+
+    with pytest.raises(TypeError):
+        call_llm_module.call_llm("hi", "openai", True)
+
+
+def test_memoized_call_passes_keyword_options(memory_llm_cache):
+    fake_llm, calls = _memoized_fake()
+    schema = {"type": "object"}
+
+    first = fake_llm("hi", "openai", response_schema=schema)
+    again = fake_llm("hi", provider="openai", response_schema=schema)
+    plain = fake_llm("hi", "openai")
+
+    assert first == again == "reply 1"
+    assert plain == "reply 2"
+    assert calls == [("hi", "openai", False, schema), ("hi", "openai", False, None)]
+    assert llm_cache.get_llm_cache_metrics()["hits"] == 1
+
+
+def test_streaming_call_skips_cache(memory_llm_cache):
+    fake_llm, calls = _memoized_fake()
+
+    fake_llm("hi", "openai", stream=True)
+    fake_llm("hi", "openai", stream=True)
+
+    assert len(calls) == 2
+    assert llm_cache.get_llm_cache_metrics()["stores"] == 0
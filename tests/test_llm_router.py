@@ -0,0 +1,103 @@
+# tests/test_llm_router.py
+"""
+提供商路由：对冲请求、故障转移、全部失败时抛出最后一个异常、落败的异步请求被取消、
+错误率超出预算的提供商排到最后
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.llm_router import LLMRouter
+
+
+class ProviderError(Exception):
+    pass
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """openai 优先、deepseek 其次的路由器，首选提供商 0.05 秒没有返回就对冲"""
+    monkeypatch.setenv("LLM_ROUTER_PROVIDERS", "openai,deepseek")
+    monkeypatch.setenv("LLM_HEDGE_INITIAL_DELAY", "0.05")
+    monkeypatch.setenv("LLM_ERROR_BUDGET_MIN_SAMPLES", "3")
+    return LLMRouter()
+
+
+def stub_providers(behaviours):
+    """按提供商返回结果、抛出异常或先等待若干秒：behaviours[provider] = (延迟, 结果或异常)"""
+    def call(prompt, provider, **kwargs):
+        delay, outcome = behaviours[provider]
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return call
+
+
+def test_hedge_wins_when_primary_is_slow(router):
+    call = stub_providers({"openai": (0.5, "openai"), "deepseek": (0, "deepseek")})
+
+    assert router.call(call, "prompt") == "deepseek"
+    assert router.counters["hedges"] == 1
+    assert router.counters["hedge_wins"] == 1
+
+
+def test_failover_when_primary_raises(router):
+    call = stub_providers({"openai": (0, ProviderError("down")), "deepseek": (0, "deepseek")})
+
+    assert router.call(call, "prompt") == "deepseek"
+    assert router.counters["failovers"] == 1
+    assert router.counters["hedges"] == 0
+
+
+def test_all_providers_failing_raises_last_error(router):
+    last = ProviderError("deepseek down")
+    call = stub_providers({"openai": (0, ProviderError("openai down")), "deepseek": (0, last)})
+
+    with pytest.raises(ProviderError) as excinfo:
+        router.call(call, "prompt")
+    assert excinfo.value is last
+
+
+def test_losing_async_request_is_cancelled(router):
+    cancelled = []
+
+    async def call(prompt, provider, **kwargs):
+        if provider == "deepseek":
+            return "deepseek"
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        return "openai"
+
+    async def run():
+        result = await router.call_async(call, "prompt")
+        await asyncio.sleep(0)  # 让被取消的任务处理取消
+        return result
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == "deepseek"
+    assert time.monotonic() - started < 1
+    assert cancelled == ["openai"]
+
+
+def test_provider_over_error_budget_is_tried_last(router):
+    assert router.route() == ["openai", "deepseek"]
+    for _ in range(3):
+        router._stats("openai").record(0.1, False)
+
+    assert router.route() == ["deepseek", "openai"]
+
+
+def test_unknown_providers_raise_clear_error(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTER_PROVIDERS", "nope,missing")
+    router = LLMRouter()
+
+    with pytest.raises(ValueError, match="No LLM providers to route to"):
+        router.call(stub_providers({}), "prompt")
+    with pytest.raises(ValueError, match="No LLM providers to route to"):
+        asyncio.run(router.call_async(stub_providers({}), "prompt"))
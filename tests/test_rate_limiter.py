@@ -0,0 +1,98 @@
+# tests/test_rate_limiter.py
+"""
+客户端限流：取消的排队请求不占用令牌和并发名额，429时并发上限减半，成功时加性增加到上限
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import ProviderLimiter, rate_limited
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """开启限流，每个用例使用新的限流器"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "true")
+    monkeypatch.setenv("LLM_RATE_LIMIT_RETRIES", "0")
+    monkeypatch.setenv("LLM_RATE_LIMIT_COOLDOWN", "60")
+    monkeypatch.setenv("LLM_RATE_LIMIT_BACKOFF", "0")
+    monkeypatch.setenv("LLM_RATE_LIMIT_CONCURRENCY", "8")
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    return lambda: rate_limiter.get_limiter("openai", "fake")
+
+
+def test_cancelled_acquire_returns_its_tokens_and_slot():
+    limiter = ProviderLimiter(rpm=0, tpm=60, initial_concurrency=1, burst_seconds=100)
+    limiter.acquire(10, time.monotonic() + 1)
+    tokens_after_first = limiter.tpm.tokens
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(limiter.acquire_async(10, time.monotonic() + 5))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(cancel_waiter())
+
+    assert limiter.queued == 0
+    assert limiter.in_flight == 1
+    assert limiter.tpm.tokens < tokens_after_first + 1  # 只有自然补充，没有被第二个请求占用
+    limiter.release("ok")
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_call_releases_its_slot(limits):
+    async def slow_llm(prompt, provider=None, **kwargs):
+        await asyncio.sleep(5)
+
+    call = rate_limited(lambda provider: "fake")(slow_llm)
+
+    async def cancel_call():
+        task = asyncio.ensure_future(call("prompt", "openai"))
+        await asyncio.sleep(0.05)
+        assert limits().in_flight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_call())
+
+    limiter = limits()
+    assert (limiter.in_flight, limiter.queued, limiter.limit) == (0, 0, 8)
+
+
+def test_rate_limit_error_halves_concurrency(limits):
+    def throttled_llm(prompt, provider=None, **kwargs):
+        raise FakeRateLimitError("429 Too Many Requests")
+
+    call = rate_limited(lambda provider: "fake")(throttled_llm)
+    with pytest.raises(FakeRateLimitError):
+        call("prompt", "openai")
+
+    limiter = limits()
+    assert limiter.limit == 4
+    assert limiter.metrics["throttled"] == 1
+    # 冷却时间内的其它429不再继续减半
+    limiter.acquire(1, time.monotonic() + 1)
+    limiter.release("throttled")
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_success_increases_concurrency_additively_up_to_cap():
+    limiter = ProviderLimiter(rpm=0, tpm=0, initial_concurrency=2, max_concurrency=3)
+    limits_seen = []
+    for _ in range(4):
+        limiter.acquire(1, time.monotonic() + 1)
+        limiter.release("ok")
+        limits_seen.append(round(limiter.limit, 2))
+
+    assert limits_seen == [2.5, 2.9, 3.0, 3.0]
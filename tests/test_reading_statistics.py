@@ -0,0 +1,46 @@
+# tests/test_reading_statistics.py
+"""
+增量维护的统计计数器：保存和删除之后与全量重建的结果一致
+"""
+
+import pytest
+
+from utils import reading_statistics
+
+CATEGORIES = ("love", "career", "general")
+SPREADS = ("single", "three_card", "celtic_cross")
+
+
+def full_recompute(storage, backend):
+    return reading_statistics.build_stats(storage._iter_stored_readings(), backend)
+
+
+@pytest.mark.parametrize("backend", ["jsonl", "sqlite"])
+def test_incremental_statistics_match_full_recompute(storage, monkeypatch, backend):
+    monkeypatch.setenv("READING_STORAGE_BACKEND", backend)
+    storage.set_storage_dir(storage.STORAGE_DIR)
+
+    def sample(i):
+        return {"user_question": f"问题{i}", "question_category": CATEGORIES[i % 3], "spread_type": SPREADS[i % 2 * 2]}
+
+    for i in range(6):
+        assert storage.save_reading(sample(i))
+    storage.save_readings_batch([sample(i) for i in range(6, 15)])
+    readings = storage.load_all_readings()
+    middle = readings[1:-1:3]
+    for reading in middle:
+        assert storage.delete_reading(reading["id"])
+    assert not storage.delete_reading("missing-id")
+
+    # 删除的不是最新或最早的记录时，计数器与全量重建完全一致
+    assert reading_statistics.load_stats(storage.STATS_FILE) == full_recompute(storage, backend)
+
+    # 删除最新的记录后边界未知，计数器标记为过期；各项计数仍然一致，读取时重建边界
+    assert storage.delete_reading(readings[0]["id"])
+    incremental = reading_statistics.load_stats(storage.STATS_FILE)
+    assert incremental["stale"]
+    full = full_recompute(storage, backend)
+    for key in ("total", "question_types", "spread_types", "months"):
+        assert incremental[key] == full[key]
+    assert storage.get_reading_statistics() == reading_statistics.summarize(full)
+    assert full["total"] == 15 - len(middle) - 1
@@ -0,0 +1,117 @@
+# tests/test_reading_storage.py
+"""
+占卜记录存储：日志按时间顺序追加，删除写墓碑并按阈值压缩，并发保存不丢记录，
+后台写入队列不打乱顺序，游标分页不重复、不遗漏
+"""
+
+import json
+import threading
+
+import pytest
+
+from utils.reading_writer import ReadingWriteQueue
+
+
+def _log_entries(storage):
+    with open(storage.READINGS_LOG_FILE, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _sample(index):
+    return {"user_question": f"问题{index}", "question_category": "general", "spread_type": "single"}
+
+
+def test_save_and_batch_keep_log_in_timestamp_order(storage):
+    for i in range(5):
+        assert storage.save_reading(_sample(i))
+    assert storage.save_readings_batch([_sample(i) for i in range(5, 12)]) == 7
+
+    timestamps = [entry["timestamp"] for entry in _log_entries(storage)]
+    assert len(timestamps) == 12
+    assert timestamps == sorted(timestamps)
+
+
+def test_delete_appends_tombstone_and_compacts(storage, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACTION_THRESHOLD", 4)
+    storage.save_readings_batch([_sample(i) for i in range(5)])
+    ids = [reading["id"] for reading in storage.load_all_readings()]
+
+    assert storage.delete_reading(ids[0])
+    assert len(_log_entries(storage)) == 6
+    assert not storage.delete_reading(ids[0])
+
+    assert storage.delete_reading(ids[1])
+    entries = _log_entries(storage)
+    assert len(entries) == 3
+    assert not any(entry.get(storage.TOMBSTONE_KEY) for entry in entries)
+    assert {r["id"] for r in storage.load_all_readings()} == set(ids[2:])
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_concurrent_saves_lose_nothing(storage, use_processes):
+    result = storage.stress_test_concurrent_saves(num_saves=40, num_workers=4, use_processes=use_processes)
+
+    assert result["reported_success"] == 40
+    assert result["lost"] == 0
+
+
+def test_write_queue_keeps_log_in_timestamp_order(storage):
+    # 队列很小，大部分记录走同步写入的回退路径，和后台批量写入交错进行
+    queue = ReadingWriteQueue(max_size=2, batch_size=3, flush_interval=0.01)
+    queue.start()
+    threads = [
+        threading.Thread(target=lambda base=t: [queue.submit(_sample(base * 20 + i)) for i in range(20)])
+        for t in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert queue.flush(timeout=10)
+    queue.stop()
+
+    entries = _log_entries(storage)
+    assert len(entries) == 80
+    assert len({entry["id"] for entry in entries}) == 80
+    timestamps = [entry["timestamp"] for entry in entries]
+    assert timestamps == sorted(timestamps)
+
+
+@pytest.mark.parametrize("backend,cache_enabled", [("jsonl", True), ("jsonl", False), ("sqlite", True)])
+def test_cursor_paging_returns_every_reading_once(storage, monkeypatch, backend, cache_enabled):
+    monkeypatch.setenv("READING_STORAGE_BACKEND", backend)
+    monkeypatch.setattr(storage._read_cache, "enabled", cache_enabled)
+    storage.set_storage_dir(storage.STORAGE_DIR)
+    storage.save_readings_batch([_sample(i) for i in range(25)])
+    deleted = storage.load_all_readings()[3]["id"]
+    assert storage.delete_reading(deleted)
+
+    seen, cursor = [], None
+    while True:
+        page = storage.get_readings_page(limit=7, cursor=cursor, fields=storage.SUMMARY_FIELDS)
+        seen.extend(page["readings"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    ids = [reading["id"] for reading in seen]
+    assert len(ids) == 24 and len(set(ids)) == 24
+    assert deleted not in ids
+    keys = [(reading["timestamp"], reading["id"]) for reading in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert page["total"] == 24
+
+
+def test_iter_readings_start_date_stops_at_older_entries(storage):
+    storage.ensure_storage_directory()
+    entries = []
+    for day in ("2026-01-01", "2026-02-01", "2026-03-01"):
+        entry = storage.prepare_reading_record(_sample(day))
+        entry["timestamp"] = f"{day}T12:00:00"
+        entries.append(entry)
+    storage._write_log_file(entries)
+
+    readings = list(storage.iter_readings(start_date="2026-02-01"))
+    assert [r["timestamp"][:10] for r in readings] == ["2026-03-01", "2026-02-01"]
+    readings = list(storage.iter_readings(start_date="2026-01-15", end_date="2026-02-15"))
+    assert [r["timestamp"][:10] for r in readings] == ["2026-02-01"]
@@ -0,0 +1,65 @@
+# tests/test_retention.py
+"""
+保留策略与归档：归档到月份分区的记录可以读回，归档失败时热存储中的记录不会丢失
+"""
+
+import os
+
+from utils import reading_archive
+
+
+def _write_history(storage, timestamps):
+    """按给定时间戳写入日志，返回 id 列表"""
+    storage.ensure_storage_directory()
+    entries = []
+    for i, timestamp in enumerate(timestamps):
+        entry = storage.prepare_reading_record({"user_question": f"问题{i}", "spread_type": "single"})
+        entry["timestamp"] = timestamp
+        entries.append(entry)
+    storage._write_log_file(entries)
+    return [entry["id"] for entry in entries]
+
+
+def test_archived_readings_are_read_back_from_month_partitions(storage):
+    ids = _write_history(storage, [
+        "2026-01-05T10:00:00", "2026-01-20T10:00:00", "2026-02-10T10:00:00", "2026-03-01T10:00:00",
+        "2026-03-02T10:00:00",
+    ])
+
+    assert storage.apply_retention_policy(max_age_days=0, max_count=3) == 2
+    assert storage.apply_retention_policy(max_age_days=0, max_count=1) == 2  # 第二次追加到已有的分区
+
+    months = [month for month, _ in reading_archive.list_partitions(storage.ARCHIVE_DIR)]
+    assert months == ["2026-03", "2026-02", "2026-01"]
+    archived = list(storage.iter_archived_readings())
+    assert [r["id"] for r in archived] == ids[3::-1]
+    assert archived[0]["user_question"] == "问题3"
+    assert [r["id"] for r in storage.iter_archived_readings(start_date="2026-01-10", end_date="2026-02-28")] == [ids[2], ids[1]]
+
+    in_range = storage.get_readings_by_date_range("2026-01-01", "2026-03-31")
+    assert [r["id"] for r in in_range] == ids[::-1]
+    assert [r["id"] for r in storage.load_all_readings()] == [ids[4]]
+
+
+def test_retention_keeps_readings_when_archiving_fails(storage, monkeypatch):
+    ids = _write_history(storage, ["2026-01-05T10:00:00", "2026-02-10T10:00:00", "2026-03-01T10:00:00"])
+
+    def fail(archive_dir, readings):
+        raise OSError("disk full")
+    monkeypatch.setattr(reading_archive, "append_to_archive", fail)
+
+    assert storage.apply_retention_policy(max_age_days=0, max_count=1) == 0
+    assert {r["id"] for r in storage.load_all_readings()} == set(ids)
+    assert not os.path.exists(storage.ARCHIVE_DIR)
+
+
+def test_retention_moves_every_expired_reading_into_the_archive(storage):
+    ids = _write_history(storage, [f"2025-{month:02d}-15T10:00:00" for month in range(1, 13)])
+
+    assert storage.apply_retention_policy(max_age_days=30, max_count=0) == 12
+
+    archived = {r["id"] for r in storage.iter_archived_readings()}
+    hot = {r["id"] for r in storage.load_all_readings()}
+    assert archived | hot == set(ids)
+    assert hot == set()
+    assert storage.get_archive_summary()["partitions"] == 12
@@ -0,0 +1,37 @@
+# tests/test_storage_migration.py
+"""
+存储迁移：旧版JSON数组文件转换为日志，JSON Lines日志只导入SQLite一次
+"""
+
+import json
+import os
+
+
+def test_legacy_json_file_is_migrated_to_log(storage):
+    os.makedirs(storage.STORAGE_DIR)
+    legacy = [
+        {"id": "b", "timestamp": "2026-02-01T00:00:00", "user_question": "后"},
+        {"id": "a", "timestamp": "2026-01-01T00:00:00", "user_question": "前"},
+    ]
+    with open(storage.READINGS_FILE, "w", encoding="utf-8") as f:
+        json.dump(legacy, f, ensure_ascii=False)
+
+    assert [r["id"] for r in storage.load_all_readings()] == ["b", "a"]
+    assert not os.path.exists(storage.READINGS_FILE)
+    assert os.path.exists(storage.READINGS_FILE + ".bak")
+
+
+def test_log_is_imported_into_sqlite_only_once(storage, monkeypatch):
+    for i in range(3):
+        assert storage.save_reading({"user_question": f"问题{i}"})
+
+    monkeypatch.setenv("READING_STORAGE_BACKEND", "sqlite")
+    storage.set_storage_dir(storage.STORAGE_DIR)  # 模拟重启：重新检查迁移
+    readings = storage.load_all_readings()
+    assert len(readings) == 3
+    for reading in readings:
+        assert storage.delete_reading(reading["id"])
+
+    storage.set_storage_dir(storage.STORAGE_DIR)
+    assert storage.load_all_readings() == []
+    assert storage.migrate_log_to_sqlite() == 0
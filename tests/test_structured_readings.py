@@ -0,0 +1,86 @@
+# tests/test_structured_readings.py
+"""
+结构化（JSON）单牌解读：严格校验每条解读，校验不通过的牌单独补请求
+"""
+
+import json
+
+import pytest
+
+import nodes
+from utils.card_drawer import draw_cards
+from utils.spread_config import get_spread_config
+from utils.tarot_database import build_card_meanings
+
+
+@pytest.fixture
+def cards_info():
+    card_meanings = build_card_meanings(draw_cards(3), get_spread_config("three_card")["positions"])
+    return nodes.build_cards_info(card_meanings, "career")
+
+
+def _reply(cards_info, indices, **extra):
+    return json.dumps({"readings": [
+        {"card_index": i + 1, "card_name": cards_info[i]["card_name"], "reading": f"解读{i + 1}", **extra}
+        for i in indices
+    ]}, ensure_ascii=False)
+
+
+def test_malformed_json_is_rejected(cards_info):
+    valid, errors = nodes.validate_structured_readings('{"readings": [', cards_info, [0, 1, 2])
+
+    assert valid == {}
+    assert errors[0].startswith("JSON解析失败")
+    assert nodes.validate_structured_readings('{"cards": []}', cards_info, [0, 1, 2]) == ({}, ["缺少readings数组"])
+
+
+def test_code_fence_is_accepted(cards_info):
+    valid, errors = nodes.validate_structured_readings(
+        "```json\n" + _reply(cards_info, [0, 1, 2]) + "\n```", cards_info, [0, 1, 2]
+    )
+
+    assert errors == []
+    assert sorted(valid) == [0, 1, 2]
+
+
+def test_missing_and_mismatched_cards_are_reported(cards_info):
+    payload = json.loads(_reply(cards_info, [0, 1]))
+    payload["readings"][1]["card_name"] = "不存在的牌"
+    valid, errors = nodes.validate_structured_readings(json.dumps(payload, ensure_ascii=False), cards_info, [0, 1, 2])
+
+    assert list(valid) == [0]
+    assert any("牌名不一致" in e for e in errors)
+    assert errors[-1] == "缺少牌[2, 3]的解读"
+
+
+def test_extra_keys_are_dropped_and_extra_cards_rejected(cards_info):
+    payload = json.loads(_reply(cards_info, [0, 1], mood="开心"))
+    payload["readings"].append({"card_index": 3, "card_name": cards_info[2]["card_name"], "reading": "没请求的牌"})
+    payload["readings"].append(dict(payload["readings"][0]))
+    valid, errors = nodes.validate_structured_readings(json.dumps(payload, ensure_ascii=False), cards_info, [0, 1])
+
+    assert sorted(valid) == [0, 1]
+    assert set(valid[0]) == {"card_name", "position", "position_name", "reversed", "reading"}
+    assert "无效的序号: 3" in errors
+    assert "牌1重复出现" in errors
+
+
+def test_repair_requests_only_missing_cards(cards_info, monkeypatch):
+    monkeypatch.setenv("INDIVIDUAL_READING_REPAIR_ATTEMPTS", "1")
+    prompts = []
+    def fake_call_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return _reply(cards_info, [0, 2] if len(prompts) == 1 else [1])
+    monkeypatch.setattr(nodes, "call_llm", fake_call_llm)
+    requested = []
+    build_prompt = nodes.build_structured_reading_prompt
+    def spy_build_prompt(prep_res, cards_info, indices):
+        requested.append(list(indices))
+        return build_prompt(prep_res, cards_info, indices)
+    monkeypatch.setattr(nodes, "build_structured_reading_prompt", spy_build_prompt)
+
+    readings = nodes.request_structured_readings({"user_question": "问题", "question_category": "career",
+                                                  "spread_type": "three_card"}, cards_info)
+
+    assert requested == [[0, 1, 2], [1]]
+    assert [r["reading"] for r in readings] == ["解读1", "解读2", "解读3"]
@@ -0,0 +1,34 @@
+# tests/test_token_budget.py
+"""
+prompt预算：默认不裁剪，显式设置预算后才把最长的文本裁剪到预算内
+"""
+
+import nodes
+from utils.card_drawer import draw_cards
+from utils.spread_config import get_spread_config
+from utils.tarot_database import build_card_meanings
+from utils.token_budget import count_tokens, fit_to_budget, get_prompt_budget
+
+
+def _celtic_cross_cards_info():
+    card_meanings = build_card_meanings(draw_cards(10), get_spread_config("celtic_cross")["positions"])
+    return nodes.build_cards_info(card_meanings, "career")
+
+
+def test_budgets_are_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("PROMPT_BUDGET_INDIVIDUAL_TOKENS", raising=False)
+    monkeypatch.delenv("PROMPT_BUDGET_COMBINED_TOKENS", raising=False)
+    cards_info = _celtic_cross_cards_info()
+
+    assert get_prompt_budget("individual") == get_prompt_budget("combined") == 0
+    assert nodes.budget_cards_info(cards_info) == cards_info
+
+
+def test_explicit_budget_trims_longest_texts(monkeypatch):
+    monkeypatch.setenv("PROMPT_BUDGET_INDIVIDUAL_TOKENS", "60")
+    cards_info = _celtic_cross_cards_info()
+
+    fitted = nodes.budget_cards_info(cards_info)
+    texts = [c["meaning_text"] for c in fitted] + [c["specific_meaning"] for c in fitted]
+    assert sum(count_tokens(text) for text in texts) <= 60
+    assert fit_to_budget(["短", "短"], 60) == ["短", "短"]
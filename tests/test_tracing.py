@@ -0,0 +1,93 @@
+# tests/test_tracing.py
+"""
+节点追踪：每个节点运行一次记录一条（含重试次数和捕获的异常），OTLP导出为一个根span加每个节点一个子span
+"""
+
+import asyncio
+
+import pytest
+
+from macore import AsyncDagFlow, AsyncFlow, AsyncNode, DagFlow, Flow, Node, TraceCollector, add_hook, remove_hook
+from utils.tracing import build_otlp_trace
+
+TRACE = "test_trace"
+
+
+@pytest.fixture
+def collector():
+    hook = add_hook(TraceCollector(TRACE))
+    yield hook
+    remove_hook(hook)
+
+
+class Flaky(Node):
+    """第一次执行失败，重试后成功"""
+    writes = ("flaky",)
+
+    def exec(self, prep_res):
+        if self.retry_attempt == 0:
+            raise ValueError("first attempt fails")
+        return "ok"
+
+    def post(self, shared, prep_res, exec_res):
+        shared["flaky"] = exec_res
+        return "default"
+
+
+class Done(Node):
+    reads = ("flaky",)
+
+
+class AsyncFlaky(AsyncNode, Flaky):
+    async def exec_async(self, prep_res):
+        return self.exec(prep_res)
+
+    async def post_async(self, shared, prep_res, exec_res):
+        return self.post(shared, prep_res, exec_res)
+
+
+def _chain(first, second):
+    first >> second
+    return first
+
+
+def _run(kind):
+    shared = {}
+    if kind == "sync":
+        Flow(start=_chain(Flaky(max_retries=2), Done())).run(shared)
+    elif kind == "async":
+        asyncio.run(AsyncFlow(start=_chain(AsyncFlaky(max_retries=2), Done())).compile().run_async(shared))
+    elif kind == "dag":
+        DagFlow([Flaky(max_retries=2), Done()]).run(shared)
+    else:
+        asyncio.run(AsyncDagFlow([AsyncFlaky(max_retries=2), Done()]).run_async(shared))
+    return shared
+
+
+@pytest.mark.parametrize("kind", ["sync", "async", "dag", "async_dag"])
+def test_one_record_per_node_with_retries_and_exceptions(collector, kind):
+    records = _run(kind)[TRACE]
+
+    assert [record["node"] for record in records] == [("AsyncFlaky" if "async" in kind else "Flaky"), "Done"]
+    flaky, done = records
+    assert flaky["retries"] == 1
+    assert flaky["exceptions"] == [repr(ValueError("first attempt fails"))]
+    assert flaky["error"] is None and flaky["action"] == "default"
+    assert set(flaky["phases"]) == {"prep", "exec", "post"}
+    assert done["retries"] == 0 and done["exceptions"] == []
+
+
+def test_otlp_trace_has_root_and_one_child_span_per_node(collector):
+    records = _run("sync")[TRACE]
+    trace = build_otlp_trace(records, attributes={"tarot.spread_type": "single"})
+
+    spans = trace["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, children = spans[0], spans[1:]
+    assert [span["name"] for span in children] == ["Flaky", "Done"]
+    assert "parentSpanId" not in root
+    assert all(span["parentSpanId"] == root["spanId"] for span in children)
+    assert len({span["traceId"] for span in spans}) == 1
+    assert int(root["startTimeUnixNano"]) <= min(int(s["startTimeUnixNano"]) for s in children)
+    assert int(root["endTimeUnixNano"]) >= max(int(s["endTimeUnixNano"]) for s in children)
+    assert [event["name"] for event in children[0]["events"]] == ["exception"]
+    assert root["attributes"] == [{"key": "tarot.spread_type", "value": {"stringValue": "single"}}]
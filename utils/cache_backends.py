@@ -0,0 +1,269 @@
+# utils/cache_backends.py
+"""
+通用键值缓存后端
+提供内存LRU、SQLite和shelve三种实现，以及“内存 + 磁盘”两级缓存，
+都支持条目数上限和TTL过期，值需要可以JSON序列化
+
+供解读缓存、LLM调用缓存等模块共用
+"""
+
+import json
+import os
+import shelve
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    from .file_lock import locked
+except ImportError:
+    from file_lock import locked
+
+CACHE_BACKENDS = ("memory", "sqlite", "shelve")
+
+class MemoryCache:
+    """进程内LRU缓存"""
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCache:
+    """
+    SQLite磁盘缓存，多进程共享
+
+    按最近访问时间淘汰：写入后条目数超过上限时删除最久未访问的条目。
+    """
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at);
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程（以及fork出的子进程）使用自己的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        with conn:
+            if expires_at is not None and expires_at < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl if ttl else None, now)
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (excess,)
+                )
+
+    def delete(self, key: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+class ShelveCache:
+    """
+    shelve磁盘缓存（标准库dbm实现，不需要SQLite）
+
+    shelve不支持并发访问，每次操作都在跨进程文件锁内打开、关闭数据库。
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock_file = path + ".lock"
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return shelve.open(self.path)
+
+    def get(self, key: str) -> Optional[Any]:
+        with locked(self._lock_file), self._open() as db:
+            entry = db.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] is not None and entry["expires_at"] < time.time():
+                del db[key]
+                return None
+            entry["accessed_at"] = time.time()
+            db[key] = entry
+            return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with locked(self._lock_file), self._open() as db:
+            db[key] = {"value": value, "expires_at": now + ttl if ttl else None, "accessed_at": now}
+            if len(db) > self.max_entries:
+                by_access = sorted(db.keys(), key=lambda k: db[k]["accessed_at"])
+                for old_key in by_access[:len(db) - self.max_entries]:
+                    del db[old_key]
+
+    def delete(self, key: str):
+        with locked(self._lock_file), self._open() as db:
+            if key in db:
+                del db[key]
+
+    def clear(self):
+        with locked(self._lock_file), self._open() as db:
+            db.clear()
+
+    def __len__(self) -> int:
+        with locked(self._lock_file), self._open() as db:
+            return len(db)
+
+class TieredCache:
+    """
+    两级缓存：内存LRU在前，磁盘缓存在后
+
+    磁盘命中的条目会提升到内存层；写入同时写两层。
+    """
+
+    def __init__(self, memory: MemoryCache, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.tier_hits = {"memory": 0, "disk": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.tier_hits["memory"] += 1
+            return value
+        if self.disk is None:
+            return None
+        value = self.disk.get(key)
+        if value is not None:
+            self.tier_hits["disk"] += 1
+            self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def __len__(self) -> int:
+        return len(self.disk) if self.disk is not None else len(self.memory)
+
+def create_cache(backend: str, path: Optional[str] = None, max_entries: int = 1000,
+                 ttl: Optional[float] = None, memory_entries: Optional[int] = None):
+    """
+    创建缓存
+
+    Args:
+        backend: memory / sqlite / shelve
+        path: 磁盘缓存文件路径（memory时忽略）
+        max_entries: 条目数上限
+        ttl: 过期时间（秒，None或0表示不过期）
+        memory_entries: 磁盘缓存前面的内存层大小（默认与max_entries相同，上限1000）
+
+    Returns:
+        memory时为MemoryCache，否则为内存 + 磁盘的TieredCache
+    """
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unsupported cache backend: {backend}. Choose from: {', '.join(CACHE_BACKENDS)}")
+
+    ttl = ttl or None
+    if backend == "memory":
+        return MemoryCache(max_entries, ttl)
+
+    memory = MemoryCache(memory_entries or min(max_entries, 1000), ttl)
+    disk_class = SQLiteCache if backend == "sqlite" else ShelveCache
+    return TieredCache(memory, disk_class(path, max_entries, ttl))
+
+def hit_rate(metrics: Dict) -> float:
+    """按 hits / misses 计数计算命中率"""
+    lookups = metrics.get("hits", 0) + metrics.get("misses", 0)
+    return metrics.get("hits", 0) / lookups if lookups else 0.0
@@ -1,78 +1,520 @@
+import asyncio
 import os
-from typing import Optional
+import sys
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
 import dotenv
 
+try:
+    from macore import DeadlineExceeded, remaining_time
+except ImportError:  # run as a script from utils/: the project root isn't on sys.path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from macore import DeadlineExceeded, remaining_time
+
 dotenv.load_dotenv()
 
-def call_llm(prompt: str, provider: Optional[str] = None) -> str:
+try:
+    from .llm_cache import memoize_llm
+    from .llm_router import get_llm_router, is_router_enabled
+    from .rate_limiter import is_rate_limit_enabled, rate_limited
+    from .token_budget import record_llm_usage
+except ImportError:
+    from llm_cache import memoize_llm
+    from llm_router import get_llm_router, is_router_enabled
+    from rate_limiter import is_rate_limit_enabled, rate_limited
+    from token_budget import record_llm_usage
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Provider -> (api key env var, base url env var, default base url)
+_OPENAI_COMPATIBLE = {
+    "openai": ("OPENAI_API_KEY", "OPENAI_BASE_URL", None),
+    "deepseek": ("DEEPSEEK_API_KEY", "DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1"),
+}
+
+# Client registry: one client per (provider, api key, base url), shared by all threads.
+# Reusing a client keeps its HTTP keep-alive connections and TLS sessions warm.
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.Lock()
+_clients_pid = os.getpid()
+_gemini_configured_key: Optional[str] = None
+
+# Async clients hold connections bound to the event loop that opened them,
+# so they are registered per running loop and dropped with it.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Any]]" = weakref.WeakKeyDictionary()
+
+def _reset_clients_after_fork():
+    """
+    Forget inherited clients in a forked child.
+    
+    Pooled sockets belong to the parent process; the child must open its own.
+    The clients are dropped, not closed, so the parent's connections stay intact.
+    """
+    global _clients, _clients_lock, _clients_pid, _gemini_configured_key, _async_clients
+    _clients = {}
+    _async_clients = weakref.WeakKeyDictionary()
+    _clients_lock = threading.Lock()
+    _clients_pid = os.getpid()
+    _gemini_configured_key = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+def _http_client_options(use_async: bool = False) -> Dict[str, Any]:
+    """Connection-pool limits and timeouts for OpenAI-compatible clients, from env vars."""
+    read_timeout = float(os.getenv("LLM_TIMEOUT", "120"))
+    connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+    options = {"max_retries": int(os.getenv("LLM_MAX_RETRIES", "2"))}
+    
+    if httpx is None:
+        # Without httpx we can't tune the pool; the SDK's default client is still reused
+        options["timeout"] = read_timeout
+        return options
+    
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    options["timeout"] = timeout
+    http_client_class = DefaultAsyncHttpxClient if use_async else DefaultHttpxClient
+    options["http_client"] = http_client_class(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+        ),
+    )
+    return options
+
+def get_llm_client(provider: str):
+    """
+    Get the shared client for an OpenAI-compatible provider, creating it on first use.
+    
+    Clients are keyed by provider, API key and base URL, so changing the
+    environment at runtime yields a new client instead of a stale one.
+    
+    Args:
+        provider: 'openai' or 'deepseek'
+    
+    Returns:
+        An openai.OpenAI instance, safe to share between threads
+    """
+    if os.getpid() != _clients_pid:
+        _reset_clients_after_fork()
+    
+    registry_key = _client_settings(provider)
+    client = _clients.get(registry_key)
+    if client is not None:
+        return client
+    
+    with _clients_lock:
+        client = _clients.get(registry_key)
+        if client is None:
+            from openai import OpenAI
+            _, api_key, base_url = registry_key
+            client = OpenAI(api_key=api_key, base_url=base_url, **_http_client_options())
+            _clients[registry_key] = client
+    return client
+
+def get_async_llm_client(provider: str):
+    """
+    Get the shared AsyncOpenAI client for the running event loop.
+    
+    Must be called from a coroutine. Each event loop gets its own client,
+    reused by every coroutine on that loop.
+    
+    Args:
+        provider: 'openai' or 'deepseek'
+    
+    Returns:
+        An openai.AsyncOpenAI instance
+    """
+    if os.getpid() != _clients_pid:
+        _reset_clients_after_fork()
+    
+    registry_key = _client_settings(provider)
+    loop_clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = loop_clients.get(registry_key)
+    if client is None:
+        # No lock needed: only coroutines on this loop touch loop_clients
+        from openai import AsyncOpenAI
+        _, api_key, base_url = registry_key
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, **_http_client_options(use_async=True))
+        loop_clients[registry_key] = client
+    return client
+
+def _client_settings(provider: str) -> Tuple[str, str, Optional[str]]:
+    """Resolve (provider, api key, base url) for an OpenAI-compatible provider."""
+    key_env, base_url_env, default_base_url = _OPENAI_COMPATIBLE[provider]
+    api_key = os.getenv(key_env)
+    if not api_key:
+        raise ValueError(f"{key_env} not found in environment variables")
+    return provider, api_key, os.getenv(base_url_env) or default_base_url
+
+def _get_gemini_model(model_name: str):
+    """Configure the Gemini SDK once per API key and reuse model instances."""
+    global _gemini_configured_key
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        raise ImportError("Please install google-generativeai: pip install google-generativeai")
+    
+    if os.getpid() != _clients_pid:
+        _reset_clients_after_fork()
+    
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    
+    registry_key = ("gemini", api_key, model_name)
+    model = _clients.get(registry_key)
+    if model is not None:
+        return model
+    
+    with _clients_lock:
+        if _gemini_configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _gemini_configured_key = api_key
+        model = _clients.get(registry_key)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            _clients[registry_key] = model
+    return model
+
+def close_llm_clients():
+    """Close all pooled sync clients (e.g. on shutdown or in tests)."""
+    with _clients_lock:
+        for client in _clients.values():
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
+        _clients.clear()
+
+def _resolve_model(provider: str) -> str:
+    """Model name configured for a provider."""
+    if provider == "openai":
+        return os.getenv("OPENAI_MODEL", "gpt-5-mini")
+    if provider == "gemini":
+        return os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    if provider == "deepseek":
+        return os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+    raise ValueError(f"Unsupported provider: {provider}. Choose from: openai, gemini, deepseek")
+
+def _request_client(client):
+    """
+    Apply per-request options to an OpenAI-compatible client.
+    
+    With rate limiting on, SDK retries are disabled so 429s reach the limiter's AIMD
+    control (which re-queues them) instead of being retried blindly inside the SDK.
+    Inside a flow deadline (macore.deadline) the request timeout is capped at the
+    time left, again with no SDK retries that would run past it.
+    """
+    options = {}
+    if is_rate_limit_enabled():
+        options["max_retries"] = 0
+    remaining = remaining_time()
+    if remaining is not None:
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before the LLM call")
+        options.update(timeout=remaining, max_retries=0)
+    return client.with_options(**options) if options else client
+
+def _gemini_request_options() -> Dict[str, Any]:
+    """Gemini request_options with the time left before the current flow deadline, if any."""
+    remaining = remaining_time()
+    if remaining is None:
+        return {}
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the LLM call")
+    return {"request_options": {"timeout": remaining}}
+
+def _json_mode_options(response_schema: Optional[Dict]) -> Dict[str, Any]:
+    """
+    Extra chat.completions arguments for structured output (OpenAI-compatible providers).
+    
+    JSON mode (response_format json_object) is supported by both OpenAI and DeepSeek;
+    the schema itself is described in the prompt and checked by the caller.
+    """
+    if not response_schema:
+        return {}
+    return {"response_format": {"type": "json_object"}}
+
+def _gemini_schema(schema: Dict) -> Dict:
+    """Convert a JSON schema to the OpenAPI subset Gemini's response_schema accepts."""
+    converted = {}
+    for key, value in schema.items():
+        if key == "type":
+            converted[key] = value.upper()
+        elif key == "properties":
+            converted[key] = {name: _gemini_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            converted[key] = _gemini_schema(value)
+        elif key in ("required", "description", "enum"):
+            converted[key] = value
+    return converted
+
+def _gemini_generation_config(response_schema: Optional[Dict]) -> Optional[Dict]:
+    """Gemini generation_config for structured output (JSON MIME type + response schema)."""
+    if not response_schema:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": _gemini_schema(response_schema)}
+
+@memoize_llm(_resolve_model)
+@rate_limited(_resolve_model)
+def call_llm(prompt: str, provider: Optional[str] = None, *,
+             stream: bool = False, response_schema: Optional[Dict] = None) -> Union[str, Iterator[str]]:
     """
     Call LLM with support for multiple providers.
     
     Args:
         prompt: The prompt to send to the LLM
-        provider: LLM provider to use ('openai', 'gemini', 'deepseek'). 
+        provider: LLM provider to use ('openai', 'gemini', 'deepseek').
                  If None, uses LLM_PROVIDER env var or defaults to 'openai'
+        stream: If True, return an iterator of text deltas as the model generates them
+        response_schema: JSON schema of the expected reply. When given, the provider is asked
+                 for JSON output (JSON mode for OpenAI/DeepSeek, response_schema for Gemini)
+                 and the returned string is the raw JSON text. The prompt should mention JSON.
     
     Returns:
-        The LLM response as a string
+        The LLM response as a string, or an iterator of text chunks when stream=True
+    
+    stream and response_schema are keyword-only, matching the caching and rate-limiting wrappers.
+    
+    Non-streaming results are memoized when LLM_CACHE_ENABLED=true (see utils/llm_cache.py).
+    With LLM_ROUTER_ENABLED=true and no explicit provider, calls are routed across the
+    configured providers with hedging and failover (see utils/llm_router.py).
+    With LLM_RATE_LIMIT_ENABLED=true, calls are queued per provider and model under
+    RPM/TPM and adaptive concurrency limits, and 429s are retried (see utils/rate_limiter.py).
+    Inside a macore.deadline block, the request timeout is capped at the time left.
     """
     # Determine provider
+    if provider is None and is_router_enabled():
+        if not stream:
+            return get_llm_router().call(call_llm, prompt, response_schema=response_schema)
+        # A stream can't be hedged once deltas are forwarded; use the first healthy provider
+        provider = get_llm_router().route()[0]
     if provider is None:
         provider = os.getenv("LLM_PROVIDER", "openai").lower()
     
+    if stream:
+        return _stream_llm(prompt, provider)
+    
+    # Token usage and latency are recorded per call (see utils/token_budget.py)
+    start = time.perf_counter()
+    
     if provider == "openai":
-        from openai import OpenAI
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        
-        client = OpenAI(api_key=api_key)
+        client = _request_client(get_llm_client("openai"))
         model = os.getenv("OPENAI_MODEL", "gpt-5-mini")
         
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **_json_mode_options(response_schema)
         )
-        return response.choices[0].message.content
+        text = response.choices[0].message.content
+        record_llm_usage(provider, model, prompt, text, time.perf_counter() - start, response.usage)
+        return text
     
     elif provider == "gemini":
-        try:
-            import google.generativeai as genai
-        except ImportError:
-            raise ImportError("Please install google-generativeai: pip install google-generativeai")
-        
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
-        response = model.generate_content(prompt)
+        model = _get_gemini_model(os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+        response = model.generate_content(prompt, generation_config=_gemini_generation_config(response_schema),
+                                          **_gemini_request_options())
+        record_llm_usage(provider, _resolve_model(provider), prompt, response.text,
+                         time.perf_counter() - start, getattr(response, "usage_metadata", None))
         return response.text
     
     elif provider == "deepseek":
-        from openai import OpenAI
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        if not api_key:
-            raise ValueError("DEEPSEEK_API_KEY not found in environment variables")
-        
         # DeepSeek uses OpenAI-compatible API
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com/v1"
-        )
+        client = _request_client(get_llm_client("deepseek"))
         model = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
         
         response = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **_json_mode_options(response_schema)
         )
-        return response.choices[0].message.content
+        text = response.choices[0].message.content
+        record_llm_usage(provider, model, prompt, text, time.perf_counter() - start, response.usage)
+        return text
     
     else:
         raise ValueError(f"Unsupported provider: {provider}. Choose from: openai, gemini, deepseek")
 
+def _stream_llm(prompt: str, provider: str) -> Iterator[str]:
+    """Yield response text deltas from the provider's streaming API."""
+    model = _resolve_model(provider)
+    start = time.perf_counter()
+    chunks = []
+    
+    if provider == "gemini":
+        for chunk in _get_gemini_model(model).generate_content(prompt, stream=True, **_gemini_request_options()):
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+        record_llm_usage(provider, model, prompt, "".join(chunks), time.perf_counter() - start)
+        return
+    
+    response = _request_client(get_llm_client(provider)).chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True
+    )
+    try:
+        for chunk in response:
+            # The final chunk may carry only usage data and no choices
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        response.close()
+    # Usage isn't requested on streams (not every compatible endpoint supports it), so count the text
+    record_llm_usage(provider, model, prompt, "".join(chunks), time.perf_counter() - start)
+
+@memoize_llm(_resolve_model)
+@rate_limited(_resolve_model)
+async def call_llm_async(prompt: str, provider: Optional[str] = None, *,
+                         response_schema: Optional[Dict] = None) -> str:
+    """
+    Async version of call_llm using the providers' async clients.
+    
+    Awaiting this does not block the event loop, so one loop can keep many
+    LLM requests in flight at once.
+    
+    Args:
+        prompt: The prompt to send to the LLM
+        provider: LLM provider to use ('openai', 'gemini', 'deepseek').
+                 If None, uses LLM_PROVIDER env var or defaults to 'openai'
+        response_schema: JSON schema of the expected reply (see call_llm)
+    
+    Returns:
+        The LLM response as a string
+    """
+    if provider is None and is_router_enabled():
+        return await get_llm_router().call_async(call_llm_async, prompt, response_schema=response_schema)
+    if provider is None:
+        provider = os.getenv("LLM_PROVIDER", "openai").lower()
+    model = _resolve_model(provider)
+    start = time.perf_counter()
+    
+    if provider == "gemini":
+        response = await _get_gemini_model(model).generate_content_async(
+            prompt, generation_config=_gemini_generation_config(response_schema), **_gemini_request_options()
+        )
+        record_llm_usage(provider, model, prompt, response.text,
+                         time.perf_counter() - start, getattr(response, "usage_metadata", None))
+        return response.text
+    
+    client = _request_client(get_async_llm_client(provider))
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        **_json_mode_options(response_schema)
+    )
+    text = response.choices[0].message.content
+    record_llm_usage(provider, model, prompt, text, time.perf_counter() - start, response.usage)
+    return text
+
+def start_stub_llm_server(reply: Optional[Callable[[str], Tuple[str, float]]] = None):
+    """
+    Start a local OpenAI-compatible chat completions stub with HTTP/1.1 keep-alive.
+    
+    Used by the benchmarks. Point OPENAI_BASE_URL at http://127.0.0.1:<port>/v1.
+    
+    Args:
+        reply: prompt -> (response text, simulated latency in seconds); defaults to ("ok", 0)
+    
+    Returns:
+        The running server; call shutdown() when done
+    """
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = (request.get("messages") or [{}])[-1].get("content", "")
+            text, delay = reply(prompt) if reply else ("ok", 0.0)
+            if delay:
+                time.sleep(delay)
+            body = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark_client_reuse(num_calls: int = 200) -> Dict[str, float]:
+    """
+    Compare a new client per call against the pooled client, using a local stub server.
+    
+    The stub is plain HTTP, so the saving shown is TCP connection setup plus client
+    construction; against a real HTTPS endpoint the TLS handshake adds more per call.
+    
+    Returns:
+        Average milliseconds per call for each strategy
+    """
+    from openai import OpenAI
+    
+    server = start_stub_llm_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    saved_env = {k: os.environ.get(k) for k in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    messages = [{"role": "user", "content": "ping"}]
+    
+    try:
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            client = OpenAI(api_key="stub-key", base_url=base_url)
+            client.chat.completions.create(model="stub", messages=messages)
+            client.close()
+        per_call_client = (time.perf_counter() - start) / num_calls * 1000
+        
+        get_llm_client("openai")  # warm up the pool
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            call_llm("ping", provider="openai")
+        pooled = (time.perf_counter() - start) / num_calls * 1000
+    finally:
+        close_llm_clients()
+        server.shutdown()
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    
+    return {"new_client_ms": per_call_client, "pooled_client_ms": pooled,
+            "saved_ms": per_call_client - pooled}
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # Client reuse benchmark: python utils/call_llm.py bench [calls]
+        result = benchmark_client_reuse(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+        print(f"New client per call: {result['new_client_ms']:.2f} ms/call")
+        print(f"Pooled client:       {result['pooled_client_ms']:.2f} ms/call")
+        print(f"Saved per call:      {result['saved_ms']:.2f} ms")
+        sys.exit(0)
+    
     # Test with different providers
     test_prompt = "Hello, how are you? Please respond in one sentence."
     
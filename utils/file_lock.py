@@ -0,0 +1,106 @@
+# utils/file_lock.py
+"""
+跨进程文件锁工具函数
+在多线程、多worker部署下串行化对同一存储文件的写操作
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    基于锁文件的互斥锁，同时对线程和进程生效
+
+    同一线程内可以重入：只有最外层获取时才会真正加文件锁，
+    因此在持有锁的函数里调用其它同样加锁的函数不会死锁。
+    """
+
+    def __init__(self, lock_file: str):
+        self.lock_file = lock_file
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                directory = os.path.dirname(self.lock_file)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                fd = open(self.lock_file, 'a+')
+                if fcntl is not None:
+                    fcntl.flock(fd.fileno(), fcntl.LOCK_EX)
+                else:
+                    fd.seek(0)
+                    msvcrt.locking(fd.fileno(), msvcrt.LK_LOCK, 1)
+                self._fd = fd
+            except Exception:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd.fileno(), fcntl.LOCK_UN)
+                else:
+                    fd.seek(0)
+                    msvcrt.locking(fd.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                fd.close()
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def get_file_lock(lock_file: str) -> FileLock:
+    """获取指定锁文件对应的进程内共享锁对象"""
+    path = os.path.abspath(lock_file)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+@contextmanager
+def locked(lock_file: str):
+    """以上下文管理器形式持有文件锁"""
+    with get_file_lock(lock_file):
+        yield
+
+def atomic_write(path: str, write_func):
+    """
+    原子写文件：先写入同目录下的临时文件并fsync，再用os.replace替换目标文件
+
+    Args:
+        path: 目标文件路径
+        write_func: 接收已打开的文本文件对象并写入内容的函数
+    """
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            write_func(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
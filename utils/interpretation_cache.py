@@ -0,0 +1,147 @@
+# utils/interpretation_cache.py
+"""
+单牌解读缓存
+按规范化后的 (牌名, 正逆位, 牌阵, 位置, 问题类型, 问题分桶) 缓存LLM生成的解读，
+常见的抽牌结果不必每次都调用LLM
+
+问题分桶由 INTERPRETATION_CACHE_QUESTION_KEY 决定：category（默认）只按问题类型区分，
+同类问题抽到相同的牌时共享解读，命中率最高；simhash 按问题相似度分桶（SimHash前若干位），
+只在措辞相近的问题之间共享；exact 按规范化问题的哈希区分，只有完全相同的问题才共享
+（与 call_llm 的精确prompt缓存相近）。默认关闭（INTERPRETATION_CACHE_ENABLED=true 开启）。
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+try:
+    from .cache_backends import create_cache, hit_rate
+except ImportError:
+    from cache_backends import create_cache, hit_rate
+
+# 缓存键的版本，prompt格式变化时递增，使旧条目自动失效
+KEY_VERSION = "2"
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+_metrics = {"hits": 0, "misses": 0, "stores": 0}
+_metrics_lock = threading.Lock()
+
+def is_interpretation_cache_enabled() -> bool:
+    """是否启用单牌解读缓存（环境变量 INTERPRETATION_CACHE_ENABLED，默认关闭）"""
+    return os.getenv("INTERPRETATION_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+
+def _get_cache():
+    """获取缓存实例（按进程创建，配置来自环境变量）"""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = create_cache(
+                    os.getenv("INTERPRETATION_CACHE_BACKEND", "sqlite").lower(),
+                    path=os.getenv("INTERPRETATION_CACHE_PATH", os.path.join("data", "interpretation_cache.db")),
+                    max_entries=int(os.getenv("INTERPRETATION_CACHE_MAX_ENTRIES", "50000")),
+                    ttl=float(os.getenv("INTERPRETATION_CACHE_TTL", str(30 * 24 * 3600))),
+                    memory_entries=int(os.getenv("INTERPRETATION_CACHE_MEMORY_ENTRIES", "1000"))
+                )
+                _cache_pid = os.getpid()
+    return _cache
+
+# 缓存键中问题部分的取法
+QUESTION_KEY_MODES = ("category", "simhash", "exact")
+
+def get_question_key_mode() -> str:
+    """缓存键中问题部分的取法（环境变量 INTERPRETATION_CACHE_QUESTION_KEY，默认category）"""
+    mode = os.getenv("INTERPRETATION_CACHE_QUESTION_KEY", "category").lower()
+    return mode if mode in QUESTION_KEY_MODES else "category"
+
+def _normalize_question(question: str) -> str:
+    return "".join((question or "").lower().split())
+
+def question_hash(question: str) -> str:
+    """规范化问题（忽略大小写和空白）的哈希"""
+    return hashlib.sha256(_normalize_question(question).encode("utf-8")).hexdigest()[:16]
+
+def question_bucket(question: str, bits: int) -> str:
+    """
+    问题相似度分桶：字符二元组的64位SimHash取前 bits 位
+
+    措辞相近的问题SimHash的汉明距离小，前几位大概率相同，会落入同一个桶。
+    """
+    if bits <= 0:
+        return ""
+    text = _normalize_question(question)
+    grams = [text[i:i + 2] for i in range(max(1, len(text) - 1))]
+    weights = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.md5(gram.encode("utf-8")).digest()[:8], "big")
+        for i in range(64):
+            weights[i] += 1 if h >> (63 - i) & 1 else -1
+    fingerprint = "".join("1" if w > 0 else "0" for w in weights)
+    return fingerprint[:min(bits, 64)]
+
+def interpretation_key(card_name: str, reversed: bool, spread_type: str, position: int,
+                       question_category: str, question: Optional[str] = None) -> str:
+    """
+    构建规范化的缓存键
+
+    默认只按问题类型区分；simhash 模式按问题相似度分桶（INTERPRETATION_CACHE_QUESTION_BITS 位，
+    位数越少共享的范围越大），exact 模式按问题哈希区分。
+    """
+    mode = get_question_key_mode()
+    if mode == "exact":
+        bucket = "q" + question_hash(question)
+    elif mode == "simhash":
+        bucket = "s" + question_bucket(question or "", int(os.getenv("INTERPRETATION_CACHE_QUESTION_BITS", "8")))
+    else:
+        bucket = "c"
+    parts = (
+        KEY_VERSION,
+        card_name.strip(),
+        "reversed" if reversed else "upright",
+        (spread_type or "single").strip().lower(),
+        str(position),
+        (question_category or "general").strip().lower(),
+        bucket
+    )
+    return "|".join(parts)
+
+def get_interpretation(key: str) -> Optional[str]:
+    """查询缓存的解读，未命中返回None"""
+    try:
+        value = _get_cache().get(key)
+    except Exception as e:
+        print(f"读取解读缓存失败: {str(e)}")
+        value = None
+    with _metrics_lock:
+        _metrics["hits" if value is not None else "misses"] += 1
+    return value
+
+def store_interpretation(key: str, reading: str):
+    """写入解读（缓存写入失败不影响占卜流程）"""
+    if not reading:
+        return
+    try:
+        _get_cache().set(key, reading)
+        with _metrics_lock:
+            _metrics["stores"] += 1
+    except Exception as e:
+        print(f"写入解读缓存失败: {str(e)}")
+
+def clear_interpretation_cache():
+    """清空缓存（内存层和磁盘层）"""
+    _get_cache().clear()
+
+def get_interpretation_cache_metrics() -> Dict:
+    """命中、未命中、写入次数和命中率，以及两级缓存各自的命中次数"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["hit_rate"] = hit_rate(metrics)
+    metrics["enabled"] = is_interpretation_cache_enabled()
+    tier_hits = getattr(_cache, "tier_hits", None)
+    if tier_hits is not None:
+        metrics["memory_hits"] = tier_hits["memory"]
+        metrics["disk_hits"] = tier_hits["disk"]
+    return metrics
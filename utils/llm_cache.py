@@ -0,0 +1,180 @@
+# utils/llm_cache.py
+"""
+LLM调用结果缓存
+相同的 provider + model + prompt 直接返回上次的结果，不再调用LLM。
+默认关闭，通过 LLM_CACHE_ENABLED=true 开启；
+后端可选内存LRU、SQLite或shelve，支持条目数上限和TTL
+
+单次请求可以跳过缓存：API请求头 X-LLM-Cache: bypass，
+或在代码中使用 with bypass_llm_cache(): ...
+
+开启提供商路由时只在路由器外层缓存一次（键中记录参与路由的提供商和模型），
+路由器向各提供商发出的调用不再重复缓存和计数。
+"""
+
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    from .cache_backends import create_cache, hit_rate
+    from .llm_router import configured_providers, is_routed_call, is_router_enabled
+except ImportError:
+    from cache_backends import create_cache, hit_rate
+    from llm_router import configured_providers, is_routed_call, is_router_enabled
+
+# API请求头：值为 bypass 时本次请求不读写缓存
+BYPASS_HEADER = "X-LLM-Cache"
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+_metrics = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "bytes_saved": 0}
+_metrics_lock = threading.Lock()
+
+def is_llm_cache_enabled() -> bool:
+    """是否启用LLM调用缓存（环境变量 LLM_CACHE_ENABLED，默认关闭）"""
+    return os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+
+def set_llm_cache_bypass(bypass: bool):
+    """设置当前上下文（请求）是否跳过缓存"""
+    _bypass.set(bool(bypass))
+
+def is_bypass_requested(header_value: Optional[str]) -> bool:
+    """根据 X-LLM-Cache 请求头判断是否跳过缓存"""
+    return (header_value or "").strip().lower() == "bypass"
+
+@contextmanager
+def bypass_llm_cache(bypass: bool = True):
+    """在with块内跳过缓存"""
+    token = _bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+def _get_cache():
+    """获取缓存实例（按进程创建，配置来自环境变量）"""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = create_cache(
+                    os.getenv("LLM_CACHE_BACKEND", "memory").lower(),
+                    path=os.getenv("LLM_CACHE_PATH", os.path.join("data", "llm_cache.db")),
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000")),
+                    ttl=float(os.getenv("LLM_CACHE_TTL", "86400"))
+                )
+                _cache_pid = os.getpid()
+    return _cache
+
+def llm_cache_key(provider: str, model: str, prompt: str) -> str:
+    """provider、model和prompt的SHA-256摘要"""
+    digest = hashlib.sha256(f"{provider}\0{model}\0{prompt}".encode("utf-8")).hexdigest()
+    return f"{provider}:{model}:{digest}"
+
+def _count(name: str, amount: int = 1):
+    with _metrics_lock:
+        _metrics[name] += amount
+
+def _lookup(key: str) -> Optional[str]:
+    try:
+        value = _get_cache().get(key)
+    except Exception as e:
+        print(f"读取LLM缓存失败: {str(e)}")
+        value = None
+    if value is None:
+        _count("misses")
+    else:
+        _count("hits")
+        _count("bytes_saved", len(value.encode("utf-8")))
+    return value
+
+def _store(key: str, value):
+    if not isinstance(value, str) or not value:
+        return
+    try:
+        _get_cache().set(key, value)
+        _count("stores")
+    except Exception as e:
+        print(f"写入LLM缓存失败: {str(e)}")
+
+def memoize_llm(resolve_model: Callable[[str], str]):
+    """
+    LLM调用函数的缓存装饰器
+
+    被装饰的函数签名为 (prompt, provider=None, *, stream=False, response_schema=None, ...)，
+    provider之后的参数只能按关键字传入（与包装函数的签名一致）；同步函数和协程函数都支持。流式调用、缓存未开启或当前上下文要求跳过时直接调用原函数；
+    要求JSON输出的调用把response_schema也计入缓存键。由路由器分发的调用在外层
+    以 "router" 和所有参与路由的提供商/模型为键缓存，路由器内部的调用直接执行。
+
+    Args:
+        resolve_model: provider -> 当前配置的模型名，用于构建缓存键
+    """
+    def decorator(func):
+        def cache_key(prompt, provider, kwargs):
+            if kwargs.get("response_schema"):
+                prompt = f"{prompt}\0{json.dumps(kwargs['response_schema'], sort_keys=True)}"
+            if provider is None and is_router_enabled():
+                # 结果可能来自任何一个参与路由的提供商
+                models = ",".join(f"{p}/{resolve_model(p)}" for p in configured_providers())
+                return llm_cache_key("router", models, prompt)
+            provider = provider or os.getenv("LLM_PROVIDER", "openai").lower()
+            return llm_cache_key(provider, resolve_model(provider), prompt)
+
+        def should_skip(kwargs) -> bool:
+            if not is_llm_cache_enabled() or kwargs.get("stream") or is_routed_call():
+                return True
+            if _bypass.get():
+                _count("bypassed")
+                return True
+            return False
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(prompt, provider=None, **kwargs):
+                if should_skip(kwargs):
+                    return await func(prompt, provider, **kwargs)
+                key = cache_key(prompt, provider, kwargs)
+                cached = _lookup(key)
+                if cached is not None:
+                    return cached
+                result = await func(prompt, provider, **kwargs)
+                _store(key, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(prompt, provider=None, **kwargs):
+            if should_skip(kwargs):
+                return func(prompt, provider, **kwargs)
+            key = cache_key(prompt, provider, kwargs)
+            cached = _lookup(key)
+            if cached is not None:
+                return cached
+            result = func(prompt, provider, **kwargs)
+            _store(key, result)
+            return result
+        return wrapper
+
+    return decorator
+
+def clear_llm_cache():
+    """清空缓存"""
+    _get_cache().clear()
+
+def get_llm_cache_metrics() -> Dict:
+    """命中、未命中、跳过、写入次数，命中率和命中节省的响应字节数"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["hit_rate"] = hit_rate(metrics)
+    metrics["enabled"] = is_llm_cache_enabled()
+    return metrics
@@ -0,0 +1,343 @@
+# utils/llm_router.py
+"""
+LLM提供商路由：对冲请求与故障转移
+在多个已配置的提供商（openai / deepseek / gemini）之间分配LLM调用：
+
+- 对冲：首选提供商在其历史延迟的分位数（默认P95）内没有返回时，
+  向下一个提供商再发一个相同的请求，采用先返回的结果，取消另一个
+- 故障转移：请求出错时立即改用下一个提供商
+- 按提供商记录延迟直方图和最近若干次调用的错误率；错误率超出预算的提供商排到最后
+
+默认关闭，通过 LLM_ROUTER_ENABLED=true 开启（至少需要配置两个提供商的API key才会对冲）。
+"""
+
+import asyncio
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+# 所有支持的提供商及其API key环境变量
+PROVIDER_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "deepseek": "DEEPSEEK_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+}
+
+# 延迟直方图的桶上界（秒），最后一个桶收集更慢的调用
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+
+# 路由器向具体提供商发出的调用期间为True
+_routed = contextvars.ContextVar("llm_routed_call", default=False)
+
+def is_routed_call() -> bool:
+    """当前是否处在路由器发出的调用中（调用结果由路由器外层统一缓存，内层不再缓存）"""
+    return _routed.get()
+
+def is_router_enabled() -> bool:
+    """是否启用提供商路由（环境变量 LLM_ROUTER_ENABLED，默认关闭）"""
+    return os.getenv("LLM_ROUTER_ENABLED", "false").lower() in ("true", "1", "yes")
+
+def configured_providers() -> List[str]:
+    """
+    参与路由的提供商，按优先级排序
+
+    LLM_ROUTER_PROVIDERS 显式指定（逗号分隔）；否则 LLM_PROVIDER 排第一，
+    其余设置了API key的提供商依次排在后面。
+    """
+    explicit = os.getenv("LLM_ROUTER_PROVIDERS", "")
+    if explicit.strip():
+        providers = [p.strip().lower() for p in explicit.split(",") if p.strip()]
+        return [p for p in providers if p in PROVIDER_KEYS]
+
+    primary = os.getenv("LLM_PROVIDER", "openai").lower()
+    others = [p for p, key_env in PROVIDER_KEYS.items() if p != primary and os.getenv(key_env)]
+    return [primary] + others
+
+class ProviderStats:
+    """单个提供商的延迟直方图和最近调用的成败记录"""
+
+    def __init__(self, window: int = 100):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.recent = deque(maxlen=window)  # True表示成功
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool):
+        with self._lock:
+            self.requests += 1
+            self.recent.append(success)
+            if success:
+                self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            else:
+                self.errors += 1
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """按直方图估算延迟分位数（桶内线性插值），没有成功记录时返回None"""
+        with self._lock:
+            counts = list(self.bucket_counts)
+        total = sum(counts)
+        if not total:
+            return None
+
+        target = total * percentile / 100
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= target:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+
+    def error_rate(self) -> float:
+        """最近窗口内的错误率"""
+        with self._lock:
+            recent = list(self.recent)
+        return recent.count(False) / len(recent) if recent else 0.0
+
+    def samples(self) -> int:
+        return len(self.recent)
+
+    def latency_samples(self) -> int:
+        return sum(self.bucket_counts)
+
+class LLMRouter:
+    """
+    在多个提供商之间路由LLM调用
+
+    被路由的函数签名为 func(prompt, provider, **kwargs)。同步调用在线程池中执行，
+    对冲中落败的请求无法中断，只是丢弃其结果（它的延迟仍会计入直方图）；
+    异步调用中落败的任务会被取消。
+    """
+
+    def __init__(self):
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_initial_delay = float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "10"))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self.error_budget = float(os.getenv("LLM_ERROR_BUDGET", "0.1"))
+        self.error_budget_min_samples = int(os.getenv("LLM_ERROR_BUDGET_MIN_SAMPLES", "10"))
+        self.window = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+        self.stats: Dict[str, ProviderStats] = {}
+        self.counters = {"calls": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _stats(self, provider: str) -> ProviderStats:
+        with self._lock:
+            stats = self.stats.get(provider)
+            if stats is None:
+                stats = self.stats[provider] = ProviderStats(self.window)
+            return stats
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def is_budget_exhausted(self, provider: str) -> bool:
+        """最近窗口的错误率是否超出错误预算（样本太少时不判断）"""
+        stats = self._stats(provider)
+        return stats.samples() >= self.error_budget_min_samples and stats.error_rate() > self.error_budget
+
+    def route(self) -> List[str]:
+        """本次调用尝试提供商的顺序：错误预算未耗尽的在前，各组内保持配置的优先级"""
+        providers = configured_providers()
+        if not providers:
+            raise ValueError(
+                f"No LLM providers to route to: LLM_ROUTER_PROVIDERS={os.getenv('LLM_ROUTER_PROVIDERS', '')!r}. "
+                f"Choose from: {', '.join(PROVIDER_KEYS)}"
+            )
+        healthy = [p for p in providers if not self.is_budget_exhausted(p)]
+        return healthy + [p for p in providers if p not in healthy]
+
+    def hedge_delay(self, provider: str) -> float:
+        """首选提供商多久没有返回就发出对冲请求：其延迟的分位数，样本不足时用初始值"""
+        stats = self._stats(provider)
+        if stats.latency_samples() < self.hedge_min_samples:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, stats.latency_percentile(self.hedge_percentile))
+
+    def _timed_call(self, func: Callable, provider: str, prompt: str, kwargs: Dict):
+        start = time.perf_counter()
+        token = _routed.set(True)
+        try:
+            result = func(prompt, provider, **kwargs)
+        except Exception:
+            self._stats(provider).record(time.perf_counter() - start, False)
+            raise
+        finally:
+            _routed.reset(token)
+        self._stats(provider).record(time.perf_counter() - start, True)
+        return result
+
+    async def _timed_call_async(self, func: Callable, provider: str, prompt: str, kwargs: Dict):
+        start = time.perf_counter()
+        token = _routed.set(True)
+        try:
+            result = await func(prompt, provider, **kwargs)
+        except asyncio.CancelledError:
+            raise  # 对冲落败被取消，不计入统计
+        except Exception:
+            self._stats(provider).record(time.perf_counter() - start, False)
+            raise
+        finally:
+            _routed.reset(token)
+        self._stats(provider).record(time.perf_counter() - start, True)
+        return result
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(os.getenv("LLM_ROUTER_WORKERS", "32")),
+                        thread_name_prefix="llm-router"
+                    )
+        return self._executor
+
+    def call(self, func: Callable, prompt: str, **kwargs):
+        """同步路由调用：返回最先成功的结果，所有提供商都失败时抛出最后一个异常"""
+        self._count("calls")
+        remaining = self.route()
+        if len(remaining) == 1:
+            return self._timed_call(func, remaining[0], prompt, kwargs)
+
+        executor = self._get_executor()
+        futures = {}
+
+        def launch():
+            provider = remaining.pop(0)
+            # 在调用方的上下文中执行（保留请求级设置，例如是否跳过LLM缓存）
+            context = contextvars.copy_context()
+            futures[executor.submit(context.run, self._timed_call, func, provider, prompt, kwargs)] = provider
+            return provider
+
+        current = launch()
+        hedged = False
+        last_error = None
+        while futures:
+            timeout = None if hedged or not remaining else self.hedge_delay(current)
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 首选提供商超过对冲阈值还没有返回
+                hedged = True
+                self._count("hedges")
+                launch()
+                continue
+
+            for future in done:
+                provider = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"LLM调用失败（{provider}）: {str(e)}")
+                    last_error = e
+                    continue
+                for loser in futures:
+                    loser.cancel()
+                self._record_win(provider, current, hedged)
+                return result
+
+            if not futures and remaining:
+                self._count("failovers")
+                current = launch()
+        raise last_error
+
+    async def call_async(self, func: Callable, prompt: str, **kwargs):
+        """异步路由调用：与 call 相同，落败的请求会被取消"""
+        self._count("calls")
+        remaining = self.route()
+        if len(remaining) == 1:
+            return await self._timed_call_async(func, remaining[0], prompt, kwargs)
+
+        tasks = {}
+
+        def launch():
+            provider = remaining.pop(0)
+            tasks[asyncio.ensure_future(self._timed_call_async(func, provider, prompt, kwargs))] = provider
+            return provider
+
+        current = launch()
+        hedged = False
+        last_error = None
+        try:
+            while tasks:
+                timeout = None if hedged or not remaining else self.hedge_delay(current)
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._count("hedges")
+                    launch()
+                    continue
+
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is not None:
+                        print(f"LLM调用失败（{provider}）: {str(task.exception())}")
+                        last_error = task.exception()
+                        continue
+                    self._record_win(provider, current, hedged)
+                    return task.result()
+
+                if not tasks and remaining:
+                    self._count("failovers")
+                    current = launch()
+            raise last_error
+        finally:
+            for loser in tasks:
+                loser.cancel()
+
+    def _record_win(self, provider: str, primary: str, hedged: bool):
+        self._stats(provider).wins += 1
+        if hedged and provider != primary:
+            self._count("hedge_wins")
+
+    def get_metrics(self) -> Dict:
+        """路由计数，以及每个提供商的请求数、错误率、延迟分位数和直方图"""
+        with self._lock:
+            metrics = dict(self.counters)
+            stats_items = list(self.stats.items())
+
+        providers = {}
+        for provider, stats in stats_items:
+            p50, p95 = stats.latency_percentile(50), stats.latency_percentile(95)
+            providers[provider] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "wins": stats.wins,
+                "error_rate": stats.error_rate(),
+                "budget_exhausted": self.is_budget_exhausted(provider),
+                "p50_seconds": round(p50, 3) if p50 is not None else None,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "hedge_delay_seconds": round(self.hedge_delay(provider), 3),
+                "latency_histogram": {
+                    f"le_{bound}": count
+                    for bound, count in zip(LATENCY_BUCKETS + ("inf",), stats.bucket_counts)
+                }
+            }
+        metrics["providers"] = providers
+        metrics["enabled"] = is_router_enabled()
+        return metrics
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_llm_router() -> LLMRouter:
+    """获取进程内共享的路由器（配置来自环境变量）"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter()
+    return _router
+
+def get_llm_router_metrics() -> Dict:
+    """路由器的运行指标"""
+    return get_llm_router().get_metrics()
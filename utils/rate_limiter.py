@@ -0,0 +1,395 @@
+# utils/rate_limiter.py
+"""
+LLM调用的客户端限流
+按 (提供商, 模型) 分别限流：
+
+- 令牌桶：每分钟请求数（RPM）和每分钟token数（TPM），超出时排队等待
+- AIMD自适应并发上限：调用成功时并发上限缓慢增加，遇到429时减半并按Retry-After暂停，
+  让吞吐量稳定在提供商允许的上限附近，而不是在大量429之间来回震荡
+- 排队有截止时间：超过 LLM_RATE_LIMIT_QUEUE_TIMEOUT 仍未轮到时抛出 RateLimitTimeout
+- 开启限流时OpenAI兼容客户端不再自动重试（max_retries=0），429直接交给AIMD处理
+
+默认关闭，通过 LLM_RATE_LIMIT_ENABLED=true 开启。
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from macore import remaining_time
+except ImportError:  # run as a script from utils/: the project root isn't on sys.path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from macore import remaining_time
+
+try:
+    from .llm_router import is_router_enabled
+    from .token_budget import count_tokens
+except ImportError:
+    from llm_router import is_router_enabled
+    from token_budget import count_tokens
+
+class RateLimitTimeout(TimeoutError):
+    """排队等待超过截止时间"""
+
+def is_rate_limit_enabled() -> bool:
+    """是否启用限流（环境变量 LLM_RATE_LIMIT_ENABLED，默认关闭）"""
+    return os.getenv("LLM_RATE_LIMIT_ENABLED", "false").lower() in ("true", "1", "yes")
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """是否为提供商返回的限流错误（HTTP 429 / ResourceExhausted）"""
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return True
+    return type(exc).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """从限流错误的响应头读取Retry-After（秒）"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _limit_setting(name: str, provider: str, default: str) -> float:
+    """读取限流配置：优先 <PROVIDER>_<NAME>（如 OPENAI_RPM），否则 LLM_RATE_LIMIT_<NAME>"""
+    value = os.getenv(f"{provider.upper()}_{name}")
+    if value is None:
+        value = os.getenv(f"LLM_RATE_LIMIT_{name}", default)
+    return float(value)
+
+class TokenBucket:
+    """每分钟 per_minute 个令牌的令牌桶，容量为 burst_seconds 秒的配额"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """还需要等待多少秒才有 amount 个令牌（单次请求超过桶容量时按容量计）"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class ProviderLimiter:
+    """
+    单个 (提供商, 模型) 的限流器：RPM/TPM令牌桶 + AIMD并发上限
+
+    rpm、tpm 为0表示不限制该项。
+    """
+
+    def __init__(self, rpm: float, tpm: float, initial_concurrency: float = 8,
+                 min_concurrency: float = 1, max_concurrency: float = 64,
+                 burst_seconds: float = 10, decrease_factor: float = 0.5,
+                 cooldown: float = 2.0, default_backoff: float = 1.0):
+        self.rpm = TokenBucket(rpm, burst_seconds) if rpm else None
+        self.tpm = TokenBucket(tpm, burst_seconds) if tpm else None
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.default_backoff = default_backoff
+        self.in_flight = 0
+        self.queued = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.metrics = {"requests": 0, "throttled": 0, "timeouts": 0, "queue_wait_seconds": 0.0}
+        self._cond = threading.Condition()
+
+    def _try_acquire(self, tokens: float) -> Optional[float]:
+        """
+        尝试占用一个并发名额和令牌（调用方持有锁）
+
+        Returns:
+            0表示成功；正数为需要等待的秒数；None表示要等其他请求释放并发名额
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return None
+        wait = max(
+            self.rpm.wait_time(1, now) if self.rpm else 0.0,
+            self.tpm.wait_time(tokens, now) if self.tpm else 0.0
+        )
+        if wait > 0:
+            return wait
+        if self.rpm:
+            self.rpm.take(1)
+        if self.tpm:
+            self.tpm.take(tokens)
+        self.in_flight += 1
+        return 0.0
+
+    def _granted(self, waited: float):
+        self.metrics["requests"] += 1
+        self.metrics["queue_wait_seconds"] += waited
+
+    def _timed_out(self):
+        self.metrics["timeouts"] += 1
+        raise RateLimitTimeout("LLM请求排队超时")
+
+    def acquire(self, tokens: float, deadline: float):
+        """阻塞直到可以发出请求；超过截止时间（time.monotonic）抛出RateLimitTimeout"""
+        start = time.monotonic()
+        with self._cond:
+            self.queued += 1
+            try:
+                while True:
+                    wait = self._try_acquire(tokens)
+                    if wait == 0:
+                        self._granted(time.monotonic() - start)
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timed_out()
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                self.queued -= 1
+
+    async def acquire_async(self, tokens: float, deadline: float):
+        """acquire 的异步版本，等待期间不阻塞事件循环（等待中被取消时同样退出队列）"""
+        start = time.monotonic()
+        with self._cond:
+            self.queued += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(tokens)
+                    if wait == 0:
+                        self._granted(time.monotonic() - start)
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timed_out()
+                # 等并发名额时没有确定的等待时间，短暂休眠后重试
+                await asyncio.sleep(min(remaining, 0.02 if wait is None else wait))
+        finally:
+            with self._cond:
+                self.queued -= 1
+
+    def release(self, outcome: str, retry_after: Optional[float] = None):
+        """
+        请求结束，释放并发名额并调整并发上限
+
+        Args:
+            outcome: ok（加性增加）、throttled（乘性减少并暂停）或 error（不调整）
+            retry_after: 限流时提供商要求的等待秒数
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "ok":
+                # 每个“满并发周期”大约增加1
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome == "throttled":
+                self.metrics["throttled"] += 1
+                # 同一批并发请求的多个429只减少一次
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self.last_decrease = now
+                self.paused_until = max(self.paused_until, now + (retry_after or self.default_backoff))
+            self._cond.notify_all()
+
+    def get_metrics(self) -> Dict:
+        with self._cond:
+            metrics = dict(self.metrics)
+            metrics.update({
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "rpm_available": round(self.rpm.tokens, 1) if self.rpm else None,
+                "tpm_available": round(self.tpm.tokens, 1) if self.tpm else None
+            })
+        return metrics
+
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider: str, model: str) -> ProviderLimiter:
+    """获取 (提供商, 模型) 的限流器，首次使用时按环境变量创建"""
+    key = (provider, model)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = ProviderLimiter(
+                    rpm=_limit_setting("RPM", provider, "0"),
+                    tpm=_limit_setting("TPM", provider, "0"),
+                    initial_concurrency=_limit_setting("CONCURRENCY", provider, "8"),
+                    min_concurrency=float(os.getenv("LLM_RATE_LIMIT_MIN_CONCURRENCY", "1")),
+                    max_concurrency=_limit_setting("MAX_CONCURRENCY", provider, "64"),
+                    burst_seconds=float(os.getenv("LLM_RATE_LIMIT_BURST_SECONDS", "10")),
+                    cooldown=float(os.getenv("LLM_RATE_LIMIT_COOLDOWN", "2")),
+                    default_backoff=float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "1"))
+                )
+                _limiters[key] = limiter
+    return limiter
+
+def rate_limited(resolve_model: Callable[[str], str]):
+    """
+    LLM调用函数的限流装饰器
+
+    被装饰的函数签名为 (prompt, provider=None, *, stream=False, ...)，同步函数和协程函数都支持。
+    遇到429时降低并发上限并重新排队重试（最多 LLM_RATE_LIMIT_RETRIES 次，都在同一个截止时间内）。
+    未开启限流，或未指定提供商而由路由器分发时（路由器会带上具体的提供商再次调用），直接调用原函数。
+
+    Args:
+        resolve_model: provider -> 当前配置的模型名
+    """
+    def decorator(func):
+        def limiter_for(prompt, provider):
+            if not is_rate_limit_enabled() or (provider is None and is_router_enabled()):
+                return None, 0
+            provider = provider or os.getenv("LLM_PROVIDER", "openai").lower()
+            tokens = count_tokens(prompt, resolve_model(provider)) + int(os.getenv("LLM_RATE_LIMIT_OUTPUT_TOKENS", "600"))
+            return get_limiter(provider, resolve_model(provider)), tokens
+
+        def settings():
+            # 不排队到流程截止时间之后（macore.deadline）
+            wait = float(os.getenv("LLM_RATE_LIMIT_QUEUE_TIMEOUT", "30"))
+            remaining = remaining_time()
+            deadline = time.monotonic() + (wait if remaining is None else min(wait, remaining))
+            return deadline, int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(prompt, provider=None, **kwargs):
+                limiter, tokens = limiter_for(prompt, provider)
+                if limiter is None:
+                    return await func(prompt, provider, **kwargs)
+                deadline, retries = settings()
+                for attempt in range(retries + 1):
+                    await limiter.acquire_async(tokens, deadline)
+                    # 无论以何种方式结束（包括被取消）都释放并发名额
+                    outcome, retry_after = "error", None
+                    try:
+                        result = await func(prompt, provider, **kwargs)
+                        outcome = "ok"
+                        return result
+                    except Exception as e:
+                        if is_rate_limit_error(e):
+                            outcome, retry_after = "throttled", _retry_after(e)
+                            if attempt < retries:
+                                continue
+                        raise
+                    finally:
+                        limiter.release(outcome, retry_after)
+            return async_wrapper
+
+        def limited_stream(limiter, tokens, deadline, prompt, provider, kwargs):
+            # 流式调用在开始迭代时才排队，整个流式输出期间占用并发名额
+            limiter.acquire(tokens, deadline)
+            outcome, retry_after = "error", None
+            try:
+                yield from func(prompt, provider, **kwargs)
+                outcome = "ok"
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    outcome, retry_after = "throttled", _retry_after(e)
+                raise
+            finally:
+                limiter.release(outcome, retry_after)
+
+        @functools.wraps(func)
+        def wrapper(prompt, provider=None, **kwargs):
+            limiter, tokens = limiter_for(prompt, provider)
+            if limiter is None:
+                return func(prompt, provider, **kwargs)
+            deadline, retries = settings()
+            if kwargs.get("stream"):
+                return limited_stream(limiter, tokens, deadline, prompt, provider, kwargs)
+            for attempt in range(retries + 1):
+                limiter.acquire(tokens, deadline)
+                # 无论以何种方式结束（包括KeyboardInterrupt/SystemExit）都释放并发名额
+                outcome, retry_after = "error", None
+                try:
+                    result = func(prompt, provider, **kwargs)
+                    outcome = "ok"
+                    return result
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        outcome, retry_after = "throttled", _retry_after(e)
+                        if attempt < retries:
+                            continue
+                    raise
+                finally:
+                    limiter.release(outcome, retry_after)
+        return wrapper
+
+    return decorator
+
+def get_rate_limit_metrics() -> Dict:
+    """每个 (提供商, 模型) 的并发上限、在途和排队请求数、429次数、排队超时次数等"""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {
+        "enabled": is_rate_limit_enabled(),
+        "limiters": {f"{provider}:{model}": limiter.get_metrics() for (provider, model), limiter in items}
+    }
+
+if __name__ == "__main__":
+    # 模拟突发负载：提供商最多同时处理 ceiling 个请求，超出的返回429
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeRateLimitError(Exception):
+        status_code = 429
+
+    ceiling, latency, total_calls = 6, 0.05, 300
+    state = {"active": 0, "rejected": 0}
+    state_lock = threading.Lock()
+
+    def fake_llm(prompt, provider=None, *, stream=False):
+        with state_lock:
+            if state["active"] >= ceiling:
+                state["rejected"] += 1
+                raise FakeRateLimitError("429 Too Many Requests")
+            state["active"] += 1
+        time.sleep(latency)
+        with state_lock:
+            state["active"] -= 1
+        return "ok"
+
+    def run(enabled: bool):
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "true" if enabled else "false"
+        os.environ["LLM_RATE_LIMIT_BACKOFF"] = str(latency)
+        os.environ["LLM_RATE_LIMIT_COOLDOWN"] = str(latency)
+        os.environ["LLM_RATE_LIMIT_RETRIES"] = "20"
+        _limiters.clear()
+        state["rejected"] = 0
+        call = rate_limited(lambda provider: "fake")(fake_llm)
+
+        def one(i):
+            try:
+                return call(f"prompt {i}", "openai") == "ok"
+            except Exception:
+                return False
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            succeeded = sum(executor.map(one, range(total_calls)))
+        elapsed = time.perf_counter() - start
+        print(f"限流{'开启' if enabled else '关闭'}: 成功 {succeeded}/{total_calls}，"
+              f"429 {state['rejected']} 次，耗时 {elapsed:.2f}s，吞吐 {succeeded / elapsed:.1f} 次/秒")
+        if enabled:
+            print(f"  最终并发上限: {get_limiter('openai', 'fake').limit:.1f}（提供商上限 {ceiling}）")
+
+    print(f"理论吞吐上限: {ceiling / latency:.0f} 次/秒")
+    run(False)
+    run(True)
@@ -0,0 +1,97 @@
+# utils/read_cache.py
+"""
+进程内文件读取缓存
+缓存文件解析后的结果，按文件的inode、大小和修改时间判断是否失效，
+命中时返回只读视图，避免重复解析同一个文件
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class FrozenDict(dict):
+    """只读字典：可以像普通dict一样读取和JSON序列化，修改时抛出TypeError"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("cached reading is read-only; copy it with dict() before modifying")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        import copy
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+def freeze(value: Any) -> Any:
+    """递归转换为只读结构：dict -> FrozenDict，list -> tuple"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def file_signature(path: str) -> Optional[Tuple]:
+    """文件的 (inode, 大小, 修改时间)，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+class FileSnapshotCache:
+    """
+    单文件解析结果缓存
+
+    文件签名变化或调用 invalidate() 之后，下一次 get() 会重新加载。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._key = None
+        self._value = None
+        self._generation = 0
+        self._metrics = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, path: str, loader: Callable[[], Any]) -> Any:
+        """
+        获取缓存的解析结果
+
+        Args:
+            path: 被缓存的文件路径
+            loader: 缓存未命中时调用的加载函数，返回值应当是只读结构
+        """
+        with self._lock:
+            # 先取签名再加载：加载期间文件若被修改，签名会比内容旧，下次调用会重新加载
+            key = (path, file_signature(path), self._generation)
+            if self.enabled and self._key == key:
+                self._metrics["hits"] += 1
+                return self._value
+
+            self._metrics["misses"] += 1
+            value = loader()
+            if self.enabled:
+                self._key, self._value = key, value
+            return value
+
+    def invalidate(self):
+        """丢弃缓存（本进程写文件之后调用，不必等待修改时间变化）"""
+        with self._lock:
+            self._generation += 1
+            self._key = self._value = None
+            self._metrics["invalidations"] += 1
+
+    def get_metrics(self) -> Dict:
+        """命中、未命中和失效次数"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else 0.0
+        metrics["enabled"] = self.enabled
+        return metrics
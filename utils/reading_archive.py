@@ -0,0 +1,185 @@
+# utils/reading_archive.py
+"""
+占卜记录归档分区
+超出保留策略的旧记录按月份写入gzip压缩的JSON Lines分区文件
+（archive/readings-YYYY-MM.jsonl.gz），不再参与热数据的日常读写
+
+分区文件只追加：每次归档向对应月份追加一个新的gzip成员，
+每个成员内的记录按时间倒序排列。读取时逐个成员流式解压并归并，
+内存中只保留每个成员的当前记录。
+"""
+
+import gzip
+import heapq
+import json
+import os
+import re
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_CHUNK_SIZE = 64 * 1024
+
+PARTITION_PREFIX = "readings-"
+PARTITION_SUFFIX = ".jsonl.gz"
+
+_PARTITION_PATTERN = re.compile(r"^readings-(\d{4}-\d{2})\.jsonl\.gz$")
+
+def partition_path(archive_dir: str, month: str) -> str:
+    """月份（YYYY-MM）对应的分区文件路径"""
+    return os.path.join(archive_dir, f"{PARTITION_PREFIX}{month}{PARTITION_SUFFIX}")
+
+def list_partitions(archive_dir: str) -> List[Tuple[str, str]]:
+    """
+    列出已有的归档分区
+
+    Returns:
+        按月份倒序排列的 (月份, 文件路径) 列表
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    partitions = []
+    for name in os.listdir(archive_dir):
+        match = _PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((match.group(1), os.path.join(archive_dir, name)))
+    partitions.sort(reverse=True)
+    return partitions
+
+def append_to_archive(archive_dir: str, readings: Iterable[Dict]) -> Dict[str, int]:
+    """
+    按月份把记录追加到归档分区
+
+    Returns:
+        月份 -> 写入记录数
+    """
+    by_month: Dict[str, List[Dict]] = {}
+    for reading in readings:
+        by_month.setdefault(reading.get('timestamp', '')[:7] or "0000-00", []).append(reading)
+
+    if by_month:
+        os.makedirs(archive_dir, exist_ok=True)
+
+    for month, month_readings in by_month.items():
+        month_readings.sort(key=_sort_key, reverse=True)
+        data = "".join(
+            json.dumps(r, ensure_ascii=False, separators=(',', ':')) + "\n" for r in month_readings
+        )
+        with open(partition_path(archive_dir, month), "ab") as f:
+            f.write(gzip.compress(data.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+    return {month: len(month_readings) for month, month_readings in by_month.items()}
+
+def _sort_key(reading: Dict) -> Tuple[str, str]:
+    return reading.get('timestamp', ''), reading.get('id', '')
+
+def _member_offsets(path: str) -> List[int]:
+    """扫描分区文件，返回每个gzip成员的起始字节位置（解压结果直接丢弃）"""
+    offsets = []
+    with open(path, "rb") as f:
+        position = 0
+        data = b""
+        decompressor = None
+        while True:
+            if not data:
+                data = f.read(_CHUNK_SIZE)
+                if not data:
+                    break
+            if decompressor is None:
+                offsets.append(position)
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                decompressor.decompress(data)
+            except zlib.error:
+                # 文件末尾写了一半的成员
+                break
+            if decompressor.eof:
+                position += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+                decompressor = None
+            else:
+                position += len(data)
+                data = b""
+    return offsets
+
+def _iter_member(path: str, offset: int) -> Iterator[Dict]:
+    """流式解压从 offset 开始的一个gzip成员，逐条返回记录（跳过损坏的行）"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    buffer = b""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while not decompressor.eof:
+            data = f.read(_CHUNK_SIZE)
+            if not data:
+                break
+            try:
+                buffer += decompressor.decompress(data)
+            except zlib.error:
+                break
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                reading = _decode_line(line)
+                if reading is not None:
+                    yield reading
+    reading = _decode_line(buffer)
+    if reading is not None:
+        yield reading
+
+def _decode_line(line: bytes) -> Optional[Dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line.decode("utf-8"))
+    except ValueError:
+        return None
+
+def iter_partition(path: str) -> Iterator[Dict]:
+    """
+    按 (timestamp, id) 倒序遍历一个分区；同一id出现多次时保留最后写入的
+
+    各成员已按时间倒序写入，按成员归并即可，不必把整个月份读入内存。
+    """
+    members = [
+        ((index, reading) for reading in _iter_member(path, offset))
+        for index, offset in enumerate(_member_offsets(path))
+    ]
+    seen_ids = set()
+    # 时间和id相同时后写入的成员排在前面
+    for _, reading in heapq.merge(*members, key=lambda item: (_sort_key(item[1]), item[0]), reverse=True):
+        reading_id = reading.get('id')
+        if reading_id in seen_ids:
+            continue
+        seen_ids.add(reading_id)
+        yield reading
+
+def iter_archive(archive_dir: str, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None) -> Iterator[Dict]:
+    """
+    按时间倒序遍历归档记录，只打开与日期范围（YYYY-MM-DD，闭区间）重叠的分区
+
+    分区逐条流式读取，内存占用与分区大小无关。
+    """
+    for month, path in list_partitions(archive_dir):
+        if start_date and month < start_date[:7]:
+            break
+        if end_date and month > end_date[:7]:
+            continue
+        for reading in iter_partition(path):
+            reading_date = reading.get('timestamp', '')[:10]
+            if start_date and reading_date < start_date:
+                break
+            if end_date and reading_date > end_date:
+                continue
+            yield reading
+
+def archive_summary(archive_dir: str) -> Dict:
+    """归档分区概况（分区数、压缩后总字节数、各月份文件大小）"""
+    partitions = list_partitions(archive_dir)
+    sizes = {month: os.path.getsize(path) for month, path in partitions}
+    return {
+        "partitions": len(partitions),
+        "total_bytes": sum(sizes.values()),
+        "partition_bytes": sizes
+    }
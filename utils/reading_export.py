@@ -0,0 +1,133 @@
+# utils/reading_export.py
+"""
+占卜记录流式导出工具函数
+逐条读取并写出记录，支持JSON、NDJSON和CSV格式以及gzip压缩，
+内存占用与历史记录总数无关
+"""
+
+import csv
+import gzip
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    from .reading_storage import iter_archived_readings, iter_readings
+except ImportError:
+    from reading_storage import iter_archived_readings, iter_readings
+
+EXPORT_FORMATS = ("json", "ndjson", "csv")
+
+# CSV导出的列
+CSV_COLUMNS = (
+    "id", "timestamp", "user_question", "question_category", "spread_type",
+    "cards", "reading_summary", "combined_reading"
+)
+
+def _csv_row(reading: Dict) -> list:
+    """把一条记录展开为CSV行，抽到的牌合并为一列"""
+    cards = "; ".join(
+        f"{card.get('name', '')}({'逆位' if card.get('reversed') else '正位'})"
+        for card in reading.get("drawn_cards", [])
+    )
+    row = dict(reading, cards=cards)
+    return [row.get(column, "") for column in CSV_COLUMNS]
+
+def _chain_archived(hot_readings: Iterable[Dict], archived_readings: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    依次返回热存储和归档中的记录
+
+    归档中途失败时同一条记录可能两边都有，按id去重（热存储中的优先）。
+    """
+    seen_ids = set()
+    for reading in hot_readings:
+        seen_ids.add(reading.get('id'))
+        yield reading
+    for reading in archived_readings:
+        if reading.get('id') not in seen_ids:
+            yield reading
+
+def default_export_filename(fmt: str = "json", compress: bool = False) -> str:
+    """生成带时间戳的默认导出文件名"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"tarot_export_{timestamp}.{fmt}" + (".gz" if compress else "")
+
+def stream_export_readings(output_file: Optional[str] = None,
+                           fmt: str = "json",
+                           compress: Optional[bool] = None,
+                           start_date: Optional[str] = None,
+                           end_date: Optional[str] = None,
+                           question_category: Optional[str] = None,
+                           spread_type: Optional[str] = None,
+                           include_archived: bool = True) -> Tuple[str, int]:
+    """
+    流式导出占卜记录（按时间倒序）
+
+    Args:
+        output_file: 输出文件路径（可选，默认按时间戳生成）
+        fmt: 导出格式 json / ndjson / csv
+        compress: 是否gzip压缩（None时根据文件名是否以 .gz 结尾判断）
+        start_date: 开始日期（YYYY-MM-DD，可选）
+        end_date: 结束日期（YYYY-MM-DD，可选）
+        question_category: 只导出该问题类型（可选）
+        spread_type: 只导出该牌阵类型（可选）
+        include_archived: 是否包含已归档的旧记录（热存储之后按月份倒序写出）
+
+    Returns:
+        (导出文件路径, 导出的记录数)
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}. Choose from: {', '.join(EXPORT_FORMATS)}")
+
+    if output_file is None:
+        output_file = default_export_filename(fmt, bool(compress))
+    if compress is None:
+        compress = output_file.endswith(".gz")
+
+    filters = dict(
+        start_date=start_date,
+        end_date=end_date,
+        question_category=question_category,
+        spread_type=spread_type
+    )
+    readings = iter_readings(**filters)
+    if include_archived:
+        # 归档记录都早于热存储中的记录，接在后面仍保持时间倒序
+        readings = _chain_archived(readings, iter_archived_readings(**filters))
+
+    opener = gzip.open if compress else open
+    count = 0
+    # CSV 加 BOM 便于 Excel 正确识别中文
+    encoding = "utf-8-sig" if fmt == "csv" else "utf-8"
+
+    with opener(output_file, "wt", encoding=encoding, newline="") as f:
+        if fmt == "json":
+            f.write('{\n  "export_date": ' + json.dumps(datetime.now().isoformat()) + ',\n  "readings": [')
+            for reading in readings:
+                f.write(",\n    " if count else "\n    ")
+                f.write(json.dumps(reading, ensure_ascii=False))
+                count += 1
+            f.write(("\n  " if count else "") + '],\n  "total_readings": ' + str(count) + "\n}\n")
+
+        elif fmt == "ndjson":
+            for reading in readings:
+                f.write(json.dumps(reading, ensure_ascii=False) + "\n")
+                count += 1
+
+        else:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            for reading in readings:
+                writer.writerow(_csv_row(reading))
+                count += 1
+
+    return output_file, count
+
+if __name__ == "__main__":
+    # 测试各导出格式
+    import os
+
+    for fmt in EXPORT_FORMATS:
+        path, count = stream_export_readings(fmt=fmt, compress=(fmt == "ndjson"))
+        print(f"{fmt}: 导出 {count} 条记录到 {path} ({os.path.getsize(path)} 字节)")
+        os.remove(path)
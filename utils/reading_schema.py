@@ -0,0 +1,86 @@
+# utils/reading_schema.py
+"""
+占卜记录存储格式
+保存时只保留牌名、正逆位、位置和牌阵id，card_meanings和spread_config
+这类静态数据在读取时从内存中的牌库和牌阵配置恢复
+
+版本历史：
+- 1.0：完整记录，包含card_meanings和spread_config
+- 2.0：紧凑记录，去掉card_meanings和spread_config
+"""
+
+from typing import Dict, Optional, Sequence
+
+try:
+    from .spread_config import get_spread_config
+    from .tarot_database import build_card_meanings
+except ImportError:
+    from spread_config import get_spread_config
+    from tarot_database import build_card_meanings
+
+SCHEMA_VERSION = "2.0"
+
+# 紧凑格式中不保存、读取时恢复的字段
+DERIVED_FIELDS = ("card_meanings", "spread_config")
+
+def compact_reading(reading: Dict) -> Dict:
+    """
+    转换为紧凑格式（原地修改）
+
+    Args:
+        reading: 任意版本的占卜记录
+
+    Returns:
+        同一个字典，去掉派生字段并标记为当前版本
+    """
+    for field in DERIVED_FIELDS:
+        reading.pop(field, None)
+    reading["version"] = SCHEMA_VERSION
+    return reading
+
+def migrate_reading(reading: Dict) -> bool:
+    """
+    把旧版本记录迁移到当前版本（原地修改）
+
+    Returns:
+        记录是否发生了变化
+    """
+    if reading.get("version") == SCHEMA_VERSION:
+        return False
+    compact_reading(reading)
+    return True
+
+def hydrate_reading(reading: Dict, fields: Optional[Sequence[str]] = None) -> Dict:
+    """
+    恢复紧凑记录中省略的派生字段
+
+    只有在需要这些字段时才会构建：fields为None（完整记录）或显式包含派生字段。
+    旧版本记录本身已带有这些字段，原样返回。
+
+    Args:
+        reading: 占卜记录
+        fields: 调用方需要的字段（None表示全部）
+
+    Returns:
+        补全派生字段后的新字典（不修改原记录）
+    """
+    if reading.get("version") != SCHEMA_VERSION:
+        return reading
+
+    wanted = [f for f in DERIVED_FIELDS if fields is None or f in fields]
+    if not wanted:
+        return reading
+
+    spread_config = get_spread_config(reading.get("spread_type", ""))
+    if "error" in spread_config:
+        spread_config = {}
+
+    hydrated = dict(reading)
+    if "spread_config" in wanted:
+        hydrated["spread_config"] = spread_config
+    if "card_meanings" in wanted:
+        hydrated["card_meanings"] = build_card_meanings(
+            reading.get("drawn_cards", []),
+            spread_config.get("positions", {})
+        )
+    return hydrated
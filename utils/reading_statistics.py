@@ -0,0 +1,110 @@
+# utils/reading_statistics.py
+"""
+占卜记录统计计数器
+在保存和删除记录时增量维护问题类型、牌阵类型和月份计数，
+统计接口只需读取一个很小的计数文件，不再扫描全部历史
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+try:
+    from .file_lock import atomic_write
+except ImportError:
+    from file_lock import atomic_write
+
+def empty_stats(backend: str) -> Dict:
+    """创建空的计数器"""
+    return {
+        "backend": backend,
+        "total": 0,
+        "question_types": {},
+        "spread_types": {},
+        "months": {},
+        "most_recent": None,
+        "oldest": None,
+        "stale": False
+    }
+
+def _increment(counter: Dict, key: str, amount: int):
+    value = counter.get(key, 0) + amount
+    if value > 0:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+def apply_saved(stats: Dict, readings: Iterable[Dict]) -> Dict:
+    """把新保存的记录计入计数器"""
+    for reading in readings:
+        timestamp = reading.get('timestamp', '')
+        stats["total"] += 1
+        _increment(stats["question_types"], reading.get('question_category', 'unknown'), 1)
+        _increment(stats["spread_types"], reading.get('spread_type', 'unknown'), 1)
+        _increment(stats["months"], timestamp[:7], 1)
+
+        if stats["most_recent"] is None or timestamp > stats["most_recent"]:
+            stats["most_recent"] = timestamp
+        if stats["oldest"] is None or timestamp < stats["oldest"]:
+            stats["oldest"] = timestamp
+    return stats
+
+def apply_deleted(stats: Dict, reading: Dict) -> Dict:
+    """
+    从计数器中减去被删除的记录
+
+    如果删除的是最新或最早的记录，无法在O(1)内得知新的边界，
+    此时把计数器标记为过期，下次读取时重建。
+    """
+    timestamp = reading.get('timestamp', '')
+    stats["total"] = max(0, stats["total"] - 1)
+    _increment(stats["question_types"], reading.get('question_category', 'unknown'), -1)
+    _increment(stats["spread_types"], reading.get('spread_type', 'unknown'), -1)
+    _increment(stats["months"], timestamp[:7], -1)
+
+    if stats["total"] == 0:
+        stats["most_recent"] = stats["oldest"] = None
+    elif timestamp in (stats["most_recent"], stats["oldest"]):
+        stats["stale"] = True
+    return stats
+
+def build_stats(readings: Iterable[Dict], backend: str) -> Dict:
+    """从全部记录重新计算计数器"""
+    return apply_saved(empty_stats(backend), readings)
+
+def summarize(stats: Dict) -> Dict:
+    """把计数器转换为对外的统计信息格式"""
+    if not stats["total"]:
+        return {
+            "total_readings": 0,
+            "question_types": {},
+            "spread_types": {},
+            "most_recent": None,
+            "oldest": None
+        }
+
+    return {
+        "total_readings": stats["total"],
+        "question_types": dict(stats["question_types"]),
+        "spread_types": dict(stats["spread_types"]),
+        "most_recent": stats["most_recent"],
+        "oldest": stats["oldest"],
+        "average_per_month": stats["total"] / max(1, len(stats["months"]))
+    }
+
+def load_stats(stats_file: str) -> Optional[Dict]:
+    """读取计数器文件，不存在或损坏时返回None"""
+    try:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_stats(stats_file: str, stats: Dict):
+    """原子写入计数器文件"""
+    atomic_write(stats_file, lambda f: json.dump(stats, f, ensure_ascii=False))
+
+def discard_stats(stats_file: str):
+    """删除计数器文件，下次读取时会重建"""
+    if os.path.exists(stats_file):
+        os.remove(stats_file)
@@ -2,27 +2,495 @@
 """
 占卜记录存储工具函数
 保存和检索用户的占卜历史记录
+
+支持两种存储引擎，通过环境变量 READING_STORAGE_BACKEND 选择：
+- jsonl（默认）：记录以JSON Lines格式追加写入日志文件，每次保存只追加一行；
+  删除操作追加一条墓碑记录，失效行累计到阈值后自动压缩日志
+- sqlite：记录保存在本地SQLite数据库中，按id、时间、问题类型和牌阵建立索引
+
+所有写操作都在跨进程文件锁内完成，整文件重写通过临时文件 + os.replace
+原子替换，多线程或多worker并发保存时不会丢失记录。
+
+jsonl引擎的读取走进程内缓存：解析、排序后的日志快照在日志文件的inode、
+大小或修改时间变化（其它进程写入）以及本模块自身写入之后才会重新加载，
+缓存中的记录是只读视图。可通过 READING_CACHE_ENABLED=false 关闭。
+
+保留策略（READING_RETENTION_DAYS / READING_RETENTION_MAX_COUNT）把超出范围的
+旧记录移入 archive/ 下按月份分区的gzip归档，热存储只保留近期记录；
+按日期范围查询和导出会在需要时读取归档分区。
 """
 
+import base64
+import itertools
 import json
+import bisect
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 import uuid
+try:
+    from . import reading_archive, reading_statistics, sqlite_storage
+    from .file_lock import atomic_write, locked
+    from .read_cache import FileSnapshotCache, freeze
+    from .reading_schema import DERIVED_FIELDS, SCHEMA_VERSION, compact_reading, hydrate_reading, migrate_reading
+except ImportError:
+    import reading_archive
+    import reading_statistics
+    import sqlite_storage
+    from file_lock import atomic_write, locked
+    from read_cache import FileSnapshotCache, freeze
+    from reading_schema import DERIVED_FIELDS, SCHEMA_VERSION, compact_reading, hydrate_reading, migrate_reading
 
 # 存储文件路径
 STORAGE_DIR = "data"
-READINGS_FILE = os.path.join(STORAGE_DIR, "tarot_readings.json")
+READINGS_FILE = os.path.join(STORAGE_DIR, "tarot_readings.json")  # 旧版JSON数组文件（仅用于迁移）
+READINGS_LOG_FILE = os.path.join(STORAGE_DIR, "tarot_readings.jsonl")
+LOCK_FILE = os.path.join(STORAGE_DIR, "tarot_readings.lock")
+STATS_FILE = os.path.join(STORAGE_DIR, "tarot_readings.stats.json")
+ARCHIVE_DIR = os.path.join(STORAGE_DIR, "archive")
+
+# 日志中失效行（被删除的记录及墓碑）超过该数量时自动压缩
+COMPACTION_THRESHOLD = int(os.getenv("READING_LOG_COMPACT_THRESHOLD", "100"))
+
+# 保留策略：超过天数或超出条数的旧记录移入归档（0表示不限制）
+RETENTION_DAYS = int(os.getenv("READING_RETENTION_DAYS", "0"))
+RETENTION_MAX_COUNT = int(os.getenv("READING_RETENTION_MAX_COUNT", "0"))
+
+# 墓碑记录的标记字段
+TOMBSTONE_KEY = "_deleted"
+
+# 历史列表页只需要的摘要字段
+SUMMARY_FIELDS = ("id", "timestamp", "user_question", "question_category", "spread_type", "reading_summary")
+
+_migration_checked = False
+
+class _LogSnapshot(NamedTuple):
+    """jsonl日志的只读快照"""
+    readings: Tuple[Dict, ...]             # 按 (timestamp, id) 倒序排列的有效记录
+    by_id: Dict[str, Dict]                 # id -> 记录
+    ascending_keys: List[Tuple[str, str]]  # 升序排列的 (timestamp, id)，用于二分定位游标
+    dead_lines: int                        # 日志中的失效行数，用于判断是否需要压缩
+
+# 进程内读取缓存（只用于jsonl引擎，SQLite查询本身走索引）
+_read_cache = FileSnapshotCache(
+    enabled=os.getenv("READING_CACHE_ENABLED", "true").lower() not in ("false", "0", "no")
+)
+
+def get_storage_backend() -> str:
+    """获取当前使用的存储引擎（jsonl 或 sqlite）"""
+    backend = os.getenv("READING_STORAGE_BACKEND", "jsonl").lower()
+    if backend not in ("jsonl", "sqlite"):
+        raise ValueError(f"Unsupported storage backend: {backend}. Choose from: jsonl, sqlite")
+    return backend
+
+def set_storage_dir(storage_dir: str):
+    """切换存储目录（所有数据文件路径随之改变），用于测试和基准测试"""
+    global STORAGE_DIR, READINGS_FILE, READINGS_LOG_FILE, LOCK_FILE, STATS_FILE, ARCHIVE_DIR, _migration_checked
+    STORAGE_DIR = storage_dir
+    READINGS_FILE = os.path.join(STORAGE_DIR, "tarot_readings.json")
+    READINGS_LOG_FILE = os.path.join(STORAGE_DIR, "tarot_readings.jsonl")
+    LOCK_FILE = os.path.join(STORAGE_DIR, "tarot_readings.lock")
+    STATS_FILE = os.path.join(STORAGE_DIR, "tarot_readings.stats.json")
+    ARCHIVE_DIR = os.path.join(STORAGE_DIR, "archive")
+    sqlite_storage.DB_FILE = os.path.join(STORAGE_DIR, "tarot_readings.db")
+    _migration_checked = False
+    _read_cache.invalidate()
 
 def ensure_storage_directory():
-    """确保存储目录存在"""
+    """确保存储目录存在，并在首次使用时完成旧数据迁移"""
+    global _migration_checked
     if not os.path.exists(STORAGE_DIR):
         os.makedirs(STORAGE_DIR)
+    
+    if not _migration_checked:
+        _migration_checked = True
+        migrate_legacy_readings()
+        if get_storage_backend() == "sqlite":
+            migrate_log_to_sqlite()
+        if RETENTION_DAYS or RETENTION_MAX_COUNT:
+            apply_retention_policy()
+
+def _encode_line(entry: Dict) -> str:
+    """将一条日志条目编码为单行JSON"""
+    return json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+
+def _write_log_file(entries: List[Dict]):
+    """先写临时文件再原子替换日志文件，避免写入中途崩溃导致日志损坏（调用方需持有存储锁）"""
+    def write_entries(f):
+        for entry in entries:
+            f.write(_encode_line(entry))
+    
+    atomic_write(READINGS_LOG_FILE, write_entries)
+    _read_cache.invalidate()
+
+def _iter_log_entries() -> Iterator[Dict]:
+    """
+    逐行读取日志条目
+    
+    无法解析的行（例如进程崩溃时写了一半的最后一行）会被跳过。
+    """
+    if not os.path.exists(READINGS_LOG_FILE):
+        return
+    
+    with open(READINGS_LOG_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+def _iter_log_entries_reversed(block_size: int = 64 * 1024) -> Iterator[Dict]:
+    """
+    从文件末尾向前逐行读取日志条目（最新的在前）
+    
+    按块读取，内存占用只与块大小和单行长度有关，与日志总大小无关。
+    """
+    if not os.path.exists(READINGS_LOG_FILE):
+        return
+    
+    with open(READINGS_LOG_FILE, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                entry = _decode_line(line)
+                if entry is not None:
+                    yield entry
+        
+        entry = _decode_line(remainder)
+        if entry is not None:
+            yield entry
+
+def _decode_line(line: bytes) -> Optional[Dict]:
+    """解析一行日志，空行或损坏的行返回None"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+
+def _replay_log() -> Tuple[Dict[str, Dict], int]:
+    """
+    重放日志，得到当前有效的记录
+    
+    Returns:
+        (按写入顺序排列的 id -> 记录 字典, 失效行数量)
+    """
+    live = {}
+    dead_lines = 0
+    
+    for entry in _iter_log_entries():
+        reading_id = entry.get('id')
+        if entry.get(TOMBSTONE_KEY):
+            if live.pop(reading_id, None) is not None:
+                dead_lines += 1
+            dead_lines += 1
+        else:
+            if reading_id in live:
+                dead_lines += 1
+            live[reading_id] = entry
+    
+    return live, dead_lines
+
+def _load_log_snapshot() -> _LogSnapshot:
+    """重放日志并按时间倒序排序，构建只读快照"""
+    live, dead_lines = _replay_log()
+    readings = tuple(sorted(
+        (freeze(r) for r in live.values()),
+        key=lambda r: (r.get('timestamp', ''), r.get('id', '')),
+        reverse=True
+    ))
+    by_id = {r.get('id'): r for r in readings}
+    ascending_keys = [(r.get('timestamp', ''), r.get('id', '')) for r in reversed(readings)]
+    return _LogSnapshot(readings, by_id, ascending_keys, dead_lines)
+
+def _log_snapshot() -> _LogSnapshot:
+    """获取日志快照：日志文件未变化且本进程没有写入时直接返回缓存"""
+    return _read_cache.get(READINGS_LOG_FILE, _load_log_snapshot)
+
+def _snapshot_position(snapshot: _LogSnapshot, before: Optional[Tuple[str, str]]) -> int:
+    """游标之后第一条记录在倒序列表中的下标"""
+    if before is None:
+        return 0
+    return len(snapshot.readings) - bisect.bisect_left(snapshot.ascending_keys, before)
+
+def get_read_cache_metrics() -> Dict:
+    """读取缓存的命中、未命中和失效次数"""
+    return _read_cache.get_metrics()
+
+def migrate_legacy_readings() -> int:
+    """
+    将旧版JSON数组文件一次性迁移为JSON Lines日志
+    
+    仅当旧文件存在且日志文件尚未创建时执行；迁移完成后旧文件
+    重命名为 .bak 作为备份。
+    
+    Returns:
+        迁移的记录数
+    """
+    if not os.path.exists(READINGS_FILE) or os.path.exists(READINGS_LOG_FILE):
+        return 0
+    
+    try:
+        with locked(LOCK_FILE):
+            # 持锁后再检查一次，其它进程可能已经完成迁移
+            if not os.path.exists(READINGS_FILE) or os.path.exists(READINGS_LOG_FILE):
+                return 0
+            
+            with open(READINGS_FILE, 'r', encoding='utf-8') as f:
+                readings = json.load(f)
+            
+            # 日志按写入时间正序排列，同时转换为紧凑格式
+            readings.sort(key=lambda x: x.get('timestamp', ''))
+            for reading in readings:
+                migrate_reading(reading)
+            _write_log_file(readings)
+            os.replace(READINGS_FILE, READINGS_FILE + ".bak")
+        
+        return len(readings)
+        
+    except Exception as e:
+        print(f"迁移旧版占卜记录失败: {str(e)}")
+        return 0
+
+def migrate_log_to_sqlite() -> int:
+    """
+    新建SQLite数据库时，导入JSON Lines日志中已有的记录
+    
+    导入完成后在数据库中留下标记，只执行一次：之后删除的记录不会在重启时从日志恢复。
+    
+    Returns:
+        导入的记录数
+    """
+    try:
+        with locked(LOCK_FILE):
+            if not sqlite_storage.init_db():
+                return 0
+            live, _ = _replay_log()
+            for reading in live.values():
+                migrate_reading(reading)
+            imported = sqlite_storage.insert_readings(live.values())
+            sqlite_storage.mark_log_imported()
+            return imported
+        
+    except Exception as e:
+        print(f"导入占卜记录到SQLite失败: {str(e)}")
+        return 0
+
+def compact_readings() -> int:
+    """
+    压缩日志文件，去掉已删除的记录和墓碑，并把旧版本记录转换为紧凑格式
+    
+    Returns:
+        压缩后保留的记录数
+    """
+    ensure_storage_directory()
+    with locked(LOCK_FILE):
+        live, _ = _replay_log()
+        for reading in live.values():
+            migrate_reading(reading)
+        _write_log_file(list(live.values()))
+    return len(live)
+
+def migrate_reading_schema() -> int:
+    """
+    把存储中的旧版本记录（version 1.0）迁移为当前的紧凑格式
+    
+    Returns:
+        迁移的记录数
+    """
+    ensure_storage_directory()
+    with locked(LOCK_FILE):
+        if get_storage_backend() == "sqlite":
+            migrated = [r for r in sqlite_storage.load_all() if migrate_reading(r)]
+            return sqlite_storage.insert_readings(migrated)
+        
+        live, _ = _replay_log()
+        pending = sum(1 for r in live.values() if r.get("version") != SCHEMA_VERSION)
+        if pending:
+            compact_readings()
+        return pending
+
+def _select_expired(readings: List[Dict], max_age_days: int, max_count: int) -> List[Dict]:
+    """按保留策略选出需要归档的记录（最新的记录优先保留）"""
+    ordered = sorted(readings, key=lambda r: (r.get('timestamp', ''), r.get('id', '')), reverse=True)
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat() if max_age_days else None
+    return [
+        r for index, r in enumerate(ordered)
+        if (max_count and index >= max_count) or (cutoff and r.get('timestamp', '') < cutoff)
+    ]
+
+def apply_retention_policy(max_age_days: Optional[int] = None, max_count: Optional[int] = None) -> int:
+    """
+    执行保留策略：把过旧或超出条数的记录移入按月份分区的压缩归档
+    
+    先写归档再从热存储中移除，中途失败时记录最多在两边各有一份（读取时按id去重），
+    不会丢失。统计信息只覆盖热存储，归档之后重建。
+    
+    Args:
+        max_age_days: 只保留最近多少天的记录（默认 READING_RETENTION_DAYS，0表示不限）
+        max_count: 最多保留多少条记录（默认 READING_RETENTION_MAX_COUNT，0表示不限）
+        
+    Returns:
+        归档的记录数
+    """
+    max_age_days = RETENTION_DAYS if max_age_days is None else max_age_days
+    max_count = RETENTION_MAX_COUNT if max_count is None else max_count
+    if not max_age_days and not max_count:
+        return 0
+    
+    try:
+        ensure_storage_directory()
+        with locked(LOCK_FILE):
+            if get_storage_backend() == "sqlite":
+                expired = _select_expired(sqlite_storage.load_all(), max_age_days, max_count)
+                if not expired:
+                    return 0
+                reading_archive.append_to_archive(ARCHIVE_DIR, expired)
+                sqlite_storage.delete_many([r['id'] for r in expired])
+            else:
+                live, _ = _replay_log()
+                expired = _select_expired(list(live.values()), max_age_days, max_count)
+                if not expired:
+                    return 0
+                reading_archive.append_to_archive(ARCHIVE_DIR, expired)
+                for reading in expired:
+                    del live[reading['id']]
+                # 重写热日志，同时去掉失效行
+                _write_log_file(list(live.values()))
+            
+            _rebuild_statistics_locked()
+        return len(expired)
+        
+    except Exception as e:
+        print(f"归档占卜记录失败: {str(e)}")
+        return 0
+
+def iter_archived_readings(start_date: Optional[str] = None,
+                           end_date: Optional[str] = None,
+                           question_category: Optional[str] = None,
+                           spread_type: Optional[str] = None,
+                           fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    """
+    按时间倒序遍历归档记录，只读取与日期范围重叠的月份分区
+    
+    Args:
+        start_date: 开始日期（YYYY-MM-DD，含当天，可选）
+        end_date: 结束日期（YYYY-MM-DD，含当天，可选）
+        question_category: 问题类型（可选）
+        spread_type: 牌阵类型（可选）
+        fields: 只返回这些字段（None表示完整记录）
+        
+    Yields:
+        占卜记录字典
+    """
+    for reading in reading_archive.iter_archive(ARCHIVE_DIR, start_date, end_date):
+        if question_category and reading.get('question_category') != question_category:
+            continue
+        if spread_type and reading.get('spread_type') != spread_type:
+            continue
+        yield _present_reading(reading, fields)
+
+def get_archive_summary() -> Dict:
+    """归档分区概况"""
+    return reading_archive.archive_summary(ARCHIVE_DIR)
 
 def generate_reading_id() -> str:
     """生成唯一的占卜记录ID"""
     return str(uuid.uuid4())
 
+def prepare_reading_record(reading_data: Dict) -> Dict:
+    """
+    为占卜数据添加id、时间戳和版本等元数据，并转换为紧凑格式
+    
+    Args:
+        reading_data: 占卜数据字典（原地修改）
+        
+    Returns:
+        添加元数据后的同一个字典
+    """
+    reading_data["id"] = generate_reading_id()
+    reading_data["timestamp"] = datetime.now().isoformat()
+    return compact_reading(reading_data)
+
+def _iter_stored_readings() -> Iterator[Dict]:
+    """按存储顺序遍历当前存储引擎中的全部记录（不排序）"""
+    if get_storage_backend() == "sqlite":
+        return iter(sqlite_storage.load_all())
+    return iter(_log_snapshot().readings)
+
+def _rebuild_statistics_locked() -> Dict:
+    """全量扫描重建统计计数器并写入计数文件（调用方需持有存储锁）"""
+    stats = reading_statistics.build_stats(_iter_stored_readings(), get_storage_backend())
+    reading_statistics.save_stats(STATS_FILE, stats)
+    return stats
+
+def _load_statistics_locked() -> Dict:
+    """读取统计计数器，缺失、过期或属于其它存储引擎时重建（调用方需持有存储锁）"""
+    stats = reading_statistics.load_stats(STATS_FILE)
+    if stats is None or stats.get("stale") or stats.get("backend") != get_storage_backend():
+        stats = _rebuild_statistics_locked()
+    return stats
+
+def _update_statistics(saved: List[Dict] = None, deleted: Dict = None):
+    """
+    在写操作之后增量更新统计计数器（调用方需持有存储锁）
+    
+    必须在记录写入存储之后调用：计数文件缺失时会全量重建，重建结果已包含本次写入。
+    """
+    try:
+        stats = reading_statistics.load_stats(STATS_FILE)
+        if stats is None or stats.get("backend") != get_storage_backend():
+            _rebuild_statistics_locked()
+            return
+        
+        if saved:
+            reading_statistics.apply_saved(stats, saved)
+        if deleted:
+            reading_statistics.apply_deleted(stats, deleted)
+        reading_statistics.save_stats(STATS_FILE, stats)
+        
+    except Exception as e:
+        # 计数器更新失败不影响写入本身，删除计数文件让下次读取时重建
+        print(f"更新统计计数器失败: {str(e)}")
+        reading_statistics.discard_stats(STATS_FILE)
+
+def rebuild_reading_statistics() -> Dict:
+    """
+    全量重建统计计数器（例如手动修改了存储文件之后）
+    
+    Returns:
+        重建后的统计信息
+    """
+    ensure_storage_directory()
+    with locked(LOCK_FILE):
+        stats = _rebuild_statistics_locked()
+    return reading_statistics.summarize(stats)
+
+def _write_records(readings: List[Dict]):
+    """将已添加元数据的记录写入当前存储引擎并更新统计（调用方需持有存储锁）"""
+    if get_storage_backend() == "sqlite":
+        sqlite_storage.insert_readings(readings)
+    else:
+        # 一次性追加所有行到日志文件
+        with open(READINGS_LOG_FILE, 'a', encoding='utf-8') as f:
+            f.write("".join(_encode_line(r) for r in readings))
+        _read_cache.invalidate()
+    
+    _update_statistics(saved=readings)
+
 def save_reading(reading_data: Dict) -> bool:
     """
     保存占卜记录
@@ -36,20 +504,10 @@ def save_reading(reading_data: Dict) -> bool:
     try:
         ensure_storage_directory()
         
-        # 添加元数据
-        reading_data["id"] = generate_reading_id()
-        reading_data["timestamp"] = datetime.now().isoformat()
-        reading_data["version"] = "1.0"
-        
-        # 加载现有记录
-        existing_readings = load_all_readings()
-        
-        # 添加新记录
-        existing_readings.append(reading_data)
-        
-        # 保存到文件
-        with open(READINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(existing_readings, f, ensure_ascii=False, indent=2)
+        with locked(LOCK_FILE):
+            # 在锁内生成时间戳，保证日志中的写入顺序与时间顺序一致
+            prepare_reading_record(reading_data)
+            _write_records([reading_data])
         
         return True
         
@@ -57,23 +515,44 @@ def save_reading(reading_data: Dict) -> bool:
         print(f"保存占卜记录失败: {str(e)}")
         return False
 
+def save_readings_batch(readings: List[Dict]) -> int:
+    """
+    批量保存占卜记录
+    
+    整批记录在一次加锁、一次写入内完成，供后台写入队列使用。id和时间戳
+    与 save_reading 一样在锁内生成，日志中的写入顺序始终与时间顺序一致。
+    
+    Args:
+        readings: 占卜记录列表
+        
+    Returns:
+        写入的记录数
+    """
+    if not readings:
+        return 0
+    
+    ensure_storage_directory()
+    with locked(LOCK_FILE):
+        for reading in readings:
+            prepare_reading_record(reading)
+        _write_records(readings)
+    return len(readings)
+
 def load_all_readings() -> List[Dict]:
     """
     加载所有占卜记录
     
+    jsonl引擎下记录中来自缓存的部分是只读的，需要修改时先用 copy.deepcopy 复制。
+    
     Returns:
-        所有占卜记录的列表
+        所有占卜记录的列表（按时间倒序）
     """
     try:
-        if not os.path.exists(READINGS_FILE):
-            return []
+        ensure_storage_directory()
+        if get_storage_backend() == "sqlite":
+            return [hydrate_reading(r) for r in sqlite_storage.load_all()]
         
-        with open(READINGS_FILE, 'r', encoding='utf-8') as f:
-            readings = json.load(f)
-            
-        # 按时间倒序排列（最新的在前）
-        readings.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        return readings
+        return [hydrate_reading(r) for r in _log_snapshot().readings]
         
     except Exception as e:
         print(f"加载占卜记录失败: {str(e)}")
@@ -89,11 +568,13 @@ def get_reading_by_id(reading_id: str) -> Optional[Dict]:
     Returns:
         占卜记录字典或None
     """
-    readings = load_all_readings()
-    for reading in readings:
-        if reading.get('id') == reading_id:
-            return reading
-    return None
+    ensure_storage_directory()
+    if get_storage_backend() == "sqlite":
+        reading = sqlite_storage.get_by_id(reading_id)
+        return hydrate_reading(reading) if reading else None
+    
+    reading = _log_snapshot().by_id.get(reading_id)
+    return hydrate_reading(reading) if reading else None
 
 def get_readings_by_date_range(start_date: str, end_date: str) -> List[Dict]:
     """
@@ -106,13 +587,22 @@ def get_readings_by_date_range(start_date: str, end_date: str) -> List[Dict]:
     Returns:
         日期范围内的占卜记录列表
     """
-    readings = load_all_readings()
-    filtered_readings = []
+    ensure_storage_directory()
+    if get_storage_backend() == "sqlite":
+        filtered_readings = [hydrate_reading(r) for r in sqlite_storage.get_by_date_range(start_date, end_date)]
+    else:
+        filtered_readings = []
+        for reading in _log_snapshot().readings:
+            reading_date = reading.get('timestamp', '')[:10]  # 取日期部分
+            if start_date <= reading_date <= end_date:
+                filtered_readings.append(hydrate_reading(reading))
     
-    for reading in readings:
-        reading_date = reading.get('timestamp', '')[:10]  # 取日期部分
-        if start_date <= reading_date <= end_date:
-            filtered_readings.append(reading)
+    # 范围覆盖已归档的月份时合并归档记录（热存储中的副本优先）
+    hot_ids = {r.get('id') for r in filtered_readings}
+    archived = [r for r in iter_archived_readings(start_date, end_date) if r.get('id') not in hot_ids]
+    if archived:
+        filtered_readings.extend(archived)
+        filtered_readings.sort(key=lambda r: (r.get('timestamp', ''), r.get('id', '')), reverse=True)
     
     return filtered_readings
 
@@ -126,8 +616,12 @@ def get_readings_by_question_type(question_type: str) -> List[Dict]:
     Returns:
         指定类型的占卜记录列表
     """
-    readings = load_all_readings()
-    return [r for r in readings if r.get('question_category') == question_type]
+    ensure_storage_directory()
+    if get_storage_backend() == "sqlite":
+        return [hydrate_reading(r) for r in sqlite_storage.get_by_question_type(question_type)]
+    
+    readings = _log_snapshot().readings
+    return [hydrate_reading(r) for r in readings if r.get('question_category') == question_type]
 
 def get_readings_by_spread(spread_type: str) -> List[Dict]:
     """
@@ -139,8 +633,141 @@ def get_readings_by_spread(spread_type: str) -> List[Dict]:
     Returns:
         指定牌阵的占卜记录列表
     """
-    readings = load_all_readings()
-    return [r for r in readings if r.get('spread_type') == spread_type]
+    ensure_storage_directory()
+    if get_storage_backend() == "sqlite":
+        return [hydrate_reading(r) for r in sqlite_storage.get_by_spread(spread_type)]
+    
+    readings = _log_snapshot().readings
+    return [hydrate_reading(r) for r in readings if r.get('spread_type') == spread_type]
+
+def encode_cursor(reading: Dict) -> str:
+    """把记录的 (timestamp, id) 编码为分页游标"""
+    raw = json.dumps([reading.get('timestamp', ''), reading.get('id', '')], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析分页游标，格式错误时抛出ValueError"""
+    try:
+        timestamp, reading_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(timestamp), str(reading_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def project_reading(reading: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    """只保留指定字段（id和timestamp总是保留，用于生成游标）"""
+    if not fields:
+        return reading
+    return {key: reading.get(key) for key in ("id", "timestamp", *fields)}
+
+def _present_reading(reading: Dict, fields: Optional[Sequence[str]]) -> Dict:
+    """按需恢复派生字段后再做字段投影"""
+    return project_reading(hydrate_reading(reading, fields), fields)
+
+def _sqlite_projection(fields: Optional[Sequence[str]]) -> Optional[List[str]]:
+    """
+    SQLite查询中直接投影的字段
+    
+    需要派生字段时取回完整记录，由 hydrate_reading 在Python中恢复后再投影。
+    """
+    if not fields or any(f in DERIVED_FIELDS for f in fields):
+        return None
+    return list(dict.fromkeys(("id", "timestamp", *fields)))
+
+def iter_readings(before: Optional[Tuple[str, str]] = None,
+                  fields: Optional[Sequence[str]] = None,
+                  start_date: Optional[str] = None,
+                  end_date: Optional[str] = None,
+                  question_category: Optional[str] = None,
+                  spread_type: Optional[str] = None) -> Iterator[Dict]:
+    """
+    按时间倒序逐条遍历占卜记录，不在内存中构建完整列表
+    
+    筛选条件在存储扫描时直接应用：SQLite下推为索引查询，JSON Lines日志
+    在倒序扫描到早于 start_date 的记录时提前结束。
+    
+    Args:
+        before: 游标 (timestamp, id)，只返回排在它之后（更早）的记录
+        fields: 只返回这些字段（None表示完整记录）
+        start_date: 开始日期（YYYY-MM-DD，含当天，可选）
+        end_date: 结束日期（YYYY-MM-DD，含当天，可选）
+        question_category: 问题类型（可选）
+        spread_type: 牌阵类型（可选）
+        
+    Yields:
+        占卜记录字典
+    """
+    ensure_storage_directory()
+    if get_storage_backend() == "sqlite":
+        scan = sqlite_storage.iter_readings(
+            before, _sqlite_projection(fields),
+            start_date=start_date, end_date=end_date,
+            question_category=question_category, spread_type=spread_type
+        )
+        for reading in scan:
+            yield _present_reading(reading, fields)
+        return
+    
+    # 日志按时间顺序追加，倒序读取即为最新在前；墓碑总在被删除的记录之后出现
+    deleted_ids = set()
+    for entry in _iter_log_entries_reversed():
+        reading_id = entry.get('id')
+        if entry.get(TOMBSTONE_KEY):
+            deleted_ids.add(reading_id)
+            continue
+        if reading_id in deleted_ids:
+            continue
+        
+        timestamp = entry.get('timestamp', '')
+        if start_date and timestamp[:10] < start_date:
+            break
+        if end_date and timestamp[:10] > end_date:
+            continue
+        if before is not None and (timestamp, reading_id) >= before:
+            continue
+        if question_category and entry.get('question_category') != question_category:
+            continue
+        if spread_type and entry.get('spread_type') != spread_type:
+            continue
+        
+        yield _present_reading(entry, fields)
+
+def get_readings_page(limit: int = 10, offset: int = 0, cursor: Optional[str] = None,
+                      fields: Optional[Sequence[str]] = None) -> Dict:
+    """
+    分页获取占卜记录（按时间倒序）
+    
+    优先使用游标分页：cursor为上一页返回的 next_cursor，此时offset相对于游标计算。
+    
+    Args:
+        limit: 每页记录数
+        offset: 跳过的记录数
+        cursor: 分页游标（可选）
+        fields: 只返回这些字段（可选，例如 SUMMARY_FIELDS）
+        
+    Returns:
+        包含 readings、total 和 next_cursor 的字典
+    """
+    ensure_storage_directory()
+    before = decode_cursor(cursor) if cursor else None
+    
+    if get_storage_backend() == "sqlite":
+        readings = sqlite_storage.get_page(limit, offset, before, _sqlite_projection(fields))
+        readings = [_present_reading(r, fields) for r in readings]
+    elif _read_cache.enabled:
+        # 缓存快照已排好序，二分定位游标后直接切片
+        snapshot = _log_snapshot()
+        start = _snapshot_position(snapshot, before) + offset
+        readings = [_present_reading(r, fields) for r in snapshot.readings[start:start + limit]]
+    else:
+        readings = list(itertools.islice(iter_readings(before, fields), offset, offset + limit))
+    
+    next_cursor = encode_cursor(readings[-1]) if len(readings) == limit and readings else None
+    
+    return {
+        "readings": readings,
+        "total": get_reading_statistics()["total_readings"],
+        "next_cursor": next_cursor
+    }
 
 def delete_reading(reading_id: str) -> bool:
     """
@@ -153,19 +780,33 @@ def delete_reading(reading_id: str) -> bool:
         删除是否成功
     """
     try:
-        readings = load_all_readings()
-        original_count = len(readings)
-        
-        # 过滤掉要删除的记录
-        readings = [r for r in readings if r.get('id') != reading_id]
-        
-        if len(readings) == original_count:
-            # 没有找到要删除的记录
-            return False
-        
-        # 保存更新后的记录
-        with open(READINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(readings, f, ensure_ascii=False, indent=2)
+        ensure_storage_directory()
+        with locked(LOCK_FILE):
+            if get_storage_backend() == "sqlite":
+                reading = sqlite_storage.get_by_id(reading_id)
+                if reading is None or not sqlite_storage.delete(reading_id):
+                    return False
+                _update_statistics(deleted=reading)
+                return True
+            
+            # 在快照的id索引中查找，不必为每次删除重放整个日志
+            snapshot = _log_snapshot()
+            reading = snapshot.by_id.get(reading_id)
+            if reading is None:
+                # 没有找到要删除的记录
+                return False
+            
+            # 追加墓碑记录
+            with open(READINGS_LOG_FILE, 'a', encoding='utf-8') as f:
+                f.write(_encode_line({"id": reading_id, TOMBSTONE_KEY: True}))
+            _read_cache.invalidate()
+            _update_statistics(deleted=reading)
+            
+            # 失效行过多时压缩日志，顺便执行保留策略
+            if snapshot.dead_lines + 2 >= COMPACTION_THRESHOLD:
+                compact_readings()
+                if RETENTION_DAYS or RETENTION_MAX_COUNT:
+                    apply_retention_policy()
         
         return True
         
@@ -177,45 +818,22 @@ def get_reading_statistics() -> Dict:
     """
     获取占卜记录统计信息
     
+    统计数据来自保存/删除时增量维护的计数文件，只有计数文件缺失或过期时才全量重建。
+    
     Returns:
         统计信息字典
     """
-    readings = load_all_readings()
+    ensure_storage_directory()
+    stats = reading_statistics.load_stats(STATS_FILE)
+    if stats is None or stats.get("stale") or stats.get("backend") != get_storage_backend():
+        with locked(LOCK_FILE):
+            stats = _load_statistics_locked()
     
-    if not readings:
-        return {
-            "total_readings": 0,
-            "question_types": {},
-            "spread_types": {},
-            "most_recent": None,
-            "oldest": None
-        }
-    
-    # 统计问题类型
-    question_types = {}
-    spread_types = {}
-    
-    for reading in readings:
-        # 问题类型统计
-        q_type = reading.get('question_category', 'unknown')
-        question_types[q_type] = question_types.get(q_type, 0) + 1
-        
-        # 牌阵类型统计
-        s_type = reading.get('spread_type', 'unknown')
-        spread_types[s_type] = spread_types.get(s_type, 0) + 1
-    
-    return {
-        "total_readings": len(readings),
-        "question_types": question_types,
-        "spread_types": spread_types,
-        "most_recent": readings[0].get('timestamp') if readings else None,
-        "oldest": readings[-1].get('timestamp') if readings else None,
-        "average_per_month": len(readings) / max(1, len(set(r.get('timestamp', '')[:7] for r in readings)))
-    }
+    return reading_statistics.summarize(stats)
 
 def export_readings_to_json(output_file: str = None) -> str:
     """
-    导出所有占卜记录到JSON文件
+    导出所有占卜记录到JSON文件（流式写出，见 reading_export.stream_export_readings）
     
     Args:
         output_file: 输出文件路径（可选）
@@ -223,22 +841,13 @@ def export_readings_to_json(output_file: str = None) -> str:
     Returns:
         导出文件的路径
     """
-    if output_file is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"tarot_export_{timestamp}.json"
-    
-    readings = load_all_readings()
-    
-    export_data = {
-        "export_date": datetime.now().isoformat(),
-        "total_readings": len(readings),
-        "readings": readings
-    }
+    try:
+        from .reading_export import stream_export_readings
+    except ImportError:
+        from reading_export import stream_export_readings
     
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2)
-        
+        output_file, _ = stream_export_readings(output_file, fmt="json")
         return output_file
         
     except Exception as e:
@@ -275,7 +884,70 @@ def create_sample_reading() -> Dict:
         "reading_summary": "今日运势极佳，充满正能量和成功机会。"
     }
 
+def _stress_save(index: int) -> bool:
+    """压力测试的单次保存任务"""
+    reading = create_sample_reading()
+    reading["user_question"] = f"压力测试问题 {index}"
+    return save_reading(reading)
+
+def stress_test_concurrent_saves(num_saves: int = 200, num_workers: int = 8, use_processes: bool = True) -> Dict:
+    """
+    并发保存压力测试：在临时目录中并行发起多次保存，检查是否有记录丢失
+    
+    Args:
+        num_saves: 保存次数
+        num_workers: 并发worker数
+        use_processes: 使用多进程（True）还是多线程（False）
+        
+    Returns:
+        测试结果字典
+    """
+    import tempfile
+    import time
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    
+    original_dir = STORAGE_DIR
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        set_storage_dir(tmp_dir)
+        try:
+            start = time.perf_counter()
+            with executor_class(max_workers=num_workers) as executor:
+                results = list(executor.map(_stress_save, range(num_saves)))
+            elapsed = time.perf_counter() - start
+            
+            saved_questions = {r.get("user_question") for r in load_all_readings()}
+            expected_questions = {f"压力测试问题 {i}" for i in range(num_saves)}
+            lost = len(expected_questions - saved_questions)
+        finally:
+            set_storage_dir(original_dir)
+    
+    return {
+        "backend": get_storage_backend(),
+        "mode": "processes" if use_processes else "threads",
+        "saves": num_saves,
+        "workers": num_workers,
+        "reported_success": sum(results),
+        "lost": lost,
+        "elapsed_seconds": elapsed,
+        "saves_per_second": num_saves / elapsed if elapsed > 0 else 0.0
+    }
+
 if __name__ == "__main__":
+    import sys
+    
+    if len(sys.argv) > 1 and sys.argv[1] == "stress":
+        # 并发写入压力测试: python utils/reading_storage.py stress [次数] [并发数]
+        num_saves = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+        for use_processes in (False, True):
+            result = stress_test_concurrent_saves(num_saves, num_workers, use_processes)
+            print(f"[{result['backend']}/{result['mode']}] 保存 {result['saves']} 次, "
+                  f"丢失 {result['lost']} 条, 耗时 {result['elapsed_seconds']:.2f}s, "
+                  f"{result['saves_per_second']:.0f} 次/秒")
+        sys.exit(0)
+    
     # 测试存储功能
     print("测试占卜记录存储功能:")
     
@@ -309,8 +981,13 @@ if __name__ == "__main__":
     single_spread_readings = get_readings_by_spread("single")
     print(f"单张牌占卜记录: {len(single_spread_readings)} 条")
     
+    # 测试日志压缩
+    print("\n5. 日志压缩:")
+    kept = compact_readings()
+    print(f"压缩后保留 {kept} 条记录")
+    
     # 测试导出功能
-    print("\n5. 导出测试:")
+    print("\n6. 导出测试:")
     export_file = export_readings_to_json()
     if export_file:
         print(f"导出成功，文件: {export_file}")
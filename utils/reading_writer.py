@@ -0,0 +1,247 @@
+# utils/reading_writer.py
+"""
+占卜记录异步写入队列
+保存请求进入有界的进程内队列，由后台线程批量写入存储，
+占卜响应不再等待磁盘写入
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from .reading_storage import save_readings_batch
+except ImportError:
+    from reading_storage import save_readings_batch
+
+def is_async_save_enabled() -> bool:
+    """是否启用异步保存（READING_SAVE_MODE=async）"""
+    return os.getenv("READING_SAVE_MODE", "sync").lower() == "async"
+
+class ReadingWriteQueue:
+    """
+    有界写入队列 + 单个后台批量写入线程
+
+    记录的id和时间戳在写入存储时才在存储锁内生成（见 save_readings_batch），
+    队列满时同步写入的记录也不会破坏日志按时间排序的顺序。
+    """
+
+    def __init__(self, max_size: int = 1000, batch_size: int = 50, flush_interval: float = 0.2):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "enqueued": 0,
+            "flushed": 0,
+            "failed": 0,
+            "sync_fallbacks": 0,
+            "batches": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="reading-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, reading: Dict) -> bool:
+        """
+        提交一条占卜记录
+
+        队列已满时直接同步写入，保证记录不会因为积压而丢失。
+
+        Returns:
+            记录是否已入队或写入成功
+        """
+        try:
+            self._queue.put_nowait(reading)
+            self._count("enqueued")
+            return True
+        except queue.Full:
+            self._count("sync_fallbacks")
+            return self._write_batch([reading])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列中的记录全部写入
+
+        Returns:
+            是否在超时前完成
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._drain()
+                break
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """写完队列中剩余记录并停止后台线程（进程退出时调用）"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # 后台线程还在写入，不能在当前线程同时写；剩余记录随进程退出丢弃
+                print(f"等待占卜记录写入超时，放弃 {self._queue.qsize()} 条排队中的记录")
+                return
+        self._drain()
+
+    def get_metrics(self) -> Dict:
+        """获取队列深度和写入延迟等指标"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        total_flush_ms = metrics.pop("total_flush_ms")
+        metrics["queue_depth"] = self._queue.qsize()
+        metrics["max_queue_size"] = self._queue.maxsize
+        metrics["avg_flush_ms"] = total_flush_ms / metrics["batches"] if metrics["batches"] else 0.0
+        metrics["writer_alive"] = self._thread is not None and self._thread.is_alive()
+        return metrics
+
+    def _count(self, key: str, amount: int = 1):
+        with self._metrics_lock:
+            self._metrics[key] += amount
+
+    def _take_batch(self, first: Dict) -> List[Dict]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # 停止时先写完已取出的批次再退出，剩余记录由 stop() 在线程结束后写入
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = self._take_batch(first)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _drain(self):
+        """在调用线程中写完队列剩余的记录"""
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            batch = self._take_batch(first)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]) -> bool:
+        start = time.perf_counter()
+        try:
+            save_readings_batch(batch)
+        except Exception as e:
+            # 失败后重试一次，仍然失败则放弃这一批
+            try:
+                time.sleep(0.1)
+                save_readings_batch(batch)
+            except Exception:
+                print(f"批量保存占卜记录失败: {str(e)}, 丢弃 {len(batch)} 条记录")
+                self._count("failed", len(batch))
+                return False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._metrics_lock:
+            self._metrics["flushed"] += len(batch)
+            self._metrics["batches"] += 1
+            self._metrics["last_flush_ms"] = elapsed_ms
+            self._metrics["max_flush_ms"] = max(self._metrics["max_flush_ms"], elapsed_ms)
+            self._metrics["total_flush_ms"] += elapsed_ms
+        return True
+
+_write_queue = None
+_write_queue_pid = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue() -> ReadingWriteQueue:
+    """获取进程内共享的写入队列（首次调用时创建并启动，fork后的子进程会重新创建）"""
+    global _write_queue, _write_queue_pid
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue_pid != os.getpid():
+            _write_queue = ReadingWriteQueue(
+                max_size=int(os.getenv("READING_WRITE_QUEUE_SIZE", "1000")),
+                batch_size=int(os.getenv("READING_WRITE_BATCH_SIZE", "50")),
+                flush_interval=float(os.getenv("READING_WRITE_FLUSH_INTERVAL", "0.2"))
+            )
+            _write_queue_pid = os.getpid()
+            _write_queue.start()
+            atexit.register(_write_queue.stop)
+        return _write_queue
+
+def enqueue_reading(reading_data: Dict) -> bool:
+    """
+    异步保存占卜记录：立即入队，由后台线程添加id和时间戳后写入
+
+    Args:
+        reading_data: 占卜数据字典
+
+    Returns:
+        是否已成功入队（或在队列满时同步写入成功）
+    """
+    try:
+        return get_write_queue().submit(reading_data)
+    except Exception as e:
+        print(f"占卜记录入队失败: {str(e)}")
+        return False
+
+def flush_pending_readings(timeout: Optional[float] = None) -> bool:
+    """等待所有排队中的记录写入存储"""
+    if _write_queue is None or _write_queue_pid != os.getpid():
+        return True
+    return _write_queue.flush(timeout)
+
+def get_write_queue_metrics() -> Dict:
+    """获取写入队列指标（未启用异步保存时返回空队列的指标）"""
+    if _write_queue is None or _write_queue_pid != os.getpid():
+        return {"enabled": is_async_save_enabled(), "queue_depth": 0}
+    metrics = _write_queue.get_metrics()
+    metrics["enabled"] = is_async_save_enabled()
+    return metrics
+
+if __name__ == "__main__":
+    # 对比同步保存和异步入队的调用延迟
+    import tempfile
+    try:
+        from .reading_storage import create_sample_reading, load_all_readings, save_reading, set_storage_dir
+    except ImportError:
+        from reading_storage import create_sample_reading, load_all_readings, save_reading, set_storage_dir
+
+    num_saves = 500
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        set_storage_dir(tmp_dir)
+
+        start = time.perf_counter()
+        for _ in range(num_saves):
+            save_reading(create_sample_reading())
+        sync_ms = (time.perf_counter() - start) * 1000 / num_saves
+
+        start = time.perf_counter()
+        for _ in range(num_saves):
+            enqueue_reading(create_sample_reading())
+        async_ms = (time.perf_counter() - start) * 1000 / num_saves
+        flush_pending_readings()
+
+        print(f"同步保存: {sync_ms:.3f} ms/次")
+        print(f"异步入队: {async_ms:.3f} ms/次")
+        print(f"存储中记录数: {len(load_all_readings())} (期望 {num_saves * 2})")
+        print(f"队列指标: {get_write_queue_metrics()}")
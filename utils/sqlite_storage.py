@@ -0,0 +1,241 @@
+# utils/sqlite_storage.py
+"""
+SQLite占卜记录存储引擎
+将占卜记录保存在本地SQLite数据库中，按id、时间、问题类型和牌阵类型建立索引
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 数据库文件路径
+DB_FILE = os.path.join("data", "tarot_readings.db")
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    question_category TEXT,
+    spread_type TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_readings_timestamp ON readings (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_readings_category ON readings (question_category, timestamp);
+CREATE INDEX IF NOT EXISTS idx_readings_spread ON readings (spread_type, timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# meta表中记录已从JSON Lines日志导入过的键
+LOG_IMPORTED_KEY = "log_imported_at"
+
+def get_connection() -> sqlite3.Connection:
+    """获取当前线程的数据库连接（每个线程复用一个连接）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "db_file", None) != DB_FILE:
+        conn = sqlite3.connect(DB_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.db_file = DB_FILE
+    return conn
+
+def init_db() -> bool:
+    """
+    创建表和索引
+
+    Returns:
+        是否还需要从JSON Lines日志导入记录（导入完成后由 mark_log_imported 记录，只导入一次）
+    """
+    conn = get_connection()
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'readings'"
+    ).fetchone() is not None
+    with conn:
+        conn.executescript(_SCHEMA)
+    if conn.execute("SELECT 1 FROM meta WHERE key = ?", (LOG_IMPORTED_KEY,)).fetchone():
+        return False
+    if existed:
+        # 旧版本创建的数据库在建表时已经导入过日志，补上标记即可
+        mark_log_imported()
+        return False
+    return True
+
+def mark_log_imported():
+    """记录日志已导入，之后即使删光所有记录也不会再次导入"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, datetime('now'))",
+            (LOG_IMPORTED_KEY,)
+        )
+
+def _row_params(reading: Dict) -> Tuple:
+    return (
+        reading["id"],
+        reading.get("timestamp", ""),
+        reading.get("question_category"),
+        reading.get("spread_type"),
+        json.dumps(reading, ensure_ascii=False, separators=(',', ':'))
+    )
+
+def insert_readings(readings: Iterable[Dict]) -> int:
+    """
+    批量写入占卜记录（相同id的记录会被覆盖）
+
+    Returns:
+        写入的记录数
+    """
+    rows = [_row_params(r) for r in readings]
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO readings (id, timestamp, question_category, spread_type, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+    return len(rows)
+
+def _query(sql: str, params: Tuple = ()) -> List[Dict]:
+    rows = get_connection().execute(sql, params).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+def load_all() -> List[Dict]:
+    """按时间倒序加载所有记录"""
+    return _query("SELECT data FROM readings ORDER BY timestamp DESC, id DESC")
+
+def get_by_id(reading_id: str) -> Optional[Dict]:
+    """按id查询单条记录"""
+    rows = _query("SELECT data FROM readings WHERE id = ?", (reading_id,))
+    return rows[0] if rows else None
+
+def get_by_date_range(start_date: str, end_date: str) -> List[Dict]:
+    """
+    查询日期范围内的记录（闭区间，YYYY-MM-DD 格式）
+
+    时间戳是ISO格式字符串，"~" 大于日期之后的 "T"，因此
+    timestamp < end_date + "~" 等价于 timestamp[:10] <= end_date，可以走索引。
+    """
+    return _query(
+        "SELECT data FROM readings WHERE timestamp >= ? AND timestamp < ? "
+        "ORDER BY timestamp DESC, id DESC",
+        (start_date, end_date + "~")
+    )
+
+def get_by_question_type(question_type: str) -> List[Dict]:
+    """按问题类型查询记录"""
+    return _query(
+        "SELECT data FROM readings WHERE question_category = ? ORDER BY timestamp DESC",
+        (question_type,)
+    )
+
+def get_by_spread(spread_type: str) -> List[Dict]:
+    """按牌阵类型查询记录"""
+    return _query(
+        "SELECT data FROM readings WHERE spread_type = ? ORDER BY timestamp DESC",
+        (spread_type,)
+    )
+
+def _select_columns(fields: Optional[Sequence[str]]) -> Tuple[str, Tuple]:
+    """
+    构建投影查询的列表达式
+
+    指定字段时在SQLite内用json_extract取出各字段并重新组装，
+    不必把card_meanings等大字段传回Python再解析。
+    """
+    if not fields:
+        return "data", ()
+    pairs = ", ".join("?, json_extract(data, ?)" for _ in fields)
+    params = tuple(p for field in fields for p in (field, f'$."{field}"'))
+    return f"json_object({pairs})", params
+
+def _where_clause(before: Optional[Tuple[str, str]] = None, start_date: Optional[str] = None,
+                  end_date: Optional[str] = None, question_category: Optional[str] = None,
+                  spread_type: Optional[str] = None) -> Tuple[str, Tuple]:
+    """
+    构建筛选条件
+
+    before 为 (timestamp, id) 游标，只取排在游标之后（更早）的记录；
+    日期为闭区间（YYYY-MM-DD），其余条件为等值匹配。
+    """
+    conditions, params = [], []
+    if before is not None:
+        conditions.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+    if start_date:
+        conditions.append("timestamp >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("timestamp < ?")
+        params.append(end_date + "~")
+    if question_category:
+        conditions.append("question_category = ?")
+        params.append(question_category)
+    if spread_type:
+        conditions.append("spread_type = ?")
+        params.append(spread_type)
+    if not conditions:
+        return "", ()
+    return "WHERE " + " AND ".join(conditions), tuple(params)
+
+def get_page(limit: int, offset: int = 0, before: Optional[Tuple[str, str]] = None,
+             fields: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    按时间倒序分页查询记录
+
+    Args:
+        limit: 每页记录数
+        offset: 跳过的记录数
+        before: 游标 (timestamp, id)，只返回排在它之后的记录
+        fields: 只返回这些字段（None表示完整记录）
+
+    Returns:
+        当前页记录
+    """
+    columns, column_params = _select_columns(fields)
+    where, where_params = _where_clause(before)
+    return _query(
+        f"SELECT {columns} FROM readings {where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+        column_params + where_params + (limit, offset)
+    )
+
+def iter_readings(before: Optional[Tuple[str, str]] = None, fields: Optional[Sequence[str]] = None,
+                  batch_size: int = 200, **filters) -> Iterator[Dict]:
+    """
+    按时间倒序逐批读取记录，内存占用与总记录数无关
+
+    filters 支持 start_date、end_date、question_category、spread_type，
+    作为SQL条件下推到索引扫描中。
+    """
+    columns, column_params = _select_columns(fields)
+    where, where_params = _where_clause(before, **filters)
+    cursor = get_connection().execute(
+        f"SELECT {columns} FROM readings {where} ORDER BY timestamp DESC, id DESC",
+        column_params + where_params
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield json.loads(row[0])
+
+def delete(reading_id: str) -> bool:
+    """删除记录，返回是否找到并删除"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("DELETE FROM readings WHERE id = ?", (reading_id,))
+    return cursor.rowcount > 0
+
+def delete_many(reading_ids: Sequence[str]) -> int:
+    """批量删除记录，返回删除的记录数"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany("DELETE FROM readings WHERE id = ?", [(i,) for i in reading_ids])
+    return cursor.rowcount
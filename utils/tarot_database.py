@@ -590,6 +590,31 @@ def get_card_info(card_name: str, position: str = None) -> dict:
     
     return card_info
 
+def build_card_meanings(drawn_cards: list, positions: dict) -> list:
+    """
+    为抽到的每张牌组装牌意、位置含义和抽牌状态
+    
+    Args:
+        drawn_cards: 抽牌结果列表（包含name、reversed、position）
+        positions: 牌阵的位置配置（位置编号 -> 位置信息）
+        
+    Returns:
+        每张牌的完整牌意信息列表
+    """
+    card_meanings = []
+    
+    for card in drawn_cards:
+        # 获取牌的基本信息
+        card_info = get_card_info(card["name"])
+        
+        # 添加位置含义
+        card_info["position_info"] = positions.get(card["position"], {})
+        card_info["card_state"] = card
+        
+        card_meanings.append(card_info)
+    
+    return card_meanings
+
 def get_all_cards() -> list:
     """获取所有塔罗牌名称列表"""
     return list(TAROT_CARDS.keys())
@@ -0,0 +1,226 @@
+# utils/token_budget.py
+"""
+Token计数、prompt预算和用量统计
+
+- count_tokens：安装了tiktoken时按模型的编码计数，否则按字符估算
+- fit_to_budget：把一组输入文本（牌意、单牌解读等）裁剪到总预算内，
+  短的原样保留，长的截取开头的完整句子
+- 用量记录：每次LLM调用的prompt/completion token数和耗时，
+  既计入当前节点的 TokenUsage（由节点写入shared store），也计入进程内的汇总指标
+"""
+
+import contextvars
+import functools
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 按prompt大小分桶统计调用次数、平均耗时和completion长度（桶上界，单位token）
+PROMPT_SIZE_BUCKETS = (500, 1000, 2000, 4000, 8000)
+
+# 截断时优先在这些标点之后断开
+_SENTENCE_ENDINGS = "。！？；\n.!?;"
+
+@functools.lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    计算文本的token数
+
+    安装了tiktoken时按模型的编码计算（未知模型使用o200k_base）；
+    否则粗略估算：中日韩字符约1个token，其他字符约4个一个token。
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            return len(_encoding(model).encode(text))
+        except Exception:
+            pass  # 编码文件无法下载等情况，退回估算
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uf900" <= ch <= "\ufaff")
+    return max(1, cjk + (len(text) - cjk) // 4)
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """把文本截到 max_tokens 以内，尽量在句子结尾处断开，截断时末尾加“…”"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    # 二分查找不超过预算的最长前缀（预留1个token给省略号）
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle], model) <= max_tokens - 1:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = text[:low]
+
+    cut = max(prefix.rfind(ch) for ch in _SENTENCE_ENDINGS)
+    if cut >= len(prefix) // 2:
+        return prefix[:cut + 1].rstrip() + "…"
+    return prefix.rstrip() + "…"
+
+def fit_to_budget(texts: List[str], budget: int, model: Optional[str] = None) -> List[str]:
+    """
+    把一组文本裁剪到总token预算内
+
+    预算在各文本之间平均分配：比平均份额短的文本原样保留，省下的预算分给其余文本，
+    只有最长的几段会被截断。budget <= 0 表示不限制。
+    """
+    if budget <= 0 or not texts:
+        return list(texts)
+    counts = [count_tokens(text, model) for text in texts]
+    if sum(counts) <= budget:
+        return list(texts)
+
+    fitted = list(texts)
+    remaining = budget
+    order = sorted(range(len(texts)), key=lambda i: counts[i])
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        if counts[i] > share:
+            fitted[i] = truncate_to_tokens(texts[i], share, model)
+        remaining -= min(counts[i], share)
+    return fitted
+
+def get_prompt_budget(name: str) -> int:
+    """
+    prompt中可变输入部分的token预算（环境变量 PROMPT_BUDGET_<NAME>_TOKENS，默认0表示不限制）
+
+    默认不裁剪：凯尔特十字等大牌阵的完整输入会超过一个较小的预算，裁剪会降低解读质量，
+    只在需要控制成本或上下文长度时显式开启。
+
+    name: individual（单牌解读prompt中所有牌的牌意）或 combined（综合解读prompt中各张牌的内容）
+    """
+    return int(os.getenv(f"PROMPT_BUDGET_{name.upper()}_TOKENS", "0"))
+
+class TokenUsage:
+    """一个节点（或一次占卜）的LLM用量累计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency: float):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.latency_seconds += latency
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens,
+                "latency_seconds": round(self.latency_seconds, 3)
+            }
+
+_current_usage = contextvars.ContextVar("llm_token_usage", default=None)
+
+@contextmanager
+def recording_usage(usage: TokenUsage):
+    """在with块内（包括其中启动的线程池任务和协程）发生的LLM调用计入 usage"""
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+_node_usage_lock = threading.Lock()
+
+def add_node_usage(shared: Dict, node_name: str, usage: TokenUsage):
+    """
+    把节点的用量写入 shared["token_usage"]，并更新本次占卜的合计
+    
+    加锁合并，DagFlow中同时运行的节点可以各自写入。
+    """
+    node_usage = usage.to_dict()
+    with _node_usage_lock:
+        token_usage = shared.setdefault("token_usage", {"nodes": {}})
+        nodes = token_usage.setdefault("nodes", {})
+        nodes[node_name] = node_usage
+        token_usage["total"] = {
+            key: sum(node[key] for node in nodes.values())
+            for key in ("calls", "prompt_tokens", "completion_tokens", "total_tokens")
+        }
+
+_totals: Dict[str, Dict] = {}
+_size_buckets = [{"calls": 0, "latency_seconds": 0.0, "completion_tokens": 0} for _ in range(len(PROMPT_SIZE_BUCKETS) + 1)]
+_totals_lock = threading.Lock()
+
+def record_llm_usage(provider: str, model: str, prompt: str, completion: str,
+                     latency: float, usage=None):
+    """
+    记录一次LLM调用的用量
+
+    Args:
+        usage: 提供商返回的用量对象（OpenAI兼容的 prompt_tokens/completion_tokens，
+               或Gemini的 prompt_token_count/candidates_token_count）；没有时按文本计数
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or getattr(usage, "prompt_token_count", None)
+    completion_tokens = getattr(usage, "completion_tokens", None) or getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(prompt, model)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(completion or "", model)
+
+    current = _current_usage.get()
+    if current is not None:
+        current.add(prompt_tokens, completion_tokens, latency)
+
+    bucket = next((i for i, bound in enumerate(PROMPT_SIZE_BUCKETS) if prompt_tokens <= bound), len(PROMPT_SIZE_BUCKETS))
+    with _totals_lock:
+        totals = _totals.setdefault(f"{provider}:{model}", {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        size_bucket = _size_buckets[bucket]
+        size_bucket["calls"] += 1
+        size_bucket["latency_seconds"] += latency
+        size_bucket["completion_tokens"] += completion_tokens
+
+def get_token_usage_metrics() -> Dict:
+    """按 提供商:模型 汇总的token用量，以及按prompt大小分桶的调用次数、平均耗时和平均completion长度"""
+    with _totals_lock:
+        models = {key: dict(value) for key, value in _totals.items()}
+        buckets = [dict(bucket) for bucket in _size_buckets]
+
+    by_prompt_size = {}
+    bounds = [f"le_{bound}" for bound in PROMPT_SIZE_BUCKETS] + ["gt_" + str(PROMPT_SIZE_BUCKETS[-1])]
+    for label, bucket in zip(bounds, buckets):
+        calls = bucket["calls"]
+        by_prompt_size[label] = {
+            "calls": calls,
+            "avg_latency_seconds": round(bucket["latency_seconds"] / calls, 3) if calls else None,
+            "avg_completion_tokens": round(bucket["completion_tokens"] / calls, 1) if calls else None
+        }
+
+    return {
+        "prompt_tokens": sum(m["prompt_tokens"] for m in models.values()),
+        "completion_tokens": sum(m["completion_tokens"] for m in models.values()),
+        "calls": sum(m["calls"] for m in models.values()),
+        "models": models,
+        "by_prompt_size": by_prompt_size,
+        "tokenizer": "tiktoken" if tiktoken is not None else "estimate"
+    }
@@ -0,0 +1,149 @@
+# utils/tracing.py
+"""
+占卜流程的节点耗时追踪
+
+开启后（READING_TRACE_ENABLED=true）macore的 TraceCollector 会为每次占卜在shared store中
+记录每个节点的 prep/exec/post 耗时、重试次数和异常，随结果一起返回（result["trace"]）。
+设置 READING_TRACE_EXPORT 后，每次占卜的追踪还会按 OpenTelemetry 的 OTLP/JSON 格式导出：
+stdout 输出到标准输出，其他值视为文件路径（每行一个 ExportTraceServiceRequest）。
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from macore import TraceCollector, add_hook
+
+# shared store中保存追踪记录的键
+TRACE_KEY = "trace"
+
+_collector = None
+_collector_lock = threading.Lock()
+
+def is_tracing_enabled() -> bool:
+    """是否记录节点追踪（环境变量 READING_TRACE_ENABLED，默认关闭）"""
+    return os.getenv("READING_TRACE_ENABLED", "false").lower() in ("true", "1", "yes")
+
+def setup_tracing() -> Optional[TraceCollector]:
+    """开启追踪时注册进程内唯一的 TraceCollector（重复调用不会重复注册）"""
+    global _collector
+    if not is_tracing_enabled():
+        return None
+    with _collector_lock:
+        if _collector is None:
+            _collector = add_hook(TraceCollector(TRACE_KEY))
+    return _collector
+
+def _attribute(key: str, value) -> Dict:
+    """OTLP/JSON 的 KeyValue"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def build_otlp_trace(records: List[Dict], root_name: str = "tarot_reading", attributes: Dict = None) -> Dict:
+    """
+    把 TraceCollector 的记录转换成 OTLP/JSON 的 ExportTraceServiceRequest
+
+    一次占卜是一个trace：根span覆盖所有节点，每个节点是它的子span，
+    各阶段耗时和重试次数作为span属性，捕获的异常作为span事件。
+    """
+    trace_id = secrets.token_hex(16)
+    root_id = secrets.token_hex(8)
+    spans = []
+    for record in records:
+        start = record["start_unix_ns"]
+        end = start + int(record["duration_ms"] * 1e6)
+        span_attributes = [_attribute("macore.retries", record["retries"])]
+        span_attributes += [_attribute(f"macore.{phase}_ms", ms) for phase, ms in record["phases"].items()]
+        if record["action"]:
+            span_attributes.append(_attribute("macore.action", record["action"]))
+        span = {
+            "traceId": trace_id,
+            "spanId": secrets.token_hex(8),
+            "parentSpanId": root_id,
+            "name": record["node"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(end),
+            "attributes": span_attributes,
+            "events": [
+                {"timeUnixNano": str(end), "name": "exception",
+                 "attributes": [_attribute("exception.message", exception)]}
+                for exception in record["exceptions"]
+            ],
+            # STATUS_CODE_ERROR / STATUS_CODE_OK
+            "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1}
+        }
+        spans.append(span)
+
+    root_start = min((int(span["startTimeUnixNano"]) for span in spans), default=0)
+    root_end = max((int(span["endTimeUnixNano"]) for span in spans), default=0)
+    failed = any(record["error"] for record in records)
+    spans.insert(0, {
+        "traceId": trace_id,
+        "spanId": root_id,
+        "name": root_name,
+        "kind": 1,
+        "startTimeUnixNano": str(root_start),
+        "endTimeUnixNano": str(root_end),
+        "attributes": [_attribute(key, value) for key, value in (attributes or {}).items()],
+        "status": {"code": 2} if failed else {"code": 1}
+    })
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", os.getenv("OTEL_SERVICE_NAME", "tarot-reader"))]},
+            "scopeSpans": [{"scope": {"name": "macore"}, "spans": spans}]
+        }]
+    }
+
+class OTelJsonExporter:
+    """把追踪按 OTLP/JSON 每行一个写到标准输出或文件"""
+
+    def __init__(self, sink: str = "stdout"):
+        self.sink = sink
+        self._lock = threading.Lock()
+
+    def export(self, records: List[Dict], attributes: Dict = None):
+        if not records:
+            return
+        line = json.dumps(build_otlp_trace(records, attributes=attributes), ensure_ascii=False)
+        with self._lock:
+            if self.sink == "stdout":
+                sys.stdout.write(line + "\n")
+                sys.stdout.flush()
+            else:
+                with open(self.sink, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+_exporter = None
+
+def get_trace_exporter() -> Optional[OTelJsonExporter]:
+    """按 READING_TRACE_EXPORT 创建的导出器，未设置时返回None"""
+    global _exporter
+    sink = os.getenv("READING_TRACE_EXPORT", "").strip()
+    if not sink:
+        return None
+    if _exporter is None or _exporter.sink != sink:
+        _exporter = OTelJsonExporter(sink)
+    return _exporter
+
+def export_reading_trace(shared: Dict):
+    """导出一次占卜的追踪（未开启追踪或未配置导出时不做任何事）"""
+    exporter = get_trace_exporter()
+    if exporter is None or not shared.get(TRACE_KEY):
+        return
+    try:
+        exporter.export(shared[TRACE_KEY], {
+            "tarot.question_category": shared.get("question_category", ""),
+            "tarot.spread_type": shared.get("spread_type", "")
+        })
+    except Exception as e:
+        print(f"导出占卜追踪失败: {str(e)}")